@@ -1 +1 @@
-from . import constraint, layouts, refinements, sequencers, linkers, planners
\ No newline at end of file
+from . import parallel, storage, constraint, heuristics, layouts, caching, refinements, sequencers, paths, linkers, planners
\ No newline at end of file
@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 from enum import Enum
 
 class Constraint(ABC):
+	# Lets implementations use __slots__ without every instance carrying a __dict__
+	__slots__ = ()
 
 	@abstractmethod
 	def select_ingress(self, ingress_point):
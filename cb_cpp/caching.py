@@ -0,0 +1,124 @@
+import collections
+import copy
+import hashlib
+import os
+import pickle
+import numpy as np
+
+from .base import ConstraintLayout
+
+# Part of every disk cache key, bump whenever pickled constraints or layouts change shape so entries
+# written by an older version are never loaded
+CACHE_FORMAT_VERSION = 1
+
+def geometry_digest(geometry):
+	""" Content hash of a shapely geometry, identical geometries give identical digests """
+	return hashlib.sha1(geometry.wkb).hexdigest()
+
+def _stable_repr(value):
+	""" Representation of layout parameters that doesn't depend on object identity """
+	if isinstance(value, np.ndarray):
+		return ('ndarray', value.tolist())
+	elif isinstance(value, dict):
+		return tuple((k, _stable_repr(v)) for k, v in sorted(value.items()))
+	elif isinstance(value, (list, tuple)):
+		return tuple(_stable_repr(v) for v in value)
+	elif value is None or isinstance(value, (bool, int, float, str)):
+		return value
+	elif hasattr(value, '__dict__'):
+		return (type(value).__qualname__, _stable_repr(vars(value)))
+	else:
+		return repr(value)
+
+
+class LRUCache(object):
+	""" Fixed size mapping that evicts the least recently used entry when full """
+
+	def __init__(self, maxsize=128):
+		self._maxsize = maxsize
+		self._entries = collections.OrderedDict()
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key, default=None):
+		if key not in self._entries:
+			return default
+
+		self._entries.move_to_end(key)
+		return self._entries[key]
+
+	def put(self, key, value):
+		self._entries[key] = value
+		self._entries.move_to_end(key)
+
+		while len(self._entries) > self._maxsize:
+			self._entries.popitem(last=False)
+
+	def clear(self):
+		self._entries.clear()
+
+
+class CachedLayout(ConstraintLayout):
+	""" Wraps any ConstraintLayout and caches the constraints it lays out. Entries are keyed on a
+		 hash of the area geometry, the wrapped layout's parameters (radii, orientation, boundary
+		 offset, ...) and the layout options (e.g. bias), kept in an in memory LRU and optionally
+		 persisted to cache_dir. Keys include CACHE_FORMAT_VERSION so files written by an older
+		 format are never loaded. Every call returns fresh copies of the cached constraints so later
+		 refinements can't corrupt cached entries.
+	"""
+
+	def __init__(self, layout, maxsize=128, cache_dir=None):
+		self._layout = layout
+		self._cache = LRUCache(maxsize)
+		self._cache_dir = cache_dir
+
+		if cache_dir is not None:
+			os.makedirs(cache_dir, exist_ok=True)
+
+	def cache_key(self, area, **layout_options):
+		layout_params = (CACHE_FORMAT_VERSION, type(self._layout).__qualname__, _stable_repr(vars(self._layout)), _stable_repr(layout_options))
+
+		key = hashlib.sha1(repr(layout_params).encode())
+		key.update(geometry_digest(area.polygon).encode())
+
+		return key.hexdigest()
+
+	def _cache_path(self, key):
+		return os.path.join(self._cache_dir, f"{key}.pkl")
+
+	def layout_constraints(self, area, **layout_options):
+		key = self.cache_key(area, **layout_options)
+		constraints = self._cache.get(key)
+
+		if constraints is None and self._cache_dir is not None and os.path.exists(self._cache_path(key)):
+			with open(self._cache_path(key), 'rb') as f:
+				constraints = pickle.load(f)
+			self._cache.put(key, constraints)
+
+		if constraints is None:
+			constraints = self._layout.layout_constraints(area, **layout_options)
+			if constraints is None:
+				return None
+
+			# Keep a private copy so the caller is free to refine the constraints it gets back
+			self._cache.put(key, copy.deepcopy(constraints))
+
+			if self._cache_dir is not None:
+				with open(self._cache_path(key), 'wb') as f:
+					pickle.dump(constraints, f)
+
+			return constraints
+
+		return copy.deepcopy(constraints)
+
+	def clear(self):
+		""" Clears the in memory cache, entries persisted to disk are kept """
+		self._cache.clear()
+
+	@property
+	def layout(self):
+		return self._layout
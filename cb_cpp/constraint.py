@@ -2,35 +2,79 @@ import shapely.geometry
 import numpy as np
 
 from .base import Constraint
+from .storage import read_columns, restore_tuples, write_columns
 
 class BasicConstraint(Constraint):
 	""" An abstract constraint class that defines common methods used by OpenConstraint
 		 and ClosedConstraint implementations. Should not be instantiated.
+
+		 Parameters are stored per instance. The common parameters (direction, transition and
+		 thrust) have fixed properties and any other parameter is read from constrained_parameters,
+		 so constraining a parameter never touches the class object. There is deliberately no
+		 __getattr__ fallback, defining one sends every attribute lookup on the instance through
+		 the slow path.
 	"""
 
+	__slots__ = ('_coord_list', '_constrained_parameters')
+
 	def __init__(self, coord_list, **constrained_parameters):
 		self._coord_list = coord_list.copy()
 		self._constrained_parameters = {**constrained_parameters}
 
-		for param in self._constrained_parameters.keys():
-			setattr(BasicConstraint, param, self._property_factory(param))
+	@property
+	def direction(self):
+		try:
+			return self._constrained_parameters['direction']
+		except KeyError:
+			raise AttributeError(f"{type(self).__name__} has no constrained parameter direction") from None
+
+	@direction.setter
+	def direction(self, value):
+		self._constrained_parameters['direction'] = value
+
+	@direction.deleter
+	def direction(self):
+		self._constrained_parameters.pop('direction')
 
-	def _property_factory(self, parameter):
-		return property(lambda obj:obj._constrained_parameters[parameter], 
-							lambda obj, val: obj._constrained_parameters.update({parameter:value}), 
-							lambda obj:obj._constrained_parameters.pop(parameter))
+	@property
+	def transition(self):
+		try:
+			return self._constrained_parameters['transition']
+		except KeyError:
+			raise AttributeError(f"{type(self).__name__} has no constrained parameter transition") from None
+
+	@transition.setter
+	def transition(self, value):
+		self._constrained_parameters['transition'] = value
+
+	@transition.deleter
+	def transition(self):
+		self._constrained_parameters.pop('transition')
+
+	@property
+	def thrust(self):
+		try:
+			return self._constrained_parameters['thrust']
+		except KeyError:
+			raise AttributeError(f"{type(self).__name__} has no constrained parameter thrust") from None
+
+	@thrust.setter
+	def thrust(self, value):
+		self._constrained_parameters['thrust'] = value
+
+	@thrust.deleter
+	def thrust(self):
+		self._constrained_parameters.pop('thrust')
 
 	def is_constrained(self, parameter):
 		return parameter in self._constrained_parameters
 
 	def constrain_parameter(self, parameter, value):
 		self._constrained_parameters[parameter] = value
-		setattr(BasicConstraint, parameter, self._property_factory(parameter))
 
 	def unconstrain_parameter(self, parameter):
 		if parameter in self._constrained_parameters:
 			del self._constrained_parameters[parameter]
-			delattr(BasicConstraint, parameter)
 			return True
 		else:
 			print(f"Error: Parameter {parameter} not constrained")
@@ -47,6 +91,8 @@ class BasicConstraint(Constraint):
 
 class OpenConstraint(BasicConstraint):
 
+	__slots__ = ('_endpoints',)
+
 	def __init__(self, coord_list, **constrained_parameters):
 		super().__init__(coord_list, **constrained_parameters)
 
@@ -142,6 +188,8 @@ class OpenConstraint(BasicConstraint):
 class ClosedConstraint(BasicConstraint):
 	""" Class to represent a closed loop constraint """
 
+	__slots__ = ()
+
 	def get_coord_list(self, ingress_point=None, endpoint_offset=0.0, **unknown_parameters):
 		if ingress_point:
 			# currently saves ingress_point choice, maybe shouldn't do this
@@ -197,3 +245,493 @@ class ClosedConstraint(BasicConstraint):
 			return self._constrained_parameters["transition"]
 		else:
 			return self._coord_list
+
+
+def _read_only(array):
+	view = array.view()
+	view.flags.writeable = False
+
+	return view
+
+def chain_coord_views(constraint_chain, **coord_options):
+	""" Read only coordinate arrays of a chain of constraints in travel order. Array backed
+		 constraints give views of their set's buffer, other constraints fall back to get_coord_list.
+		 Constraints whose coordinates can't be determined are skipped.
+	"""
+	chain_views = []
+	for c in constraint_chain:
+		if hasattr(c, 'get_coord_views'):
+			coord_views = c.get_coord_views(**coord_options)
+		else:
+			coord_list = c.get_coord_list(**coord_options)
+			coord_views = None if coord_list is None else (np.asarray(list(coord_list), dtype=np.float64).reshape(-1, 2),)
+
+		if coord_views is None:
+			print('Error: Could not determine direction on constraint in chain')
+			continue
+
+		chain_views.extend(coord_views)
+
+	return chain_views
+
+def stack_coord_views(constraint_chain, **coord_options):
+	""" Copies the coordinates of a chain of constraints, in travel order, into a single
+		 preallocated (N,2) array. Array backed constraints are copied straight from their read only
+		 views so no intermediate lists are built, other constraints fall back to get_coord_list.
+	"""
+	chain_views = chain_coord_views(constraint_chain, **coord_options)
+
+	coords = np.empty((sum(len(view) for view in chain_views), 2), dtype=np.float64)
+	row = 0
+	for view in chain_views:
+		coords[row:row+len(view)] = view
+		row += len(view)
+
+	return coords
+
+
+class ConstraintView(object):
+	""" Lightweight handle to a single constraint stored in a ConstraintSet. Views hold no data
+		 of their own, every coordinate and parameter lives in the columns of the parent set. They
+		 don't inherit from Constraint so that __slots__ keeps them free of a per instance dict,
+		 the Constraint ABC still recognizes them through its __subclasshook__.
+	"""
+
+	__slots__ = ('_set', '_idx')
+
+	def __init__(self, constraint_set, idx):
+		self._set = constraint_set
+		self._idx = idx
+
+	def __repr__(self):
+		return str(self.coord_list)
+
+	def __getattr__(self, parameter):
+		# Mirrors the per parameter properties of BasicConstraint (c.thrust, c.transition, ...)
+		if parameter.startswith('_'):
+			raise AttributeError(parameter)
+
+		params = self.constrained_parameters
+		if parameter in params:
+			return params[parameter]
+
+		raise AttributeError(f"{type(self).__name__} has no constrained parameter {parameter}")
+
+	def is_constrained(self, parameter):
+		return self._set.is_constrained(self._idx, parameter)
+
+	def constrain_parameter(self, parameter, value):
+		self._set.constrain_parameter(self._idx, parameter, value)
+
+	def unconstrain_parameter(self, parameter):
+		if self.is_constrained(parameter):
+			self._set.unconstrain_parameter(self._idx, parameter)
+			return True
+		else:
+			print(f"Error: Parameter {parameter} not constrained")
+			return False
+
+	@property
+	def direction(self):
+		return self._set.get_parameter(self._idx, 'direction')
+
+	@direction.setter
+	def direction(self, value):
+		self.constrain_parameter('direction', value)
+
+	@property
+	def constrained_parameters(self):
+		return self._set.constrained_parameters(self._idx)
+
+	@property
+	def parameter_arrays(self):
+		return self._set.parameter_arrays(self._idx)
+
+	@property
+	def coord_array(self):
+		""" (K,2) view into the coordinate buffer of the parent set """
+		return self._set.coord_array(self._idx)
+
+	@property
+	def coord_list(self):
+		return [tuple(pt) for pt in self.coord_array.tolist()]
+
+	@property
+	def size(self):
+		return self._set.size(self._idx)
+
+
+class OpenConstraintView(ConstraintView):
+	""" OpenConstraint backed by a ConstraintSet """
+
+	__slots__ = ()
+
+	def get_coord_list(self, ingress_point=None, **unknown_parameters):
+		coord_views = self.get_coord_views(ingress_point)
+		if coord_views is None:
+			return None
+
+		return [tuple(pt) for pt in coord_views[0].tolist()]
+
+	def get_coord_views(self, ingress_point=None, **unknown_parameters):
+		""" Read only view of the coordinates in travel order, reversal is a negative stride """
+		coords = _read_only(self.coord_array)
+
+		if self.is_constrained('direction'):
+			direction = self.direction
+			if ingress_point is not None and ingress_point != self.endpoints[direction[0]]:
+				print('Error: specified ingress_point violates direction constraint')
+				return None
+			reverse = direction[0] != 0
+
+		elif ingress_point is not None:
+			try:
+				reverse = self.endpoints.index(ingress_point) != 0
+			except ValueError:
+				print(f"Error: specified ingress_point {ingress_point} not found in constraint ingress_points")
+				return None
+
+		else:
+			reverse = False
+
+		return (coords[::-1] if reverse else coords,)
+
+	def select_ingress(self, ingress_point):
+		""" For open constraints choosing an ingress point implicitly constrains
+			 the direction of the constraint. If specified ingress_point is not a
+			 valid ingress point for this constraint, return false.
+		"""
+		try:
+			ingress_index = self.ingress_points.index(ingress_point)
+		except ValueError:
+			print(f"Error: specified ingress_point {ingress_point} not found in constraint ingress_points")
+			return False
+
+		if not self.is_constrained('direction'):
+			self.constrain_parameter('direction', [ingress_index, (ingress_index+1)%2])
+
+		return True
+
+	@property
+	def endpoints(self):
+		return self._set.endpoints(self._idx)
+
+	@property
+	def ingress_points(self):
+		if self.is_constrained('direction'):
+			return [self.endpoints[self.direction[0]]]
+		else:
+			return self.endpoints
+
+	@property
+	def egress_points(self):
+		if self.is_constrained('direction'):
+			return [self.endpoints[self.direction[1]]]
+		else:
+			return self.endpoints
+
+
+class ClosedConstraintView(ConstraintView):
+	""" ClosedConstraint backed by a ConstraintSet """
+
+	__slots__ = ()
+
+	def get_coord_list(self, ingress_point=None, endpoint_offset=0.0, **unknown_parameters):
+		coord_views = self.get_coord_views(ingress_point, endpoint_offset)
+		if coord_views is None:
+			return None
+
+		return [tuple(pt) for pt in np.concatenate(coord_views).tolist()]
+
+	def get_coord_views(self, ingress_point=None, endpoint_offset=0.0, **unknown_parameters):
+		""" Read only views that, concatenated, give the same coordinates as get_coord_list. The
+			 ring is rotated by slicing from the transition vertex and reversed with a negative stride,
+			 only the final (offset) endpoint is newly allocated.
+		"""
+		if ingress_point:
+			if not self.select_ingress(ingress_point):
+				return None
+			transition_index = self._set.transition_index(self._idx)
+		elif self.is_constrained('transition'):
+			transition_index = self._set.transition_index(self._idx)
+		else:
+			transition_index = 0
+
+		ring = _read_only(self.coord_array)
+		step = 1
+		if self.is_constrained('direction') and self.direction[0] != 0:
+			step = -1
+
+		final_segment = ring[transition_index] - ring[(transition_index-step)%len(ring)]
+		final_segment /= np.linalg.norm(final_segment)
+
+		endpoint = ring[transition_index] - endpoint_offset * final_segment
+
+		return (ring[transition_index::step], ring[:transition_index:step], endpoint[np.newaxis, :])
+
+	def select_ingress(self, ingress_point):
+		""" For closed constraints choosing the ingress point does not constrain direction """
+		vertex_index = self._set.vertex_index(self._idx, ingress_point)
+		if vertex_index is None or (self.is_constrained('transition') and vertex_index != self._set.transition_index(self._idx)):
+			print(f"Error: specified ingress_point {ingress_point} not found in constraint ingress_points")
+			return False
+
+		self._set.set_transition_index(self._idx, vertex_index)
+
+		return True
+
+	@property
+	def ingress_points(self):
+		if self.is_constrained('transition'):
+			return self.transition
+		else:
+			return self.coord_list
+
+	@property
+	def egress_points(self):
+		return self.ingress_points
+
+
+class ConstraintSet(object):
+	""" Columnar container for a large number of constraints. All coordinates live in a single
+		 contiguous (N,2) float64 buffer, constraint i owning rows offsets[i]:offsets[i+1], and the
+		 common parameters are stored as typed per constraint columns: direction (int8, -1 when
+		 unconstrained), transition (vertex index, -1 when unconstrained) and thrust (an (N,2)
+		 buffer parallel to the coordinates). Any other parameter falls back to a sparse dict.
+		 Indexing returns OpenConstraintView/ClosedConstraintView handles that satisfy the
+		 Constraint ABC, so refinements, sequencers and linkers work on sets unchanged.
+	"""
+
+	def __init__(self, coords, offsets, closed=None):
+		self._coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+		self._offsets = np.asarray(offsets, dtype=np.int64)
+		num_constraints = len(self._offsets) - 1
+
+		self._closed = np.zeros(num_constraints, dtype=bool) if closed is None else np.asarray(closed, dtype=bool)
+		self._direction = np.full(num_constraints, -1, dtype=np.int8)
+		self._transition = np.full(num_constraints, -1, dtype=np.int64)
+		self._thrust = None
+		self._has_thrust = np.zeros(num_constraints, dtype=bool)
+		self._other_parameters = {}
+		self._vertex_maps = {}
+		self._views = [None] * num_constraints
+
+	@classmethod
+	def from_coord_lists(cls, coord_lists, closed=False):
+		""" Builds a set from an iterable of coordinate lists, all open or all closed """
+		coords = []
+		offsets = [0]
+		for coord_list in coord_lists:
+			coords.extend(coord_list)
+			offsets.append(len(coords))
+
+		return cls(np.asarray(coords, dtype=np.float64).reshape(-1, 2), offsets, np.full(len(offsets)-1, closed, dtype=bool))
+
+	@classmethod
+	def from_constraints(cls, constraints):
+		""" Copies a list of OpenConstraint/ClosedConstraint objects, parameters included, into a set """
+		constraints = list(constraints)
+		constraint_set = cls.from_coord_lists(c.coord_list for c in constraints)
+		constraint_set._closed[:] = [isinstance(c, (ClosedConstraint, ClosedConstraintView)) for c in constraints]
+
+		for idx, c in enumerate(constraints):
+			for param, value in c.constrained_parameters.items():
+				constraint_set.constrain_parameter(idx, param, value)
+
+		return constraint_set
+
+	@classmethod
+	def from_binary(cls, filename, mode='c'):
+		""" Maps a set written by save_binary. The coordinate and parameter columns are memory
+			 mapped copy on write, so refining the set never modifies the file.
+		"""
+		kind, columns, metadata = read_columns(filename, mode)
+		if kind != 'constraint_set':
+			raise ValueError(f"{filename} holds a {kind}, not a constraint set")
+
+		constraint_set = cls(columns['coords'], columns['offsets'], columns['closed'])
+		constraint_set._direction = columns['direction']
+		constraint_set._transition = columns['transition']
+		constraint_set._has_thrust = columns['has_thrust']
+		constraint_set._thrust = columns.get('thrust')
+		other_parameters = metadata.get('other_parameters', {})
+		constraint_set._other_parameters = {int(idx): {param: restore_tuples(value) for param, value in params.items()} for idx, params in other_parameters.items()}
+
+		return constraint_set
+
+	def save_binary(self, filename):
+		""" Writes the set in the cb_cpp binary format, parameters outside the typed columns go in
+			 the header as JSON
+		"""
+		columns = {
+			'coords': self._coords,
+			'offsets': self._offsets,
+			'closed': self._closed,
+			'direction': self._direction,
+			'transition': self._transition,
+			'has_thrust': self._has_thrust,
+		}
+		if self._thrust is not None:
+			columns['thrust'] = self._thrust
+
+		write_columns(filename, 'constraint_set', columns, {'other_parameters': {str(idx): params for idx, params in self._other_parameters.items()}})
+
+	def __len__(self):
+		return len(self._views)
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			return [self[i] for i in range(*idx.indices(len(self)))]
+
+		if idx < 0:
+			idx += len(self)
+
+		view = self._views[idx]
+		if view is None:
+			view_type = ClosedConstraintView if self._closed[idx] else OpenConstraintView
+			view = self._views[idx] = view_type(self, idx)
+
+		return view
+
+	def __iter__(self):
+		return (self[idx] for idx in range(len(self)))
+
+	@property
+	def coords(self):
+		return self._coords
+
+	@property
+	def offsets(self):
+		return self._offsets
+
+	@property
+	def nbytes(self):
+		""" Memory used by the coordinate buffer and parameter columns """
+		columns = (self._coords, self._offsets, self._closed, self._direction, self._transition, self._has_thrust)
+		thrust_bytes = self._thrust.nbytes if self._thrust is not None else 0
+
+		return sum(column.nbytes for column in columns) + thrust_bytes
+
+	def coord_array(self, idx):
+		return self._coords[self._offsets[idx]:self._offsets[idx+1]]
+
+	def size(self, idx):
+		return int(self._offsets[idx+1] - self._offsets[idx])
+
+	def endpoints(self, idx):
+		first, last = self._coords[[self._offsets[idx], self._offsets[idx+1]-1]].tolist()
+
+		return (tuple(first), tuple(last))
+
+	def vertex_index(self, idx, point):
+		""" Index within constraint idx of the vertex at point, None if point isn't a vertex. The
+			 vertex map of each constraint is built on first use so later lookups are O(1).
+		"""
+		index_map = self._vertex_maps.get(idx)
+		if index_map is None:
+			index_map = {}
+			for vertex_index, pt in enumerate(self.coord_array(idx).tolist()):
+				index_map.setdefault(tuple(pt), vertex_index)
+			self._vertex_maps[idx] = index_map
+
+		try:
+			return index_map.get(tuple(point))
+		except TypeError:
+			return None
+
+	def transition_index(self, idx):
+		return int(self._transition[idx])
+
+	def set_transition_index(self, idx, vertex_index):
+		self._transition[idx] = vertex_index
+
+	def is_constrained(self, idx, parameter):
+		if parameter == 'direction':
+			return self._direction[idx] >= 0
+		elif parameter == 'transition' and self._transition[idx] >= 0:
+			return True
+		elif parameter == 'thrust' and self._has_thrust[idx]:
+			return True
+		else:
+			return parameter in self._other_parameters.get(idx, ())
+
+	def get_parameter(self, idx, parameter):
+		if parameter == 'direction':
+			if self._direction[idx] < 0:
+				raise AttributeError('direction')
+			return [0, 1] if self._direction[idx] == 0 else [1, 0]
+		elif parameter == 'transition' and self._transition[idx] >= 0:
+			return [tuple(self._coords[self._offsets[idx] + self._transition[idx]].tolist())]
+		elif parameter == 'thrust' and self._has_thrust[idx]:
+			return [tuple(t) for t in self._thrust[self._offsets[idx]:self._offsets[idx+1]].tolist()]
+		else:
+			return self._other_parameters[idx][parameter]
+
+	def constrain_parameter(self, idx, parameter, value):
+		# Drop any previous value so a parameter only ever lives in one place
+		self.unconstrain_parameter(idx, parameter)
+
+		if parameter == 'direction' and list(value) in ([0, 1], [1, 0]):
+			self._direction[idx] = value[0]
+			return
+		elif parameter == 'transition' and len(value) == 1:
+			vertex_index = self.vertex_index(idx, value[0])
+			if vertex_index is not None:
+				self._transition[idx] = vertex_index
+				return
+		elif parameter == 'thrust' and len(value) == self.size(idx) and all(t is not None and len(t) == 2 for t in value):
+			if self._thrust is None:
+				self._thrust = np.zeros_like(self._coords)
+			self._thrust[self._offsets[idx]:self._offsets[idx+1]] = value
+			self._has_thrust[idx] = True
+			return
+
+		self._other_parameters.setdefault(idx, {})[parameter] = value
+
+	def unconstrain_parameter(self, idx, parameter):
+		if parameter == 'direction':
+			self._direction[idx] = -1
+		elif parameter == 'transition':
+			self._transition[idx] = -1
+		elif parameter == 'thrust':
+			self._has_thrust[idx] = False
+
+		other = self._other_parameters.get(idx)
+		if other is not None:
+			other.pop(parameter, None)
+			if len(other) == 0:
+				del self._other_parameters[idx]
+
+	def constrained_parameters(self, idx):
+		params = {}
+		if self._direction[idx] >= 0:
+			params['direction'] = self.get_parameter(idx, 'direction')
+		if self._transition[idx] >= 0:
+			params['transition'] = self.get_parameter(idx, 'transition')
+		if self._has_thrust[idx]:
+			params['thrust'] = self.get_parameter(idx, 'thrust')
+		params.update(self._other_parameters.get(idx, {}))
+
+		return params
+
+	def parameter_arrays(self, idx):
+		""" Same as constrained_parameters with thrust as a read only (K,2) view of its column """
+		params = {}
+		if self._direction[idx] >= 0:
+			params['direction'] = self.get_parameter(idx, 'direction')
+		if self._transition[idx] >= 0:
+			params['transition'] = self.get_parameter(idx, 'transition')
+		if self._has_thrust[idx]:
+			params['thrust'] = _read_only(self._thrust[self._offsets[idx]:self._offsets[idx+1]])
+		params.update(self._other_parameters.get(idx, {}))
+
+		return params
+
+	def to_constraints(self):
+		""" Materializes the set as a list of OpenConstraint/ClosedConstraint objects """
+		constraints = []
+		for idx in range(len(self)):
+			constraint_type = ClosedConstraint if self._closed[idx] else OpenConstraint
+			constraints.append(constraint_type(self[idx].coord_list, **self.constrained_parameters(idx)))
+
+		return constraints
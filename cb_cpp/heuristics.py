@@ -0,0 +1,182 @@
+import numpy as np
+import robot_primitives as rp
+
+def _as_points(pts):
+	return np.asarray(pts, dtype=float).reshape(-1, 2)
+
+
+class BatchHeuristic(object):
+	""" Heuristic that evaluates the cost from one start point to an (N,2) array of candidate
+		 points in a single call. compute_cost is kept so batch heuristics can be used anywhere
+		 a robot_primitives heuristic is expected.
+	"""
+
+	def compute_costs(self, start, candidates, *args):
+		""" Returns an (N,) array of costs from start to each candidate """
+		raise NotImplementedError()
+
+	def compute_pairwise_costs(self, starts, ends, *args):
+		""" Returns an (N,) array of costs from each start to the matching end """
+		return np.array([self.compute_costs(start, [end], *args)[0] for start, end in zip(starts, ends)])
+
+	def compute_cost_matrix(self, starts, ends, *args):
+		""" Returns an (N,M) array of costs from every start to every end """
+		return np.stack([self.compute_costs(start, ends, *args) for start in starts]).reshape(len(starts), len(ends))
+
+	def compute_cost(self, start, goal, *args):
+		return float(self.compute_costs(start, [goal], *args)[0])
+
+
+class EuclideanCost(BatchHeuristic):
+
+	def compute_costs(self, start, candidates, *args):
+		diff = _as_points(candidates) - np.asarray(start, dtype=float)
+
+		return np.hypot(diff[:, 0], diff[:, 1])
+
+	def compute_pairwise_costs(self, starts, ends, *args):
+		diff = _as_points(ends) - _as_points(starts)
+
+		return np.hypot(diff[:, 0], diff[:, 1])
+
+	def compute_cost_matrix(self, starts, ends, *args):
+		diff = _as_points(ends)[np.newaxis, :, :] - _as_points(starts)[:, np.newaxis, :]
+
+		return np.hypot(diff[..., 0], diff[..., 1])
+
+	def compute_cost(self, start, goal, *args):
+		return float(np.hypot(goal[0] - start[0], goal[1] - start[1]))
+
+
+class DirectedCost(BatchHeuristic):
+	""" Vectorized robot_primitives DirectedDistance, the distance travelled along a direction.
+		 DirectedCost.perpendicular(transect_orientation) measures progress across transects.
+	"""
+
+	def __init__(self, direction):
+		self._direction = np.asarray(direction, dtype=float) / np.linalg.norm(direction)
+
+	@classmethod
+	def perpendicular(cls, vector):
+		return cls((-vector[1], vector[0]))
+
+	def compute_costs(self, start, candidates, *args):
+		return np.abs((_as_points(candidates) - np.asarray(start, dtype=float)).dot(self._direction))
+
+	def compute_pairwise_costs(self, starts, ends, *args):
+		return np.abs((_as_points(ends) - _as_points(starts)).dot(self._direction))
+
+	def compute_cost_matrix(self, starts, ends, *args):
+		# Projection is linear so the matrix is a difference of projected endpoints
+		return np.abs(_as_points(ends).dot(self._direction)[np.newaxis, :] - _as_points(starts).dot(self._direction)[:, np.newaxis])
+
+	def compute_cost(self, start, goal, *args):
+		return float(abs((goal[0] - start[0])*self._direction[0] + (goal[1] - start[1])*self._direction[1]))
+
+	@property
+	def direction(self):
+		return self._direction
+
+
+class FlowEnergyCost(BatchHeuristic):
+	""" Vectorized robot_primitives OpposingFlowEnergy. The straight line from start to goal is
+		 split into steps of length delta, the flow is sampled at the start of each step and the
+		 energy of a step is the squared speed through the water times the time taken to cover it
+		 at nominal_speed. The steps of every pair are sampled and summed in one pass.
+	"""
+
+	def __init__(self, flow_field, delta=0.1):
+		self._flow_field = flow_field
+		self._delta = delta
+
+	def compute_pairwise_costs(self, starts, ends, nominal_speed=0.5):
+		starts = _as_points(starts)
+		diff = _as_points(ends) - starts
+		lengths = np.hypot(diff[:, 0], diff[:, 1])
+		if len(lengths) == 0:
+			return np.empty(0)
+
+		with np.errstate(invalid='ignore', divide='ignore'):
+			unit = np.where(lengths[:, np.newaxis] > 0, diff / lengths[:, np.newaxis], 0.)
+
+		# Flatten the steps of every pair, pair_idx maps each step back to its pair
+		num_steps = np.maximum(1, np.ceil(lengths / self._delta)).astype(int)
+		pair_idx = np.repeat(np.arange(len(lengths)), num_steps)
+		step_idx = np.arange(len(pair_idx)) - np.repeat(np.cumsum(num_steps) - num_steps, num_steps)
+
+		travelled = step_idx * self._delta
+		step_lengths = np.minimum(self._delta, lengths[pair_idx] - travelled)
+		samples = starts[pair_idx] + travelled[:, np.newaxis] * unit[pair_idx]
+		flow = _as_points([self._flow_field[tuple(pt)] for pt in samples.tolist()])
+
+		water_velocity = nominal_speed * unit[pair_idx] - flow
+		step_energy = np.sum(water_velocity**2, axis=1) * step_lengths / nominal_speed
+
+		return np.bincount(pair_idx, weights=step_energy, minlength=len(lengths))
+
+	def compute_costs(self, start, candidates, nominal_speed=0.5):
+		candidates = _as_points(candidates)
+		starts = np.broadcast_to(np.asarray(start, dtype=float), candidates.shape)
+
+		return self.compute_pairwise_costs(starts, candidates, nominal_speed)
+
+	def compute_cost_matrix(self, starts, ends, nominal_speed=0.5):
+		starts = _as_points(starts)
+		ends = _as_points(ends)
+		pair_starts = np.repeat(starts, len(ends), axis=0)
+		pair_ends = np.tile(ends, (len(starts), 1))
+
+		return self.compute_pairwise_costs(pair_starts, pair_ends, nominal_speed).reshape(len(starts), len(ends))
+
+	def compute_cost(self, start, goal, nominal_speed=0.5):
+		return float(self.compute_pairwise_costs([start], [goal], nominal_speed)[0])
+
+
+class PairwiseHeuristic(BatchHeuristic):
+	""" Generic fallback that wraps any per pair heuristic behind the batch interface """
+
+	def __init__(self, heuristic):
+		self._heuristic = heuristic
+
+	def compute_costs(self, start, candidates, *args):
+		return np.array([self._heuristic.compute_cost(start, pt, *args) for pt in candidates], dtype=float)
+
+	def compute_pairwise_costs(self, starts, ends, *args):
+		return np.array([self._heuristic.compute_cost(start, end, *args) for start, end in zip(starts, ends)], dtype=float)
+
+	def compute_cost(self, start, goal, *args):
+		return self._heuristic.compute_cost(start, goal, *args)
+
+	@property
+	def heuristic(self):
+		return self._heuristic
+
+
+def batch_heuristic(heuristic):
+	""" Returns a BatchHeuristic equivalent to heuristic, vectorized where the heuristic is known """
+	if isinstance(heuristic, BatchHeuristic):
+		return heuristic
+
+	euclidean = rp.heuristics.EuclideanDistance
+	if heuristic is euclidean or type(heuristic) is euclidean:
+		return EuclideanCost()
+
+	return PairwiseHeuristic(heuristic)
+
+def polyline_costs(heuristic, polylines, *args):
+	""" Returns the summed segment costs of each polyline, evaluating the segments of every polyline
+		 in a single compute_pairwise_costs call. Extra args are passed on to the heuristic.
+	"""
+	heuristic = batch_heuristic(heuristic)
+	polylines = [list(map(tuple, polyline)) for polyline in polylines]
+	if len(polylines) == 0:
+		return np.empty(0)
+
+	starts = [pt for polyline in polylines for pt in polyline[:-1]]
+	ends = [pt for polyline in polylines for pt in polyline[1:]]
+	segment_costs = heuristic.compute_pairwise_costs(starts, ends, *args) if len(starts) > 0 else np.empty(0)
+
+	# Segments are summed in order per polyline, matching a running total over its coordinates
+	splits = np.cumsum([max(len(polyline) - 1, 0) for polyline in polylines])[:-1]
+
+	return np.array([sum(costs, 0.) for costs in np.split(np.asarray(segment_costs, dtype=float), splits)])
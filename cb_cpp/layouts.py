@@ -1,20 +1,160 @@
+import collections
 import numpy as np
 import shapely.geometry
 import operator
-import queue
 
 from .base import ConstraintLayout
-from .constraint import OpenConstraint, ClosedConstraint
+from .parallel import WorkerPool
+from .constraint import OpenConstraint, ClosedConstraint, ConstraintSet
+
+def polygon_parts(geometry):
+	""" Returns the list of polygons making up a Polygon or MultiPolygon, empty if geometry is empty """
+	if geometry is None or geometry.is_empty:
+		return []
+	elif hasattr(geometry, 'geoms'):
+		return [g for g in geometry.geoms if isinstance(g, shapely.geometry.Polygon) and not g.is_empty]
+	else:
+		return [geometry]
+
+def polygon_rings(geometry):
+	""" Returns the vertex lists (without repeated closing vertex) of every exterior and interior ring """
+	rings = []
+	for part in polygon_parts(geometry):
+		rings.append(list(part.exterior.coords)[:-1])
+		rings.extend(list(ring.coords)[:-1] for ring in part.interiors)
+
+	return rings
+
+
+class ScanlineIntersector(object):
+	""" Computes where parallel sweep lines cross the boundary of a polygon (holes and
+		 multiple parts included). Edges are sorted once along the sweep direction and an active
+		 edge table is maintained as the sweep advances, so each sweep line only visits the
+		 edges that actually span it instead of the whole polygon.
+	"""
+
+	def __init__(self, polygon, sweep_direction, line_direction=None):
+		self._sweep_direction = np.array(sweep_direction, dtype=float) / np.linalg.norm(sweep_direction)
+		if line_direction is None:
+			self._line_direction = np.array([-self._sweep_direction[1], self._sweep_direction[0]])
+		else:
+			self._line_direction = np.array(line_direction, dtype=float)
+		self._rings = polygon_rings(polygon)
+
+		edge_start = [np.asarray(ring, dtype=float) for ring in self._rings]
+		edge_end = [np.roll(ring, -1, axis=0) for ring in edge_start]
+		self._edge_start = np.concatenate(edge_start) if edge_start else np.empty((0, 2))
+		self._edge_end = np.concatenate(edge_end) if edge_end else np.empty((0, 2))
+
+		self._start_proj = self._edge_start.dot(self._sweep_direction)
+		self._end_proj = self._edge_end.dot(self._sweep_direction)
+		self._lower = np.minimum(self._start_proj, self._end_proj)
+		self._upper = np.maximum(self._start_proj, self._end_proj)
+
+		# Edges parallel to the sweep lines never register a crossing, leave them out of the table
+		crossable = self._upper > self._lower
+		self._edge_order = np.flatnonzero(crossable)[np.argsort(self._lower[crossable], kind='stable')]
+
+		if len(self._edge_start) > 0:
+			self._extents = (self._start_proj.min(), self._start_proj.max())
+		else:
+			self._extents = (0., 0.)
+
+	@property
+	def extents(self):
+		""" Min and max position of the polygon along the sweep direction """
+		return self._extents
+
+	@property
+	def rings(self):
+		return self._rings
+
+	@property
+	def line_direction(self):
+		return self._line_direction
+
+	def edge_points(self, edge_indices, position):
+		""" Points where the specified edges cross the sweep line at position, either a single
+			 position for all edges or one position per edge
+		"""
+		edge_indices = np.asarray(edge_indices, dtype=int)
+		start_proj = self._start_proj[edge_indices]
+		frac = (np.asarray(position) - start_proj) / (self._end_proj[edge_indices] - start_proj)
+		edge_vec = self._edge_end[edge_indices] - self._edge_start[edge_indices]
+
+		return self._edge_start[edge_indices] + frac[:, np.newaxis] * edge_vec
+
+	def iter_crossings(self, positions):
+		""" Yields the boundary crossings of the sweep line at each position as a tuple of an
+			 (N,2) array of points sorted along the sweep line and the indices of the crossed edges.
+			 Positions must be non-decreasing.
+		"""
+		active = np.empty(0, dtype=int)
+		next_edge = 0
+		num_edges = len(self._edge_order)
+
+		for position in positions:
+			# Add edges that start before the sweep line to the active edge table
+			first_edge = next_edge
+			while next_edge < num_edges and self._lower[self._edge_order[next_edge]] <= position:
+				next_edge += 1
+			if next_edge > first_edge:
+				active = np.concatenate((active, self._edge_order[first_edge:next_edge]))
+
+			# Edges are treated as half open intervals so vertices are not counted twice, except at
+			# the far extent of the polygon where the interval is closed on the other end instead
+			if position >= self._extents[1]:
+				crossed = active[(self._lower[active] < position) & (position <= self._upper[active])]
+			else:
+				active = active[position < self._upper[active]]
+				crossed = active
+
+			pts = self.edge_points(crossed, position)
+			order = np.argsort(pts.dot(self._line_direction), kind='stable')
+
+			yield pts[order], crossed[order]
+
+	def iter_segments(self, positions):
+		""" Yields, for each position, the list of (start, end) point pairs bounding the pieces of
+			 the sweep line that lie inside the polygon, ordered along the sweep line
+		"""
+		for pts, _ in self.iter_crossings(positions):
+			# Consecutive pairs of boundary crossings bound the pieces of the line inside the polygon
+			yield list(zip(pts[::2], pts[1::2]))
+
+	def segments(self, positions):
+		return list(self.iter_segments(positions))
+
+
+def _segment_constraints(segment_iter):
+	""" Builds an OpenConstraint from every sweep line segment, collapsing segments where the
+		 sweep line only touches the polygon to a single coordinate
+	"""
+	constraints = []
+	for segments in segment_iter:
+		for start, end in segments:
+			if np.allclose(start, end):
+				constraints.append(OpenConstraint([tuple(start.tolist())]))
+			else:
+				constraints.append(OpenConstraint([tuple(start.tolist()), tuple(end.tolist())]))
+
+	return constraints
+
 
 class BoustrophedonPattern(ConstraintLayout):
-	""" Deprecated: Use OrientedBoustrophedonPattern instead """
+	""" Deprecated: Use OrientedBoustrophedonPattern instead
+
+		 With batched the sweep positions are computed up front and intersected in one pass with
+		 the ScanlineIntersector instead of one shapely intersection per sweep line.
+	"""
 
-	def __init__(self, vehicle_radius, sensor_radius, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, batched=False, **unknown_options):
 		# TODO Add orientation support
 		self._sensor_radius = sensor_radius
 		self._vehicle_radius = vehicle_radius
+		self._batched = batched
 
-	def layout_constraints(self, area, **unknown_options):
+	def layout_constraints(self, area, batched=None, **unknown_options):
 		# TODO needs to be able to lay out constraints in any direction
 		x_min, y_min, x_max, y_max = area.bounds
 		area_width = x_max - x_min
@@ -36,6 +176,18 @@ class BoustrophedonPattern(ConstraintLayout):
 		num_constraints = np.ceil(x_dist / (2*self._sensor_radius)).astype(int)
 		transect_width = np.around(x_dist / num_constraints, decimals=5)
 
+		if batched is None:
+			batched = self._batched
+
+		if batched:
+			x_positions = np.arange(x_min, x_max + transect_width/2., transect_width)
+			x_positions = x_positions[x_positions <= x_max]
+
+			# Sweep lines are vertical so crossings come back sorted by y
+			intersector = ScanlineIntersector(offset_polygon, (1., 0.))
+
+			return _segment_constraints(intersector.iter_segments(x_positions))
+
 		current_x_pos = x_min
 		constraints = []
 
@@ -60,14 +212,18 @@ class BoustrophedonPattern(ConstraintLayout):
 		return constraints
 
 class HorizontalBoustrophedonPattern(ConstraintLayout):
-	""" Deprecated: Use OrientedBoustrophedonPattern Instead """
+	""" Deprecated: Use OrientedBoustrophedonPattern Instead
+
+		 With batched the sweep lines are intersected in one pass, as in BoustrophedonPattern.
+	"""
 
-	def __init__(self, vehicle_radius, sensor_radius, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, batched=False, **unknown_options):
 		# TODO Add orientation support
 		self._sensor_radius = sensor_radius
 		self._vehicle_radius = vehicle_radius
+		self._batched = batched
 
-	def layout_constraints(self, area, **unknown_options):
+	def layout_constraints(self, area, batched=None, **unknown_options):
 		# Horizonal Boustrophedon pattern, TODO: unify into universal boustrophedon patten
 		x_min, y_min, x_max, y_max = area.bounds
 		
@@ -91,6 +247,18 @@ class HorizontalBoustrophedonPattern(ConstraintLayout):
 		num_constraints = np.ceil(y_dist / (2*self._sensor_radius)).astype(int)
 		transect_width = np.around(y_dist / num_constraints, decimals=5)
 
+		if batched is None:
+			batched = self._batched
+
+		if batched:
+			y_positions = np.arange(y_min, y_max + transect_width/2., transect_width)
+			y_positions = y_positions[y_positions <= y_max]
+
+			# Crossings are ordered along +x to match the vertical pattern's ordering along +y
+			intersector = ScanlineIntersector(offset_polygon, (0., 1.), line_direction=(1., 0.))
+
+			return _segment_constraints(intersector.iter_segments(y_positions))
+
 		current_y_pos = y_min
 		constraints = []
 
@@ -116,11 +284,12 @@ class HorizontalBoustrophedonPattern(ConstraintLayout):
 
 class OrientedBoustrophedonPattern(ConstraintLayout):
 
-	def __init__(self, vehicle_radius, sensor_radius, sweep_direction, boundary_offset=None, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, sweep_direction, boundary_offset=None, batched=False, **unknown_options):
 		# TODO Add orientation support
 		self._vehicle_radius = vehicle_radius
 		self._sensor_radius = sensor_radius
 		self._sweep_direction  = np.array(sweep_direction) / np.linalg.norm(np.array(sweep_direction))
+		self._batched = batched
 		if boundary_offset:
 			if boundary_offset >= self._vehicle_radius:
 				self._boundary_offset = boundary_offset
@@ -137,7 +306,12 @@ class OrientedBoustrophedonPattern(ConstraintLayout):
 
 		return cls(sensor_radius, vehicle_radius, sweep_direction, **other_options)
 
-	def layout_constraints(self, area, compute_offset=True, **unknown_options):
+	@property
+	def sweep_direction(self):
+		""" Unit vector the sweep line advances along, perpendicular to the transects """
+		return self._sweep_direction
+
+	def boundary_offset(self, area, compute_offset=True):
 		offset = self._boundary_offset
 
 		if compute_offset:
@@ -148,6 +322,18 @@ class OrientedBoustrophedonPattern(ConstraintLayout):
 
 			offset = max(self._vehicle_radius, max_offset)
 
+		return offset
+
+	def layout_constraints(self, area, compute_offset=True, batched=None, **unknown_options):
+		offset = self.boundary_offset(area, compute_offset)
+
+		if batched is None:
+			batched = self._batched
+
+		if batched:
+			offset_area = area.polygon.buffer(-offset, join_style=2)
+			return self.layout_polygon_constraints(offset_area)
+
 		# Compute direction vector of sweep line from perpendicular unit sweep direction vector
 		sweep_line_direction = np.array([-self._sweep_direction[1], self._sweep_direction[0]])
 
@@ -201,71 +387,39 @@ class OrientedBoustrophedonPattern(ConstraintLayout):
 		# for intersections at edges of coverage area
 		delta = 0.000001
 
+		# Count sweep lines separately since non-convex areas can yield several constraints per line
+		num_transects = 0
+
 		#while current_sweep_pos <= offset_area_max:
-		# Want to have one more constraint than cells
-		while len(constraints) <= num_cells:
+		# Want to have one more transect than cells
+		while num_transects <= num_cells:
 			if offset_area.intersects(sweep_line):
 				intersection = offset_area.intersection(sweep_line)
-				if isinstance(intersection, shapely.geometry.MultiLineString):
-					print(type(intersection))
-					
-				intersection_coords = list(intersection.coords)
+				# Concave areas split the sweep line into several pieces, each becomes a constraint
+				pieces = list(intersection.geoms) if hasattr(intersection, 'geoms') else [intersection]
+				pieces.sort(key=lambda piece: np.dot(np.array(piece.coords[0]), sweep_line_direction))
 
-				# Sort intersection coordinates by distance along sweep_line - avoids issues with arbitrary ordering
-				intersection_coords.sort(key=lambda coords: np.dot(np.array(coords), sweep_line_direction))
+				for piece in pieces:
+					intersection_coords = list(piece.coords)
 
-				vec_length = lambda coords: np.linalg.norm(np.array(coords[1]) - np.array(coords[0]))
+					# Sort intersection coordinates by distance along sweep_line - avoids issues with arbitrary ordering
+					intersection_coords.sort(key=lambda coords: np.dot(np.array(coords), sweep_line_direction))
 
-				if len(intersection_coords) > 1 and vec_length(intersection_coords) > self._vehicle_radius:
-					#print(f"Good intersection, Adding constraint with coords: {intersection_coords}")
-					constraints.append(OpenConstraint(intersection_coords))
-				else:
-					int_pt = np.array(intersection_coords[0])
-					# If there are more than two coords in intersection_coords, average them or choose one
-					if len(intersection_coords) > 1:
-						int_pt = np.mean(np.array(intersection_coords), axis=0)
+					vec_length = lambda coords: np.linalg.norm(np.array(coords[1]) - np.array(coords[0]))
 
-					# Find closest corner
-					min_idx = 0.
-					min_dist = 9999.
-					for i, pt in enumerate(offset_verts):
-						dist = np.linalg.norm(np.array(pt) - int_pt)
-						if dist < min_dist:
-							min_idx = i
-							min_dist = dist
-
-					# Intersection occurs at a single point so we find the side of the
-					# offset polygon that is most aligned with the transect orientation, i.e.  
-					# least aligned with sweep direction, and use that as the first constraint
-					# corner = offset_verts[start_point_index]
-					# pt1 = offset_verts[(start_point_index-1)%len(offset_verts)]
-					# pt2 = offset_verts[(start_point_index+1)%len(offset_verts)]
-					corner = offset_verts[min_idx]
-					pt1 = offset_verts[(min_idx-1)%len(offset_verts)]
-					pt2 = offset_verts[(min_idx+1)%len(offset_verts)]
-					side_vec1 = np.array(pt1) - np.array(corner)
-					side_vec1 /= np.linalg.norm(side_vec1)
-					side_vec2 = np.array(pt2) - np.array(corner)
-					side_vec2 /= np.linalg.norm(side_vec2)
-					side_proj1 = np.dot(sweep_line_direction, side_vec1)
-					side_proj2 = np.dot(sweep_line_direction, side_vec2)
-
-					if abs(side_proj1) > abs(side_proj2):
-						if side_proj1 < 0:
-							#print(f"Adding constraint with coords: {[pt1, corner]}")
-							constraints.append(OpenConstraint([pt1, corner]))
-						else:
-							#print(f"Adding constraint with coords: {[corner, pt1]}")
-							constraints.append(OpenConstraint([corner, pt1]))
+					if len(intersection_coords) > 1 and vec_length(intersection_coords) > self._vehicle_radius:
+						#print(f"Good intersection, Adding constraint with coords: {intersection_coords}")
+						constraints.append(OpenConstraint(intersection_coords))
 					else:
-						if side_proj2 < 0:
-							#print(f"Adding constraint with coords: {[pt2, corner]}")
-							constraints.append(OpenConstraint([pt2, corner]))
-						else:
-							#print(f"Adding constraint with coords: {[corner, pt2]}")
-							constraints.append(OpenConstraint([corner, pt2]))
+						int_pt = np.array(intersection_coords[0])
+						# If there are more than two coords in intersection_coords, average them or choose one
+						if len(intersection_coords) > 1:
+							int_pt = np.mean(np.array(intersection_coords), axis=0)
+
+						constraints.append(self._corner_constraint(int_pt, [offset_verts], sweep_line_direction))
 
 				# Advance sweep line
+				num_transects += 1
 				current_sweep_pos += transect_width
 				sweep_line_coords += (transect_width * self._sweep_direction)
 				
@@ -273,7 +427,7 @@ class OrientedBoustrophedonPattern(ConstraintLayout):
 				sweep_line = shapely.geometry.LineString(line_coords)
 
 			# Probably don't need this now since we compute the first and last constraints
-			elif len(constraints) == 0: 
+			elif num_transects == 0: 
 				#print(f"Sweepline does not intersect polygon, advancing line by {delta}")
 				# Line doesn't interesect polygon and no constraints have been found yet
 				# Advancing slightly and trying again
@@ -292,6 +446,103 @@ class OrientedBoustrophedonPattern(ConstraintLayout):
 			
 		return constraints
 
+	def _corner_constraint(self, int_pt, rings, sweep_line_direction):
+		# Find closest corner on any of the rings of the offset area
+		min_idx = 0.
+		min_dist = 9999.
+		offset_verts = rings[0]
+		for ring in rings:
+			for i, pt in enumerate(ring):
+				dist = np.linalg.norm(np.array(pt) - int_pt)
+				if dist < min_dist:
+					min_idx = i
+					min_dist = dist
+					offset_verts = ring
+
+		# Intersection occurs at a single point so we find the side of the
+		# offset polygon that is most aligned with the transect orientation, i.e.  
+		# least aligned with sweep direction, and use that as the constraint
+		corner = offset_verts[min_idx]
+		pt1 = offset_verts[(min_idx-1)%len(offset_verts)]
+		pt2 = offset_verts[(min_idx+1)%len(offset_verts)]
+		side_vec1 = np.array(pt1) - np.array(corner)
+		side_vec1 /= np.linalg.norm(side_vec1)
+		side_vec2 = np.array(pt2) - np.array(corner)
+		side_vec2 /= np.linalg.norm(side_vec2)
+		side_proj1 = np.dot(sweep_line_direction, side_vec1)
+		side_proj2 = np.dot(sweep_line_direction, side_vec2)
+
+		if abs(side_proj1) > abs(side_proj2):
+			if side_proj1 < 0:
+				return OpenConstraint([pt1, corner])
+			else:
+				return OpenConstraint([corner, pt1])
+		else:
+			if side_proj2 < 0:
+				return OpenConstraint([pt2, corner])
+			else:
+				return OpenConstraint([corner, pt2])
+
+	def _sweep_positions(self, offset_area_min, offset_area_max):
+		""" Computes the position along the sweep direction of every transect, one more than the number of cells """
+		offset_area_width = offset_area_max - offset_area_min
+
+		num_cells = max(1, np.ceil(offset_area_width / (2*self._sensor_radius)).astype(int))
+		transect_width = np.around(offset_area_width / num_cells, decimals=5)
+
+		# Rounding the transect width can push the last sweep line just past the polygon, pull it back
+		positions = offset_area_min + transect_width * np.arange(num_cells+1)
+
+		return np.minimum(positions, offset_area_max)
+
+	def layout_polygon_constraints(self, offset_area):
+		""" Lays out transects over an already offset polygon. Computes every sweep line position up
+			 front and finds all of their crossings with the boundary of the polygon in a single scanline
+			 pass, rather than one shapely intersection per transect. Areas that split a transect into
+			 several pieces yield one constraint per piece.
+		"""
+		return list(self.iter_polygon_constraints(offset_area))
+
+	def sweep_positions(self, offset_area):
+		""" Positions along the sweep direction of every transect laid out over the offset area """
+		intersector = ScanlineIntersector(offset_area, self._sweep_direction)
+
+		return self._sweep_positions(*intersector.extents)
+
+	def iter_polygon_constraints(self, offset_area, positions=None):
+		""" Generator version of layout_polygon_constraints, yields constraints in sweep order as
+			 each sweep line is intersected with the polygon. Transect positions can be supplied when
+			 only part of a larger layout is wanted, e.g. a single tile of a large area.
+		"""
+		intersector = ScanlineIntersector(offset_area, self._sweep_direction)
+		sweep_line_direction = intersector.line_direction
+
+		if positions is None:
+			positions = self._sweep_positions(*intersector.extents)
+
+		for segments in intersector.iter_segments(positions):
+			for start, end in segments:
+				if np.linalg.norm(end - start) > self._vehicle_radius:
+					yield OpenConstraint([tuple(start.tolist()), tuple(end.tolist())])
+				else:
+					int_pt = np.mean([start, end], axis=0)
+					yield self._corner_constraint(int_pt, intersector.rings, sweep_line_direction)
+
+	def layout_constraint_set(self, area, compute_offset=True, **unknown_options):
+		""" Same transects as layout_constraints, stored in a single columnar ConstraintSet """
+		offset_area = area.polygon.buffer(-self.boundary_offset(area, compute_offset), join_style=2)
+
+		return ConstraintSet.from_coord_lists(c.coord_list for c in self.iter_polygon_constraints(offset_area))
+
+	def layout_constraints_iter(self, area, compute_offset=True, **unknown_options):
+		""" Streaming version of layout_constraints. Constraints are yielded in sweep order as they
+			 are laid out so refinement, sequencing and linking can start on the first transects while
+			 the rest of the area is still being processed.
+		"""
+		offset_area = area.polygon.buffer(-self.boundary_offset(area, compute_offset), join_style=2)
+
+		yield from self.iter_polygon_constraints(offset_area)
+
 
 	"""
 	def layout_constraints(self, area, compute_offset=True, **unknown_options):
@@ -446,11 +697,268 @@ class OrientedBoustrophedonPattern(ConstraintLayout):
 		return constraints
 	"""
 
+class BoustrophedonCellDecomposition(ConstraintLayout):
+	""" Boustrophedon cell decomposition of areas with holes (islands) and concave boundaries. The
+		 offset area is split into cells that are monotone along the sweep direction, so every sweep
+		 line crosses a cell in a single piece, and each cell is laid out with its own
+		 OrientedBoustrophedonPattern.
+	"""
+
+	def __init__(self, vehicle_radius, sensor_radius, sweep_direction, boundary_offset=None, **unknown_options):
+		self._sweep_direction = np.array(sweep_direction) / np.linalg.norm(np.array(sweep_direction))
+		self._cell_layout = OrientedBoustrophedonPattern(vehicle_radius, sensor_radius, sweep_direction, boundary_offset, batched=True)
+
+	@classmethod
+	def from_transect_orientation(cls, vehicle_radius, sensor_radius, transect_orientation, **other_options):
+		sweep_direction = (-transect_orientation[1], transect_orientation[0])
+
+		return cls(vehicle_radius, sensor_radius, sweep_direction, **other_options)
+
+	def _offset_area(self, area, compute_offset=True):
+		offset = self._cell_layout.boundary_offset(area, compute_offset)
+
+		# Buffer the full polygon rather than its exterior so holes are kept
+		return area.polygon.buffer(-offset, join_style=2)
+
+	def decompose(self, area, compute_offset=True):
+		""" Returns the list of monotone cell polygons covering the offset area, ordered along the sweep direction """
+		offset_area = self._offset_area(area, compute_offset)
+
+		cells = []
+		for polygon in polygon_parts(offset_area):
+			cells.extend(self._decompose_polygon(polygon))
+
+		return cells
+
+	def cell_positions(self, area, compute_offset=True, tolerance=1e-7):
+		""" Returns (cell, positions) for every cell of the area, where positions are the sweep
+			 positions of the transects the cell lays out. Positions are computed once for the whole
+			 area, so spacing is uniform across cells, and a transect on the boundary between two cells
+			 is only laid out by the cell that continues past it.
+		"""
+		offset_area = self._offset_area(area, compute_offset)
+		positions = self._cell_layout.sweep_positions(offset_area)
+
+		cells = []
+		for polygon in polygon_parts(offset_area):
+			cells.extend(self._decompose_polygon(polygon))
+
+		extents = [ScanlineIntersector(cell, self._sweep_direction).extents for cell in cells]
+
+		cell_positions = []
+		for cell, (lower, upper) in zip(cells, extents):
+			has_successor = any(abs(other_lower - upper) <= tolerance and other is not cell and other.intersects(cell) for other, (other_lower, _) in zip(cells, extents))
+			owned = (positions >= lower - tolerance) & (positions < upper - tolerance)
+			if not has_successor:
+				owned |= np.abs(positions - upper) <= tolerance
+			cell_positions.append((cell, positions[owned]))
+
+		return cell_positions
+
+	def _decompose_polygon(self, polygon):
+		intersector = ScanlineIntersector(polygon, self._sweep_direction)
+		line_direction = intersector.line_direction
+
+		# The polygon is cut into slabs at every vertex. Within a slab no vertex is crossed, so each
+		# piece of the sweep line is bounded by the same two edges and the slab splits into trapezoids
+		events = np.unique(np.concatenate([np.asarray(ring).dot(self._sweep_direction) for ring in intersector.rings]))
+		if len(events) < 2:
+			return [polygon]
+
+		mid_positions = (events[:-1] + events[1:]) / 2.
+
+		def intervals(trapezoids, position):
+			# Extent along the sweep line of each trapezoid at position
+			return [tuple(intersector.edge_points(edges, position).dot(line_direction)) for edges in trapezoids]
+
+		cell_lower_chains = []
+		cell_upper_chains = []
+		prev_trapezoids = []
+		prev_cells = []
+
+		for slab_idx, (_, crossed_edges) in enumerate(intersector.iter_crossings(mid_positions)):
+			left_pos, right_pos = events[slab_idx], events[slab_idx+1]
+			trapezoids = list(zip(crossed_edges[::2], crossed_edges[1::2]))
+
+			# Trapezoids in adjacent slabs are connected when their intervals overlap on the shared boundary
+			left_intervals = intervals(trapezoids, left_pos)
+			prev_intervals = intervals(prev_trapezoids, left_pos)
+			neighbours = [[j for j, (prev_lo, prev_hi) in enumerate(prev_intervals) if min(hi, prev_hi) - max(lo, prev_lo) > 1e-9] for lo, hi in left_intervals]
+			prev_neighbour_count = [sum(j in n for n in neighbours) for j in range(len(prev_trapezoids))]
+
+			cells = []
+			for (lower, upper), trapezoid_neighbours in zip(trapezoids, neighbours):
+				# Trapezoids continue a cell unless the connectivity of the sweep line changes here
+				if len(trapezoid_neighbours) == 1 and prev_neighbour_count[trapezoid_neighbours[0]] == 1:
+					cell_idx = prev_cells[trapezoid_neighbours[0]]
+				else:
+					cell_idx = len(cell_lower_chains)
+					cell_lower_chains.append([])
+					cell_upper_chains.append([])
+
+				lower_pts = intersector.edge_points([lower, lower], [left_pos, right_pos])
+				upper_pts = intersector.edge_points([upper, upper], [left_pos, right_pos])
+				cell_lower_chains[cell_idx].extend(tuple(pt) for pt in lower_pts.tolist())
+				cell_upper_chains[cell_idx].extend(tuple(pt) for pt in upper_pts.tolist())
+				cells.append(cell_idx)
+
+			prev_trapezoids = trapezoids
+			prev_cells = cells
+
+		cell_polygons = []
+		for lower_chain, upper_chain in zip(cell_lower_chains, cell_upper_chains):
+			boundary = [*lower_chain, *reversed(upper_chain)]
+			# Remove repeated points where trapezoids meet or collapse to a triangle
+			boundary = [pt for i, pt in enumerate(boundary) if not np.allclose(pt, boundary[i-1])]
+			if len(boundary) < 3:
+				continue
+
+			cell = shapely.geometry.Polygon(boundary)
+			if cell.area > 0.:
+				cell_polygons.append(cell)
+
+		return cell_polygons
+
+	def layout_cell(self, cell_polygon, positions=None):
+		""" Lays out the transects of a single cell at the given sweep positions, by default at
+			 positions spanning the cell alone
+		"""
+		if positions is not None and len(positions) == 0:
+			return []
+
+		return list(self._cell_layout.iter_polygon_constraints(cell_polygon, positions))
+
+	def layout_cells(self, area, compute_offset=True):
+		""" Returns a list of constraints for each cell of the area """
+		return [self.layout_cell(cell, positions) for cell, positions in self.cell_positions(area, compute_offset)]
+
+	def layout_constraints(self, area, compute_offset=True, **unknown_options):
+		return [c for cell_constraints in self.layout_cells(area, compute_offset) for c in cell_constraints]
+
+	def layout_constraints_iter(self, area, compute_offset=True, **unknown_options):
+		""" Streaming version of layout_constraints, yields the constraints of each cell in sweep
+			 order as soon as that cell is laid out
+		"""
+		for cell, positions in self.cell_positions(area, compute_offset):
+			yield from self.layout_cell(cell, positions)
+
+def _ring_interior_angles(ring):
+	""" Angle in degrees between the two sides at every vertex of an (N,2) ring """
+	prev_vecs = np.roll(ring, 1, axis=0) - ring
+	next_vecs = np.roll(ring, -1, axis=0) - ring
+	cos_angles = np.sum(prev_vecs * next_vecs, axis=1) / (np.linalg.norm(prev_vecs, axis=1) * np.linalg.norm(next_vecs, axis=1))
+
+	return np.degrees(np.arccos(np.clip(cos_angles, -1., 1.)))
+
+class InwardOffsetRing(object):
+	""" Incrementally offsets a simple ring inward with mitred corners. Offsetting keeps every edge
+		 parallel to the original, so the edge directions, corner displacement vectors and interior
+		 angles are computed once and reused for every subsequent ring. Offsets that would cause a
+		 topological event (an edge collapsing, the ring splitting or self intersecting, or a corner
+		 exceeding the mitre limit) are rejected so the caller can fall back to an exact buffer.
+	"""
+
+	def __init__(self, ring, mitre_limit=5.0):
+		self._ring = np.asarray(ring, dtype=float)
+
+		edge_vecs = np.roll(self._ring, -1, axis=0) - self._ring
+		self._edge_dirs = edge_vecs / np.linalg.norm(edge_vecs, axis=1)[:, np.newaxis]
+
+		# Inward normals are on the left of counter-clockwise rings and the right of clockwise ones
+		signed_area = np.sum(self._ring[:, 0] * np.roll(self._ring[:, 1], -1) - np.roll(self._ring[:, 0], -1) * self._ring[:, 1])
+		side = 1. if signed_area > 0 else -1.
+		normals = side * np.stack((-self._edge_dirs[:, 1], self._edge_dirs[:, 0]), axis=1)
+
+		# Each vertex moves along the bisector of its two edges, scaled so both edges move by the offset
+		prev_normals = np.roll(normals, 1, axis=0)
+		normal_dots = np.sum(prev_normals * normals, axis=1)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			self._corner_vecs = (prev_normals + normals) / (1. + normal_dots)[:, np.newaxis]
+			mitre_ratios = np.sqrt(2. / (1. + normal_dots))
+
+		self._valid = bool(np.all(np.isfinite(mitre_ratios)) and np.all(mitre_ratios <= mitre_limit))
+
+		# Convex rings can only shrink or collapse edges, never split or self intersect
+		cross = np.cross(np.roll(self._edge_dirs, 1, axis=0), self._edge_dirs)
+		self._convex = bool(np.all(side * cross >= 0.))
+
+		self._interior_angles = _ring_interior_angles(self._ring)
+
+	@property
+	def ring(self):
+		return self._ring
+
+	@property
+	def interior_angles(self):
+		return self._interior_angles
+
+	def offset(self, distance):
+		""" Returns the ring offset inward by distance, or None if the offset needs an exact buffer """
+		if not self._valid:
+			return None
+
+		new_ring = self._ring + distance * self._corner_vecs
+
+		# An edge collapsed if any offset edge points against its original direction
+		new_edge_vecs = np.roll(new_ring, -1, axis=0) - new_ring
+		if np.any(np.sum(new_edge_vecs * self._edge_dirs, axis=1) <= 0.):
+			return None
+
+		if not self._convex and not shapely.geometry.LinearRing(new_ring).is_simple:
+			return None
+
+		self._ring = new_ring
+
+		return new_ring
+
+def _spiral_branch(shared, polygon):
+	""" Offsets one branch of a spiral inward until it vanishes or splits into several polygons.
+		 Returns the coordinate lists of the rings of the branch and the polygons of any child branches.
+	"""
+	vehicle_radius, sensor_radius, mitre_limit = shared
+	rings = []
+
+	while True:
+		coords = list(polygon.exterior.coords)[:-1]
+		rings.append(coords)
+
+		if len(polygon.interiors) > 0:
+			# Only hole free rings can be offset incrementally, holes need an exact buffer
+			offsetter = None
+			min_angle = min(_ring_interior_angles(np.asarray(coords)))
+		else:
+			offsetter = InwardOffsetRing(coords, mitre_limit)
+			min_angle = min(offsetter.interior_angles)
+
+		# Compute the max offset for the next ring that still ensures complete coverage
+		max_offset = 2 * sensor_radius * np.sin(np.radians(min_angle/2.))
+		offset = max(vehicle_radius, max_offset)
+
+		# Edges keep their direction while no topological event occurs so the offset stays the same
+		while offsetter is not None:
+			new_ring = offsetter.offset(offset)
+			if new_ring is None:
+				break
+
+			rings.append([tuple(pt) for pt in new_ring.tolist()])
+			polygon = shapely.geometry.Polygon(new_ring)
+
+		buffered_polygon = polygon.buffer(-offset, join_style=2, mitre_limit=mitre_limit)
+		child_polygons = polygon_parts(buffered_polygon)
+
+		if len(child_polygons) != 1:
+			return rings, child_polygons
+
+		polygon = child_polygons[0]
+
 class SpiralPattern(ConstraintLayout):
 
-	def __init__(self, vehicle_radius, sensor_radius, boundary_offset=None, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, boundary_offset=None, incremental=False, max_workers=None, **unknown_options):
 		self._vehicle_radius = vehicle_radius
 		self._sensor_radius = sensor_radius
+		self._incremental = incremental
+		# Branches are split across one worker process per core by default, 1 processes them serially
+		self._max_workers = max_workers
 		if boundary_offset:
 			if boundary_offset >= self._vehicle_radius:
 				self._boundary_offset = boundary_offset
@@ -463,25 +971,11 @@ class SpiralPattern(ConstraintLayout):
 
 	def _compute_interior_angles(self, polygon):
 		coord_list = list(polygon.exterior.coords)[:-1]
+		angles = _ring_interior_angles(np.asarray(coord_list))
 
-		interior_angles = {}
+		return dict(zip(coord_list, angles))
 
-		for i, pt in enumerate(coord_list):
-			curr_pt = np.array(pt)
-			prev_pt = np.array(coord_list[i-1])
-			next_pt = np.array(coord_list[(i+1)%len(coord_list)])
-
-			a = prev_pt - curr_pt
-			b = next_pt - curr_pt
-			cos_angle = np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-			angle = np.degrees(np.arccos(cos_angle))
-
-			interior_angles[pt] = angle
-
-		return interior_angles
-
-
-	def layout_constraints(self, area, compute_offset=True, **unknown_options):
+	def layout_constraints(self, area, compute_offset=True, incremental=None, **unknown_options):
 		offset = self._boundary_offset
 
 		if compute_offset:
@@ -493,18 +987,20 @@ class SpiralPattern(ConstraintLayout):
 			offset = max(self._vehicle_radius, max_offset)
 
 		buffered_polygon = area.polygon.buffer(-offset, join_style=2)
-		offset_polygons = queue.Queue()
-		if isinstance(buffered_polygon, shapely.geometry.MultiPolygon):
-			for p in list(buffered_polygon):
-				offset_polygons.put(p)
-		else:
-			offset_polygons.put(buffered_polygon)
+
+		if incremental is None:
+			incremental = self._incremental
+
+		if incremental:
+			return self._layout_branches(polygon_parts(buffered_polygon))
+
+		offset_polygons = collections.deque(polygon_parts(buffered_polygon))
 
 		constraints = []
 
 		#while offset_polygon.exterior:
-		while not offset_polygons.empty():
-			curr_poly = offset_polygons.get()
+		while len(offset_polygons) > 0:
+			curr_poly = offset_polygons.popleft()
 			# Create closed constraint from coords of current offset polygon
 			constraints.append(ClosedConstraint(curr_poly.exterior.coords[:-1]))
 			
@@ -514,13 +1010,44 @@ class SpiralPattern(ConstraintLayout):
 			offset = max(self._vehicle_radius, max_offset)
 
 			buffered_polygon = curr_poly.buffer(-offset, join_style=2)
-			
-			if buffered_polygon:
-				if isinstance(buffered_polygon, shapely.geometry.MultiPolygon):
-					for p in list(buffered_polygon):
-						offset_polygons.put(p)
-				else:
-					offset_polygons.put(buffered_polygon)
+			offset_polygons.extend(polygon_parts(buffered_polygon))
+
+		return constraints
+
+	def _layout_branches(self, branch_polygons, mitre_limit=5.0):
+		""" Lays out rings with the incremental offset engine. Every polygon produced by a split is an
+			 independent branch, so each generation of branches can be offset in parallel. Rings are
+			 returned in the same breadth first order as the exact buffer layout.
+		"""
+		# Branches are numbered in the order they are offset, children get the ids after the current generation
+		branch_rings = []
+		branch_children = []
+		roots = list(range(len(branch_polygons)))
+
+		shared = (self._vehicle_radius, self._sensor_radius, mitre_limit)
+		with WorkerPool(_spiral_branch, shared, self._max_workers) as pool:
+			while len(branch_polygons) > 0:
+				first_child = len(branch_rings) + len(branch_polygons)
+				child_branch_polygons = []
+				for rings, child_polygons in pool.map(branch_polygons):
+					next_id = first_child + len(child_branch_polygons)
+					branch_rings.append(rings)
+					branch_children.append(list(range(next_id, next_id + len(child_polygons))))
+					child_branch_polygons.extend(child_polygons)
+
+				branch_polygons = child_branch_polygons
+
+		# Each polygon of the exact layout emits one ring and queues the polygons offset from it, so
+		# replay that queue over (branch, ring) pairs, a branch's children following its last ring
+		constraints = []
+		queue = collections.deque((branch, 0) for branch in roots)
+		while len(queue) > 0:
+			branch, ring_idx = queue.popleft()
+			constraints.append(ClosedConstraint(branch_rings[branch][ring_idx]))
+			if ring_idx + 1 < len(branch_rings[branch]):
+				queue.append((branch, ring_idx + 1))
+			else:
+				queue.extend((child, 0) for child in branch_children[branch])
 
 		return constraints
 """
@@ -559,12 +1086,26 @@ class SpiralPattern(ConstraintLayout):
 """
 
 
+def _polyline_length(coords):
+	return np.sum(np.linalg.norm(np.diff(coords, axis=0), axis=1))
+
+def _resample_polyline(coords, num_points):
+	""" Resamples an (N,2) polyline to num_points points equally spaced in arc length """
+	arc_lengths = np.concatenate(([0.], np.cumsum(np.linalg.norm(np.diff(coords, axis=0), axis=1))))
+	samples = np.linspace(0., arc_lengths[-1], num_points)
+
+	return np.stack((np.interp(samples, arc_lengths, coords[:, 0]), np.interp(samples, arc_lengths, coords[:, 1])), axis=1)
+
 class StreamlinePattern(ConstraintLayout):
 
-	def __init__(self, vehicle_radius, sensor_radius, boundary_offset=None, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, boundary_offset=None, vectorized=False, resample_spacing=None, max_cross_sections=None, **unknown_options):
 		# TODO Add orientation support
 		self._vehicle_radius = vehicle_radius
 		self._sensor_radius = sensor_radius
+		self._vectorized = vectorized
+		# Optionally resample banks by arc length so waypoint density doesn't depend on how the domain was digitized
+		self._resample_spacing = resample_spacing
+		self._max_cross_sections = max_cross_sections
 		if boundary_offset:
 			if boundary_offset >= self._vehicle_radius:
 				self._boundary_offset = boundary_offset
@@ -575,7 +1116,7 @@ class StreamlinePattern(ConstraintLayout):
 			print('No boundary offset specified, setting to max of vehicle and sensor radii.')
 			self._boundary_offset = max(sensor_radius, vehicle_radius)
 
-	def layout_constraints(self, area, compute_offset=True, bias=None, **unknown_options):
+	def layout_constraints(self, area, compute_offset=True, bias=None, vectorized=None, **unknown_options):
 		offset = self._boundary_offset
 
 		if compute_offset:
@@ -603,9 +1144,26 @@ class StreamlinePattern(ConstraintLayout):
 		new_coords = [*coords[idx:], *coords[:idx]]
 
 		mid_idx = int(len(new_coords)/2)
+		bank_1_coords = np.asarray(new_coords[:mid_idx])
+		bank_2_coords = np.asarray(new_coords[mid_idx:][::-1])
+
+		if self._resample_spacing is not None or self._max_cross_sections is not None:
+			bank_1_coords, bank_2_coords = self._resample_banks(bank_1_coords, bank_2_coords)
+		else:
+			# Banks are paired vertex by vertex, the longer bank's last vertex has no partner
+			bank_2_coords = bank_2_coords[:len(bank_1_coords)]
+
+		if vectorized is None:
+			vectorized = self._vectorized
+
+		if vectorized:
+			transect_coords = self._compute_transects(bank_1_coords, bank_2_coords, bias)
+
+			return [OpenConstraint(coord_list) for coord_list in transect_coords]
+
 		#print(mid_idx,new_coords[mid_idx-1], new_coords[mid_idx], new_coords[mid_idx+1])
-		bank_1 = [np.array(pt) for pt in new_coords[:mid_idx]]
-		bank_2 = [np.array(pt) for pt in reversed(new_coords[mid_idx:])]
+		bank_1 = list(bank_1_coords)
+		bank_2 = list(bank_2_coords)
 		#print(len(area.polygon.exterior.coords), len(new_coords), len(bank_1), len(bank_2))
 
 		# print(len(offset_area.exterior.coords), mid_idx)
@@ -807,4 +1365,77 @@ class StreamlinePattern(ConstraintLayout):
 
 		constraints = [OpenConstraint(coord_list) for coord_list in transect_coords]
 
-		return constraints
\ No newline at end of file
+		return constraints
+
+	def _resample_banks(self, bank_1, bank_2):
+		""" Resamples both banks to the same number of points equally spaced in arc length, using the
+			 longer bank and the resample spacing to pick the count, capped at the max cross sections
+		"""
+		bank_length = max(_polyline_length(bank_1), _polyline_length(bank_2))
+
+		if self._resample_spacing is not None:
+			num_cross_sections = int(np.ceil(bank_length / self._resample_spacing)) + 1
+			if self._max_cross_sections is not None:
+				num_cross_sections = min(num_cross_sections, self._max_cross_sections)
+		else:
+			num_cross_sections = self._max_cross_sections
+
+		num_cross_sections = max(2, num_cross_sections)
+
+		return _resample_polyline(bank_1, num_cross_sections), _resample_polyline(bank_2, num_cross_sections)
+
+	def _compute_transects(self, bank_1, bank_2, bias=None):
+		""" Computes the points of every transect on every cross section in whole array operations.
+			 bank_1 and bank_2 are (N,2) arrays of paired bank points. Returns a list of coordinate
+			 lists, one per transect.
+		"""
+		cross_vecs = bank_2 - bank_1
+		lengths = np.linalg.norm(cross_vecs, axis=1)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			directions = cross_vecs / lengths[:, np.newaxis]
+
+		num_transects = int(np.ceil(lengths.max()/(2*self._sensor_radius) - 1))
+		transect_width = self._sensor_radius * 2.
+
+		# Rows are transects, columns are cross sections
+		transect_idx = np.arange(num_transects+2)[:, np.newaxis]
+		last_idx = num_transects + 1
+
+		# Points stepped a whole transect width at a time in from the outer bank
+		stepped_pts = bank_2 - (transect_idx * transect_width)[:, :, np.newaxis] * directions
+		bank_pts = np.broadcast_to(bank_1, stepped_pts.shape)
+		valid = np.ones(stepped_pts.shape[:2], dtype=bool)
+
+		if bias == 'centerline':
+			# Bias towards centerline
+			half_num_full_transects = np.floor(lengths / (2*transect_width)).astype(int)
+			max_full_transects = np.floor(lengths / transect_width).astype(int)
+			num_centerline = np.maximum(0, np.ceil((num_transects - max_full_transects)/2.)).astype(int)
+
+			centerline_start = half_num_full_transects + 1
+			inner_start = centerline_start + num_centerline
+			inner_end = inner_start + half_num_full_transects
+
+			# Transects after the centerline step back out from the inner bank
+			inner_pts = bank_1 + ((inner_end - transect_idx) * transect_width)[:, :, np.newaxis] * directions
+			centerline_pts = np.broadcast_to(bank_1 + cross_vecs / 2., stepped_pts.shape)
+
+			transect_pts = np.where((transect_idx < centerline_start)[:, :, np.newaxis], stepped_pts,
+								np.where((transect_idx < inner_start)[:, :, np.newaxis], centerline_pts,
+								np.where((transect_idx < inner_end)[:, :, np.newaxis], inner_pts, bank_pts)))
+
+		elif bias in ('inner_bank', 'pruned_inner_bank'):
+			# Bias towards inner bank and collapse redundant transects
+			max_full_transects = np.floor_divide(lengths, transect_width).astype(int)
+			full = (transect_idx <= max_full_transects) & (transect_idx < last_idx)
+
+			transect_pts = np.where(full[:, :, np.newaxis], stepped_pts, bank_pts)
+
+			if bias == 'pruned_inner_bank':
+				# Partial width transects are dropped, only the last one follows the inner bank
+				valid = full | (transect_idx == last_idx)
+
+		else:
+			transect_pts = bank_1 + (transect_idx / (num_transects+1))[:, :, np.newaxis] * cross_vecs
+
+		return [[tuple(pt) for pt in pts[mask].tolist()] for pts, mask in zip(transect_pts, valid)]
\ No newline at end of file
@@ -1,14 +1,34 @@
 import collections
+import heapq
+import json
+import os
+import numpy as np
+import shapely.geometry
+import shapely.prepared
 
 import robot_primitives as rp
 import robot_utils as rut
 
 from .base import ConstraintLinker
+from .caching import LRUCache, geometry_digest
+from .constraint import chain_coord_views
+from .parallel import parallel_map
+from .paths import ArrayPath
 
 class SimpleLinker(ConstraintLinker):
-	""" Simply connects each constraint egress to the following constraint's ingress point """
+	""" Simply connects each constraint egress to the following constraint's ingress point
+
+		 With preallocate the chain is sized first and its coordinates and parameters are written
+		 straight into NumPy arrays, returning an ArrayPath instead of a ConstrainedPath.
+	"""
+
+	def __init__(self, preallocate=False):
+		self._preallocate = preallocate
 
 	def link_constraints(self, constraint_chain, domain=None, ingress_point=None, offset=0.0, **unknown_options):
+		if self._preallocate:
+			return ArrayPath.from_constraint_chain(constraint_chain, ingress_point, endpoint_offset=offset)
+
 		coords = []
 		if ingress_point is not None:
 			coords.append(tuple(ingress_point))
@@ -33,23 +53,163 @@ class SimpleLinker(ConstraintLinker):
 
 		return final_path
 
+class StreamingLinker(ConstraintLinker):
+	""" Connects constraints like SimpleLinker but writes the path to a sink as it goes instead of
+		 building it in memory. The chain is consumed lazily, so it can come straight from a
+		 streaming sequencer, and waypoints with their constrained parameters are written every
+		 chunk_size waypoints as one JSON object per line: {"coords": [...], "thrust": [...], ...}.
+		 Only the current chunk is held in memory (a single constraint longer than chunk_size is
+		 written as one chunk). The sink is a writable text file like object (file, pipe,
+		 socket.makefile('w'), ...) or a filename, which is rewritten by every link_constraints call.
+		 Read a stream back with ArrayPath.from_waypoint_stream.
+	"""
+
+	def __init__(self, sink, chunk_size=4096):
+		self._sink = sink
+		self._chunk_size = chunk_size
+
+	def _write_chunk(self, sink, coords, path_constraints):
+		chunk = {'coords': coords, **path_constraints}
+		sink.write(json.dumps(chunk, default=lambda value: value.tolist()) + '\n')
+
+	def link_constraints(self, constraint_chain, domain=None, ingress_point=None, egress_point=None, offset=0.0, **unknown_options):
+		""" Streams the linked path to the sink, returns the number of waypoints written """
+		if isinstance(self._sink, (str, os.PathLike)):
+			with open(self._sink, 'w') as sink_file:
+				return self._stream_chain(constraint_chain, sink_file, ingress_point, egress_point, offset)
+
+		return self._stream_chain(constraint_chain, self._sink, ingress_point, egress_point, offset)
+
+	def _stream_chain(self, constraint_chain, sink, ingress_point, egress_point, offset):
+		num_waypoints = 0
+		coords = []
+		if ingress_point is not None:
+			coords.append(tuple(ingress_point))
+
+		path_constraints = collections.defaultdict(list)
+
+		for c in constraint_chain:
+			for coord_view in chain_coord_views([c], endpoint_offset=offset):
+				coords.extend(coord_view.tolist())
+
+			# assumes each constraint has the same parameters constrained for now
+			for param, param_value in c.constrained_parameters.items():
+				if param == 'direction':
+					# Skip direction constraints since they aren't necessary in a final path
+					continue
+				else:
+					path_constraints[param].extend(param_value)
+
+			if len(coords) >= self._chunk_size:
+				self._write_chunk(sink, coords, path_constraints)
+				num_waypoints += len(coords)
+				coords = []
+				path_constraints = collections.defaultdict(list)
+
+		if egress_point is not None:
+			coords.append(tuple(egress_point))
+
+		if len(coords) > 0 or len(path_constraints) > 0:
+			self._write_chunk(sink, coords, path_constraints)
+			num_waypoints += len(coords)
+
+		sink.flush()
+
+		return num_waypoints
+
+class _LinkPlanner(object):
+	""" Builds an A* Post-Smoothed Planner for a domain on first use and plans links with it. Passed
+		 to the pool as the shared data, so each worker builds its own planner once and drops it
+		 when the pool shuts down, and the serial path drops it when linking returns.
+	"""
+
+	def __init__(self, domain, arrival_threshold, step_size):
+		self._domain = domain
+		self._arrival_threshold = arrival_threshold
+		self._step_size = step_size
+		self._planner = None
+
+	def __getstate__(self):
+		# Only the settings are sent to workers, each builds its own planner
+		return (self._domain, self._arrival_threshold, self._step_size)
+
+	def __setstate__(self, state):
+		self.__init__(*state)
+
+	def plan_path(self, start, end):
+		if self._planner is None:
+			self._planner = rut.planning.AStarPS(self._domain, rp.heuristics.EuclideanDistance, self._arrival_threshold, self._step_size)
+
+		return self._planner.plan_path(start, end)
+
+def _plan_link(link_planner, link):
+	""" Pool worker that plans a single link """
+	start, end = link
+
+	return link_planner.plan_path(start, end)
+
 class AStarLinker(ConstraintLinker):
 	""" Plans a clear path from each constraint's egress to the next constraints ingress point
 		 using a A* Post-Smoothed Planner
+
+		 Planned links are kept in an LRU cache keyed on the domain geometry, the planner settings and
+		 the endpoints rounded to quantization, so repeated plans only search for new links. The links
+		 of a chain that aren't cached yet are independent and are planned across a process pool, with
+		 the domain sent to each worker once. max_workers=None uses one worker per core and
+		 max_workers=1 plans every link in the calling process.
 	"""
 
+	def __init__(self, quantization=1e-3, maxsize=4096, max_workers=None):
+		self._quantization = quantization
+		self._cache = LRUCache(maxsize)
+		self._max_workers = max_workers
+
+	def _link_key(self, planner_key, start, end):
+		quantize = lambda pt: tuple(np.round(np.asarray(pt, dtype=float) / self._quantization).astype(int).tolist())
+		return (planner_key, quantize(start), quantize(end))
+
+	def _plan_links(self, domain, planner_key, arrival_threshold, step_size, links):
+		""" Plans every link missing from the cache, returns the linking paths in order """
+		keys = [self._link_key(planner_key, start, end) for start, end in links]
+
+		missing = {}
+		for key, (start, end) in zip(keys, links):
+			if key not in self._cache and key not in missing:
+				missing[key] = (start, end)
+
+		link_planner = _LinkPlanner(domain, arrival_threshold, step_size)
+		planned = parallel_map(_plan_link, missing.values(), link_planner, self._max_workers)
+
+		linking_paths = dict(zip(missing.keys(), planned))
+		for key, linking_path in linking_paths.items():
+			self._cache.put(key, linking_path)
+
+		# Links planned now may already have been evicted when the chain is longer than the cache
+		return [linking_paths[key] if key in linking_paths else self._cache.get(key) for key in keys]
+
 	def link_constraints(self, constraint_chain, domain, ingress_point=None, egress_point=None, arrival_threshold=5.0, step_size=0.01, **unknown_options):
-		path_planner = rut.planning.AStarPS(domain, rp.heuristics.EuclideanDistance, arrival_threshold, step_size)
+		planner_key = (geometry_digest(domain.polygon), arrival_threshold, step_size)
+
+		chain_coords = [c.get_coord_list() for c in constraint_chain]
+		chain_coords = [(c, new_coords) for c, new_coords in zip(constraint_chain, chain_coords) if new_coords is not None]
+
+		# If we have a previous coordinate, plan path to first new coordinate
+		links = []
+		prev_coord = None
+		for c, new_coords in chain_coords:
+			if prev_coord is not None and len(new_coords) > 0:
+				links.append((prev_coord, new_coords[0]))
+			if len(new_coords) > 0:
+				prev_coord = new_coords[-1]
+
+		linking_paths = iter(self._plan_links(domain, planner_key, arrival_threshold, step_size, links))
 
 		coords = []
 		path_constraints = collections.defaultdict(list)
 
-		for c in constraint_chain:
-			new_coords = c.get_coord_list()
-
-			# If we have a previous coordinate, plan path to first new coordinate
+		for c, new_coords in chain_coords:
 			if len(coords) > 0 and len(new_coords) > 0:
-				linking_path = path_planner.plan_path(coords[-1], new_coords[0])
+				linking_path = next(linking_paths)
 				
 				if len(linking_path) > 2:
 					connecting_coords = linking_path[1:-1]
@@ -76,3 +236,197 @@ class AStarLinker(ConstraintLinker):
 		final_path = rp.paths.ConstrainedPath(coords, **path_constraints)
 
 		return final_path
+
+
+class VisibilityGraph(object):
+	""" Reduced visibility graph of a polygonal free space. Nodes are the vertices of the free space
+		 boundary that turn away from it (reflex corners of the outer boundary and convex corners of
+		 holes), the only vertices a shortest path can bend around. Edges join every pair of nodes
+		 whose connecting segment stays inside the free space. Shortest paths between arbitrary
+		 points only test visibility from the two query points, then run A* on the graph.
+	"""
+
+	def __init__(self, free_space, tolerance=1e-6):
+		# Visibility is tested against a slightly grown free space so segments along the boundary count
+		self._free_space = shapely.prepared.prep(free_space.buffer(tolerance, join_style=2))
+
+		polygons = free_space.geoms if hasattr(free_space, 'geoms') else [free_space]
+		nodes = []
+		for polygon in polygons:
+			polygon = shapely.geometry.polygon.orient(polygon, 1.0)
+			for ring in [polygon.exterior, *polygon.interiors]:
+				nodes.extend(self._reflex_vertices(ring))
+
+		self._nodes = np.array(nodes, dtype=float).reshape(-1, 2)
+
+		num_nodes = len(self._nodes)
+		self._distances = np.full((num_nodes, num_nodes), np.inf)
+		for i in range(num_nodes):
+			visible = self._visible_nodes(self._nodes[i], candidates=range(i+1, num_nodes))
+			self._distances[i, visible] = np.linalg.norm(self._nodes[visible] - self._nodes[i], axis=1)
+		self._distances = np.minimum(self._distances, self._distances.T)
+		self._neighbours = [np.flatnonzero(np.isfinite(row)) for row in self._distances]
+
+	def _reflex_vertices(self, ring):
+		""" Vertices where a ring with the free space on its left turns right """
+		coords = np.asarray(ring.coords, dtype=float)[:-1]
+		if len(coords) < 3:
+			return []
+
+		incoming = coords - np.roll(coords, 1, axis=0)
+		outgoing = np.roll(coords, -1, axis=0) - coords
+		turns = incoming[:, 0]*outgoing[:, 1] - incoming[:, 1]*outgoing[:, 0]
+
+		return coords[turns < 0].tolist()
+
+	def _is_visible(self, start, end):
+		if np.allclose(start, end):
+			return self._free_space.covers(shapely.geometry.Point(start))
+
+		return self._free_space.covers(shapely.geometry.LineString([start, end]))
+
+	def _visible_nodes(self, point, candidates=None):
+		candidates = range(len(self._nodes)) if candidates is None else candidates
+		return np.array([n for n in candidates if self._is_visible(point, self._nodes[n])], dtype=int)
+
+	def __len__(self):
+		return len(self._nodes)
+
+	@property
+	def nodes(self):
+		return self._nodes
+
+	@property
+	def distances(self):
+		return self._distances
+
+	def shortest_path(self, start, goal):
+		""" Shortest obstacle free path from start to goal as a list of coordinates including both
+			 endpoints, or None if goal can't be reached from start
+		"""
+		start = np.asarray(start, dtype=float)
+		goal = np.asarray(goal, dtype=float)
+
+		if self._is_visible(start, goal):
+			return [tuple(start), tuple(goal)]
+
+		num_nodes = len(self._nodes)
+		goal_costs = np.full(num_nodes, np.inf)
+		goal_visible = self._visible_nodes(goal)
+		goal_costs[goal_visible] = np.linalg.norm(self._nodes[goal_visible] - goal, axis=1)
+		heuristic = np.linalg.norm(self._nodes - goal, axis=1)
+
+		# A* over the graph nodes, the goal is reached from any node that can see it
+		costs = np.full(num_nodes, np.inf)
+		parents = np.full(num_nodes, -1, dtype=int)
+		closed = np.zeros(num_nodes, dtype=bool)
+		start_visible = self._visible_nodes(start)
+		costs[start_visible] = np.linalg.norm(self._nodes[start_visible] - start, axis=1)
+
+		queue = [(costs[n] + heuristic[n], n) for n in start_visible]
+		heapq.heapify(queue)
+		best_cost, best_last = np.inf, None
+
+		while queue:
+			estimate, node = heapq.heappop(queue)
+			if estimate >= best_cost:
+				break
+			if closed[node]:
+				continue
+			closed[node] = True
+
+			if costs[node] + goal_costs[node] < best_cost:
+				best_cost, best_last = costs[node] + goal_costs[node], node
+
+			neighbours = self._neighbours[node]
+			new_costs = costs[node] + self._distances[node, neighbours]
+			improved = new_costs < costs[neighbours]
+			for n, cost in zip(neighbours[improved], new_costs[improved]):
+				costs[n] = cost
+				parents[n] = node
+				heapq.heappush(queue, (cost + heuristic[n], n))
+
+		if best_last is None:
+			return None
+
+		path = [tuple(goal)]
+		node = best_last
+		while node != -1:
+			path.append(tuple(self._nodes[node]))
+			node = parents[node]
+		path.append(tuple(start))
+
+		return path[::-1]
+
+class VisibilityGraphLinker(ConstraintLinker):
+	""" Links constraints with the shortest obstacle free paths through the domain shrunk by
+		 clearance. The visibility graph of each domain is built once and kept in an LRU cache keyed
+		 on the domain geometry, so every link and every later plan of the same domain only searches
+		 the existing graph. Links that can't be found (e.g. a point outside the free space) fall back
+		 to a straight line.
+	"""
+
+	def __init__(self, clearance=0.0, maxsize=8):
+		self._clearance = clearance
+		self._graphs = LRUCache(maxsize)
+
+	def visibility_graph(self, domain):
+		key = (geometry_digest(domain.polygon), self._clearance)
+		graph = self._graphs.get(key)
+		if graph is None:
+			free_space = domain.polygon.buffer(-self._clearance, join_style=2) if self._clearance > 0 else domain.polygon
+			graph = VisibilityGraph(free_space)
+			self._graphs.put(key, graph)
+
+		return graph
+
+	def _link(self, graph, start, end):
+		linking_path = graph.shortest_path(start, end)
+		if linking_path is None:
+			print(f"Could not find clear link from {tuple(start)} to {tuple(end)}, linking directly")
+			return []
+
+		return linking_path[1:-1]
+
+	def link_constraints(self, constraint_chain, domain, ingress_point=None, egress_point=None, **unknown_options):
+		graph = self.visibility_graph(domain)
+
+		coords = []
+		if ingress_point is not None:
+			coords.append(tuple(ingress_point))
+
+		path_constraints = collections.defaultdict(list)
+
+		for c in constraint_chain:
+			new_coords = c.get_coord_list()
+			if new_coords is None:
+				# Skip the constraint entirely so its parameters stay aligned with the coordinates
+				print('Error: Could not determine direction on constraint in chain')
+				continue
+
+			params = {param: value for param, value in c.constrained_parameters.items() if param != 'direction'}
+
+			# If we have a previous coordinate, link it to the first new coordinate
+			if len(coords) > 0 and len(new_coords) > 0:
+				connecting_coords = self._link(graph, coords[-1], new_coords[0])
+				coords.extend(connecting_coords)
+				for param in params:
+					path_constraints[param].extend([None]*len(connecting_coords))
+
+			coords.extend(new_coords)
+
+			# assumes each constraint has the same parameters constrained for now
+			for param, param_value in params.items():
+				path_constraints[param].extend(param_value)
+
+		if egress_point is not None:
+			if len(coords) > 0:
+				connecting_coords = self._link(graph, coords[-1], egress_point)
+				coords.extend(connecting_coords)
+				for param in path_constraints:
+					path_constraints[param].extend([None]*len(connecting_coords))
+			coords.append(tuple(egress_point))
+
+		final_path = rp.paths.ConstrainedPath(coords, **path_constraints)
+
+		return final_path
@@ -0,0 +1,54 @@
+import concurrent.futures
+
+# Function and shared data of the pool a worker process belongs to, set once by the initializer
+_worker_state = None
+
+def _init_worker(function, shared):
+	global _worker_state
+	_worker_state = (function, shared)
+
+def _call_worker(item):
+	function, shared = _worker_state
+	return function(shared, item)
+
+
+class WorkerPool(object):
+	""" Maps function(shared, item) over items. With max_workers=1 (the default) items are processed
+		 in the calling process; otherwise a process pool is started on the first map with more than
+		 one item and reused by later maps until close. shared is sent to each worker process once,
+		 through the pool initializer, so only the items are pickled per task. max_workers=None uses
+		 one worker per core.
+	"""
+
+	def __init__(self, function, shared=None, max_workers=1):
+		self._function = function
+		self._shared = shared
+		self._max_workers = max_workers
+		self._executor = None
+
+	def map(self, items):
+		items = list(items)
+		if self._max_workers == 1 or len(items) <= 1:
+			return [self._function(self._shared, item) for item in items]
+
+		if self._executor is None:
+			self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._max_workers, initializer=_init_worker, initargs=(self._function, self._shared))
+
+		return list(self._executor.map(_call_worker, items))
+
+	def close(self):
+		if self._executor is not None:
+			self._executor.shutdown()
+			self._executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+def parallel_map(function, items, shared=None, max_workers=1):
+	""" Single map over a WorkerPool, see WorkerPool """
+	with WorkerPool(function, shared, max_workers) as pool:
+		return pool.map(items)
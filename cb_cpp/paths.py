@@ -0,0 +1,193 @@
+import json
+import os
+import numpy as np
+import robot_primitives as rp
+
+from .constraint import chain_coord_views
+from .storage import read_columns, restore_tuples, write_columns
+
+def _parameter_column(chunks):
+	""" Copies the per constraint values of a parameter into one preallocated column. Values that
+		 don't form a regular numeric array (e.g. None placeholders) go into an object column.
+	"""
+	total = sum(len(chunk) for chunk in chunks)
+	first_value = next((chunk[0] for chunk in chunks if len(chunk) > 0), None)
+	try:
+		column = np.empty((total, *np.shape(first_value)), dtype=np.float64)
+		row = 0
+		for chunk in chunks:
+			column[row:row+len(chunk)] = chunk
+			row += len(chunk)
+	except (ValueError, TypeError):
+		column = np.empty(total, dtype=object)
+		row = 0
+		for chunk in chunks:
+			for value in chunk:
+				column[row] = value
+				row += 1
+
+	return column
+
+def _pad_column(column, count):
+	""" Column extended by count rows for waypoints without a parameter value, None in object
+		 columns and NaN in numeric ones
+	"""
+	if column.dtype == object:
+		padding = np.full(count, None, dtype=object)
+	else:
+		padding = np.full((count, *column.shape[1:]), np.nan)
+
+	return np.concatenate((column, padding))
+
+def _column_list(column):
+	""" Parameter column as the list of values ConstrainedPath expects, NaN rows of numeric
+		 columns as None
+	"""
+	if column.dtype == object:
+		return column.tolist()
+
+	missing = np.isnan(column.reshape(len(column), int(np.prod(column.shape[1:])))).all(axis=1).tolist()
+	if column.ndim > 1:
+		values = [tuple(value) for value in column.tolist()]
+	else:
+		values = column.tolist()
+
+	return [None if is_missing else value for value, is_missing in zip(values, missing)]
+
+
+class ArrayPath(object):
+	""" Linked path stored as an (N,2) float64 coordinate array and one array per constrained
+		 parameter. Parameters hold the concatenated per constraint values exactly as SimpleLinker
+		 would collect them, numeric parameters such as thrust as float64 columns. Convert with
+		 to_constrained_path when a robot_primitives ConstrainedPath is needed (e.g. to transform or
+		 save the path).
+	"""
+
+	def __init__(self, coords, **constrained_parameters):
+		self._coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+		self._constrained_parameters = constrained_parameters
+
+	@classmethod
+	def from_constraint_chain(cls, constraint_chain, ingress_point=None, **coord_options):
+		""" Sizes the path from the chain first, then writes every coordinate and parameter value
+			 straight into its preallocated array
+		"""
+		constraint_chain = list(constraint_chain)
+		chain_views = chain_coord_views(constraint_chain, **coord_options)
+
+		num_coords = sum(len(view) for view in chain_views) + (ingress_point is not None)
+		coords = np.empty((num_coords, 2), dtype=np.float64)
+		row = 0
+		if ingress_point is not None:
+			coords[0] = ingress_point
+			row = 1
+		for view in chain_views:
+			coords[row:row+len(view)] = view
+			row += len(view)
+
+		# assumes each constraint has the same parameters constrained for now
+		parameter_chunks = {}
+		for c in constraint_chain:
+			# Array backed constraints hand over their parameter columns without boxing each value
+			params = c.parameter_arrays if hasattr(c, 'parameter_arrays') else c.constrained_parameters
+			for param, param_value in params.items():
+				if param == 'direction':
+					# Skip direction constraints since they aren't necessary in a final path
+					continue
+				parameter_chunks.setdefault(param, []).append(param_value)
+
+		path_constraints = {param: _parameter_column(chunks) for param, chunks in parameter_chunks.items()}
+
+		return cls(coords, **path_constraints)
+
+	@classmethod
+	def from_waypoint_stream(cls, source):
+		""" Reads a path written by StreamingLinker from a text file like object or filename """
+		if isinstance(source, (str, os.PathLike)):
+			with open(source) as source_file:
+				return cls.from_waypoint_stream(source_file)
+
+		coord_chunks = []
+		parameter_chunks = {}
+		for line in source:
+			if not line.strip():
+				continue
+
+			chunk = json.loads(line)
+			coord_chunks.append(np.asarray(chunk.pop('coords'), dtype=np.float64).reshape(-1, 2))
+			for param, param_value in chunk.items():
+				# JSON turns tuple values (e.g. thrust ranges) into lists, restore them per chunk
+				parameter_chunks.setdefault(param, []).append(restore_tuples(param_value))
+
+		coords = np.concatenate(coord_chunks) if len(coord_chunks) > 0 else np.empty((0, 2))
+		path_constraints = {param: _parameter_column(chunks) for param, chunks in parameter_chunks.items()}
+
+		return cls(coords, **path_constraints)
+
+	def __len__(self):
+		return len(self._coords)
+
+	@property
+	def coords(self):
+		return self._coords
+
+	@property
+	def coord_list(self):
+		return [tuple(pt) for pt in self._coords.tolist()]
+
+	@property
+	def constrained_parameters(self):
+		return self._constrained_parameters
+
+	@property
+	def length(self):
+		return float(np.hypot(*np.diff(self._coords, axis=0).T).sum())
+
+	@property
+	def nbytes(self):
+		return self._coords.nbytes + sum(column.nbytes for column in self._constrained_parameters.values())
+
+	def add_point(self, point):
+		""" Appends a single waypoint, copying the coordinate array once. Parameter columns are
+			 padded so the new waypoint has no value for any parameter.
+		"""
+		self._coords = np.concatenate((self._coords, np.asarray(point, dtype=np.float64).reshape(1, 2)))
+		for param, column in self._constrained_parameters.items():
+			self._constrained_parameters[param] = _pad_column(column, 1)
+
+	@classmethod
+	def from_constrained_path(cls, path):
+		""" Copies a ConstrainedPath, e.g. one loaded from JSON with ConstrainedPath.from_file """
+		path_constraints = {param: _parameter_column([param_value]) for param, param_value in path.constraints.items()}
+
+		return cls(np.asarray(path.coord_list, dtype=np.float64).reshape(-1, 2), **path_constraints)
+
+	@classmethod
+	def from_binary(cls, filename, mode='r'):
+		""" Maps a path written by save_binary without copying its coordinates or numeric columns """
+		kind, columns, metadata = read_columns(filename, mode)
+		if kind != 'path':
+			raise ValueError(f"{filename} holds a {kind}, not a path")
+
+		path_constraints = {name[len('param/'):]: column for name, column in columns.items() if name.startswith('param/')}
+		for param, values in metadata.get('object_parameters', {}).items():
+			path_constraints[param] = _parameter_column([restore_tuples(values)])
+
+		return cls(columns['coords'], **path_constraints)
+
+	def save_binary(self, filename):
+		""" Writes the path in the cb_cpp binary format, numeric parameters as typed columns """
+		columns = {'coords': self._coords}
+		object_parameters = {}
+		for param, column in self._constrained_parameters.items():
+			if column.dtype == object:
+				object_parameters[param] = _column_list(column)
+			else:
+				columns[f"param/{param}"] = column
+
+		write_columns(filename, 'path', columns, {'object_parameters': object_parameters})
+
+	def to_constrained_path(self):
+		path_constraints = {param: _column_list(column) for param, column in self._constrained_parameters.items()}
+
+		return rp.paths.ConstrainedPath(self.coord_list, **path_constraints)
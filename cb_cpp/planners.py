@@ -1,7 +1,10 @@
+import os
 import numpy as np
+import shapely.geometry
 import robot_primitives as rp
 
-from . import layouts, refinements, sequencers, linkers
+from . import heuristics, layouts, refinements, sequencers, linkers
+from .parallel import parallel_map
 
 class LegacyConstraintBasedBoustrophedon(object):
 	""" Deprecated, Use ConstraintBasedBoustrophedon instead """
@@ -34,14 +37,14 @@ class LegacyConstraintBasedBoustrophedon(object):
 
 class ConstraintBasedBoustrophedon(object):
 
-	def __init__(self, vehicle_radius, sensor_radius, transect_orientation, alt_config=False, simple_linker=True, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, transect_orientation, alt_config=False, simple_linker=True, boundary_offset=None, **unknown_options):
 		self._vehicle_radius = vehicle_radius
 		self._sensor_radius = sensor_radius if sensor_radius else vehicle_radius
 		self._transect_orientation = transect_orientation
 		self._alt_config = alt_config
 		#self._heuristic = rp.heuristics.EuclideanDistance()
-		self._heuristic = rp.heuristics.DirectedDistance.perpendicular(transect_orientation)
-		self._layout = layouts.OrientedBoustrophedonPattern.from_transect_orientation(vehicle_radius, sensor_radius, transect_orientation)
+		self._heuristic = heuristics.DirectedCost.perpendicular(transect_orientation)
+		self._layout = layouts.OrientedBoustrophedonPattern.from_transect_orientation(vehicle_radius, sensor_radius, transect_orientation, boundary_offset=boundary_offset)
 		self._refinements = [refinements.AlternatingDirections()]
 		self._sequencer = sequencers.GreedySequencer(self._heuristic)
 		if simple_linker:
@@ -85,6 +88,10 @@ class ConstraintBasedBoustrophedon(object):
 
 		return cls(vehicle_radius, sensor_radius, side_normal, **options)
 
+	def boundary_offset(self, area):
+		""" Offset from the area boundary the transects are laid out at """
+		return self._layout.boundary_offset(area)
+
 	def plan_coverage_path(self, area, area_ingress_point=None):
 		constraints = self._layout.layout_constraints(area)
 		for r in self._refinements:
@@ -96,6 +103,288 @@ class ConstraintBasedBoustrophedon(object):
 
 		return path
 
+def _rotating_calipers(hull_coords):
+	""" Walks the edges of a convex polygon (counter-clockwise, no repeated closing vertex) with
+		 rotating calipers. Returns the unit direction of each edge, the width of the polygon
+		 perpendicular to that edge and its extent along that edge.
+	"""
+	pts = np.asarray(hull_coords, dtype=float)
+	num_pts = len(pts)
+
+	edge_vecs = np.roll(pts, -1, axis=0) - pts
+	edge_dirs = edge_vecs / np.linalg.norm(edge_vecs, axis=1)[:, np.newaxis]
+	edge_normals = np.stack((-edge_dirs[:, 1], edge_dirs[:, 0]), axis=1)
+
+	widths = np.empty(num_pts)
+	extents = np.empty(num_pts)
+
+	# Antipodal vertex (furthest from edge) and the two extreme vertices along the edge
+	antipodal = int(np.argmax(pts.dot(edge_normals[0])))
+	forward = int(np.argmax(pts.dot(edge_dirs[0])))
+	backward = int(np.argmin(pts.dot(edge_dirs[0])))
+
+	for i in range(num_pts):
+		normal, direction = edge_normals[i], edge_dirs[i]
+
+		# Each caliper only ever rotates forward around the hull so every pointer makes one lap in total
+		for _ in range(num_pts):
+			if np.dot(pts[(antipodal+1)%num_pts] - pts[antipodal], normal) > 0:
+				antipodal = (antipodal+1)%num_pts
+			else:
+				break
+		for _ in range(num_pts):
+			if np.dot(pts[(forward+1)%num_pts] - pts[forward], direction) > 0:
+				forward = (forward+1)%num_pts
+			else:
+				break
+		for _ in range(num_pts):
+			if np.dot(pts[(backward+1)%num_pts] - pts[backward], direction) < 0:
+				backward = (backward+1)%num_pts
+			else:
+				break
+
+		widths[i] = np.dot(pts[antipodal] - pts[i], normal)
+		extents[i] = np.dot(pts[forward] - pts[backward], direction)
+
+	return edge_dirs, widths, extents
+
+def _plan_with_orientation(shared, transect_orientation):
+	""" Runs a ConstraintBasedBoustrophedon with one transect orientation """
+	vehicle_radius, sensor_radius, area, area_ingress_point, options = shared
+	planner = ConstraintBasedBoustrophedon(vehicle_radius, sensor_radius, transect_orientation, **options)
+
+	return planner.plan_coverage_path(area, area_ingress_point)
+
+class OptimalOrientationBoustrophedon(object):
+	""" Picks the transect orientation of a ConstraintBasedBoustrophedon automatically. Candidate
+		 orientations come from rotating calipers on the convex hull of the area offset as the planner
+		 will offset it, and are scored from the transect count and estimated transect, turn and link
+		 length without laying out any constraints. Only the best few candidates are fully planned, in
+		 a process pool (max_workers=None uses one worker per core, 1 plans serially), and the
+		 shortest path is returned.
+	"""
+
+	def __init__(self, vehicle_radius, sensor_radius=None, num_candidates=3, turn_cost=None, max_workers=None, **planner_options):
+		self._vehicle_radius = vehicle_radius
+		self._sensor_radius = sensor_radius if sensor_radius else vehicle_radius
+		self._num_candidates = num_candidates
+		# Default to the length of a semicircular turn between adjacent transects
+		self._turn_cost = turn_cost if turn_cost is not None else np.pi * self._sensor_radius
+		self._max_workers = max_workers
+		self._planner_options = planner_options
+		self._transect_orientation = None
+
+	def score_orientations(self, area):
+		""" Returns (score, transect_orientation) tuples for every candidate orientation, best first """
+		# Score on the same offset area the planner lays its transects out over
+		planner = ConstraintBasedBoustrophedon(self._vehicle_radius, self._sensor_radius, (1., 0.), **self._planner_options)
+		offset_area = area.polygon.buffer(-planner.boundary_offset(area), join_style=2)
+		hull = shapely.geometry.polygon.orient(offset_area.convex_hull)
+		if not isinstance(hull, shapely.geometry.Polygon):
+			print('Error: Offset area is degenerate, cannot score orientations')
+			return []
+
+		edge_dirs, widths, extents = _rotating_calipers(list(hull.exterior.coords)[:-1])
+
+		candidates = {}
+		transect_spacing = 2*self._sensor_radius
+		for direction, width, extent in zip(edge_dirs, widths, extents):
+			normal = np.array([-direction[1], direction[0]])
+
+			# Transects parallel to the edge sweep across the width and span at most the extent,
+			# perpendicular ones sweep across the extent and span at most the width
+			for transect_orientation, sweep_width, line_extent in ((direction, width, extent), (normal, extent, width)):
+				num_cells = max(1, int(np.ceil(sweep_width / transect_spacing)))
+
+				# Upper bound on the summed transect length, exact when the offset area is a rectangle
+				# aligned with the transects
+				transect_length = (num_cells + 1) * line_extent
+				score = transect_length + sweep_width + num_cells * self._turn_cost
+
+				# Orientations are only meaningful up to sign, dedupe on the angle modulo pi
+				angle = np.around(np.degrees(np.arctan2(transect_orientation[1], transect_orientation[0])) % 180., decimals=3)
+				if angle not in candidates or score < candidates[angle][0]:
+					candidates[angle] = (float(score), tuple(np.asarray(transect_orientation).tolist()))
+
+		return sorted(candidates.values(), key=lambda candidate: candidate[0])
+
+	def plan_coverage_path(self, area, area_ingress_point=None):
+		candidates = self.score_orientations(area)[:self._num_candidates]
+
+		shared = (self._vehicle_radius, self._sensor_radius, area, area_ingress_point, self._planner_options)
+		paths = parallel_map(_plan_with_orientation, [orientation for _, orientation in candidates], shared, self._max_workers)
+
+		min_path = None
+		for (_, orientation), path in zip(candidates, paths):
+			if path is not None and (min_path is None or path.length < min_path.length):
+				min_path = path
+				self._transect_orientation = orientation
+
+		return min_path
+
+	@property
+	def transect_orientation(self):
+		""" Transect orientation of the last planned path """
+		return self._transect_orientation
+
+def _plan_cell(shared, cell_args):
+	""" Lays out and refines the transects of a single cell """
+	layout, refinements, refinement_options = shared
+	cell_polygon, positions = cell_args
+	constraints = layout.layout_cell(cell_polygon, positions)
+	for r in refinements:
+		r.refine_constraints(constraints, **refinement_options)
+
+	return constraints
+
+class CellDecompositionBoustrophedon(object):
+	""" Boustrophedon coverage of areas with islands and concave banks. The area is split into
+		 monotone cells, each cell is laid out and refined in a process pool (max_workers=None uses
+		 one worker per core, 1 processes cells serially), and the per-cell chains are joined into one
+		 chain before linking.
+	"""
+
+	def __init__(self, vehicle_radius, sensor_radius, transect_orientation, alt_config=False, simple_linker=True, max_workers=None, **unknown_options):
+		self._vehicle_radius = vehicle_radius
+		self._sensor_radius = sensor_radius if sensor_radius else vehicle_radius
+		self._transect_orientation = transect_orientation
+		self._alt_config = alt_config
+		self._max_workers = max_workers
+		self._heuristic = rp.heuristics.EuclideanDistance()
+		self._layout = layouts.BoustrophedonCellDecomposition.from_transect_orientation(vehicle_radius, self._sensor_radius, transect_orientation)
+		self._refinements = [refinements.AlternatingDirections()]
+		self._sequencer = sequencers.CellSequencer(self._heuristic)
+		if simple_linker:
+			self._linker = linkers.SimpleLinker()
+		else:
+			self._linker = linkers.AStarLinker()
+
+	def plan_coverage_path(self, area, area_ingress_point=None):
+		direction = [1, 0] if self._alt_config else [0, 1]
+		shared = (self._layout, self._refinements, {'starting_direction': direction})
+		cell_chains = parallel_map(_plan_cell, self._layout.cell_positions(area), shared, self._max_workers)
+
+		# Cells whose transects all lie on seams owned by a neighbour have nothing to sequence
+		cell_chains = [chain for chain in cell_chains if len(chain) > 0]
+
+		constraint_chain = self._sequencer.sequence_constraints(cell_chains, area_ingress_point)
+		d = area.offset_domain(self._vehicle_radius)
+		path = self._linker.link_constraints(constraint_chain, domain=d, ingress_point=area_ingress_point)
+
+		return path
+
+def _plan_tile(shared, tile_args):
+	""" Pool worker that lays out and refines the transects owned by a single tile """
+	layout, refinements, refinement_options = shared
+	tile_polygon, positions = tile_args
+	constraints = list(layout.iter_polygon_constraints(tile_polygon, positions))
+	for r in refinements:
+		r.refine_constraints(constraints, **refinement_options)
+
+	return constraints
+
+class TiledBoustrophedon(object):
+	""" Boustrophedon coverage of very large areas. Transect positions are computed once for the
+		 whole area and divided between strips along the sweep direction, so every transect belongs
+		 to exactly one tile and spacing is uniform across tile boundaries. Each tile only intersects
+		 its transects with the part of the offset area inside its strip (padded by the sensor radius
+		 so no transect lies on a cut), and tiles are laid out and refined in a process pool
+		 (max_workers=None uses one worker and one tile per core, 1 processes tiles serially). Tiles
+		 are then stitched in sweep order, flipping any tile whose alternating directions are out of
+		 phase with the previous one.
+	"""
+
+	def __init__(self, vehicle_radius, sensor_radius, transect_orientation, num_tiles=None, alt_config=False, simple_linker=True, max_workers=None, **unknown_options):
+		self._vehicle_radius = vehicle_radius
+		self._sensor_radius = sensor_radius if sensor_radius else vehicle_radius
+		self._transect_orientation = transect_orientation
+		self._num_tiles = num_tiles if num_tiles else (max_workers if max_workers else os.cpu_count())
+		self._alt_config = alt_config
+		self._max_workers = max_workers
+		self._heuristic = rp.heuristics.EuclideanDistance()
+		self._layout = layouts.OrientedBoustrophedonPattern.from_transect_orientation(vehicle_radius, self._sensor_radius, transect_orientation, batched=True)
+		self._refinements = [refinements.AlternatingDirections()]
+		self._sequencer = sequencers.SweepSequencer(self._heuristic)
+		if simple_linker:
+			self._linker = linkers.SimpleLinker()
+		else:
+			self._linker = linkers.AStarLinker()
+
+	def _tile_polygon(self, offset_area, sweep_direction, start_pos, end_pos):
+		# Strip of the plane between two positions along the sweep direction, long enough to span the area
+		line_direction = np.array([-sweep_direction[1], sweep_direction[0]])
+		# Offsetting can split the area, so project the rings of every part
+		proj = np.concatenate([np.asarray(ring) for ring in layouts.polygon_rings(offset_area)]).dot(line_direction)
+		line_min, line_max = proj.min() - 1., proj.max() + 1.
+
+		strip = shapely.geometry.Polygon([tuple(start_pos*sweep_direction + line_min*line_direction),
+													 tuple(end_pos*sweep_direction + line_min*line_direction),
+													 tuple(end_pos*sweep_direction + line_max*line_direction),
+													 tuple(start_pos*sweep_direction + line_max*line_direction)])
+
+		return offset_area.intersection(strip)
+
+	def layout_tiles(self, area):
+		""" Returns the refined constraints of every tile, in sweep order """
+		offset = self._layout.boundary_offset(area)
+		offset_area = area.polygon.buffer(-offset, join_style=2)
+
+		if offset_area.is_empty:
+			return []
+
+		positions = self._layout.sweep_positions(offset_area)
+
+		sweep_direction = self._layout.sweep_direction
+		padding = self._sensor_radius
+
+		tile_args = []
+		for tile_positions in np.array_split(positions, min(self._num_tiles, len(positions))):
+			tile_polygon = self._tile_polygon(offset_area, sweep_direction, tile_positions[0] - padding, tile_positions[-1] + padding)
+			tile_args.append((tile_polygon, tile_positions))
+
+		direction = [1, 0] if self._alt_config else [0, 1]
+		shared = (self._layout, self._refinements, {'starting_direction': direction})
+
+		return parallel_map(_plan_tile, tile_args, shared, self._max_workers)
+
+	def _flip_directions(self, constraints):
+		for c in constraints:
+			c.constrain_parameter('direction', c.direction[::-1])
+
+	def layout_constraints(self, area, area_ingress_point=None):
+		""" Lays out, refines and stitches the tiles into a single list of directed constraints """
+		constraints = []
+		for tile_constraints in self.layout_tiles(area):
+			if len(tile_constraints) == 0:
+				continue
+
+			# Every tile starts with the same direction, keep the alternating pattern going across the seam
+			if len(constraints) > 0 and constraints[-1].direction == tile_constraints[0].direction:
+				self._flip_directions(tile_constraints)
+
+			constraints.extend(tile_constraints)
+
+		if area_ingress_point is not None and len(constraints) > 0:
+			# Start at whichever end of the sweep is closest to the ingress point, entering the first
+			# transect from its closest endpoint
+			cost = lambda pt: self._heuristic.compute_cost(area_ingress_point, pt)
+			if min(map(cost, constraints[-1].endpoints)) < min(map(cost, constraints[0].endpoints)):
+				constraints.reverse()
+
+			first = constraints[0]
+			if cost(first.endpoints[first.direction[0]]) > cost(first.endpoints[first.direction[1]]):
+				self._flip_directions(constraints)
+
+		return constraints
+
+	def plan_coverage_path(self, area, area_ingress_point=None):
+		constraints = self.layout_constraints(area, area_ingress_point)
+		constraint_chain = self._sequencer.sequence_constraints(constraints, area_ingress_point)
+		d = area.offset_domain(self._vehicle_radius)
+		path = self._linker.link_constraints(constraint_chain, domain=d, ingress_point=area_ingress_point)
+
+		return path
+
 class ConstraintBasedSpiral(object):
 
 	def __init__(self, vehicle_radius, sensor_radius=None, **unknown_options):
@@ -167,9 +456,10 @@ class EnergyEfficientBoustrophedon(object):
 		return path
 
 # Tries all possible sequences of constraints, links them to ingress and egress, then computes a total path length and returns the shortest one
+# With exact the shortest sequence is found by Held-Karp instead, which raises rather than approximate when there are too many constraints
 class BruteForceEnergyEfficientBoustrophedon(object):
 
-	def __init__(self, vehicle_radius, sensor_radius, flow_field, axis, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, flow_field, axis, exact=False, max_workers=1, **unknown_options):
 		self._vehicle_radius = vehicle_radius
 		self._sensor_radius = sensor_radius
 		self._flow_field = flow_field
@@ -180,29 +470,25 @@ class BruteForceEnergyEfficientBoustrophedon(object):
 		#self._layout = layouts.BoustrophedonPattern(vehicle_radius, sensor_radius)
 		self._layout = layouts.OrientedBoustrophedonPattern.from_transect_orientation(vehicle_radius, sensor_radius, self._transect_orientation)
 		self._refinements = [refinements.MaximizeFlowAlignment(flow_field)]
-		self._sequencer = sequencers.BruteForceMatchingSequencer()
+		self._sequencer = sequencers.ExactMatchingSequencer(self._sequencing_heuristic, fallback=False)
 		self._linker = linkers.SimpleLinker()
+		self._exact = exact
+		self._max_workers = max_workers
 
 	def plan_coverage_path(self, area, area_ingress_point=None, area_egress_point=None):
 		constraints = self._layout.layout_constraints(area)
 		for r in self._refinements:
 			r.refine_constraints(constraints, area_ingress_point=area_ingress_point)
-		constraint_chains = self._sequencer.sequence_constraints(constraints)
-		#print(f"Found {len(constraint_chains)} possible paths. Selecting min length path...")
-		min_length = None
-		min_path = None
-		for chain in constraint_chains:
-			#chain = list(next(it) for it in c)
-			path = self._linker.link_constraints(chain, ingress_point=area_ingress_point)
-			if area_egress_point:
-				path.add_point(area_egress_point)
-			#print(f"Found path with path length {path.length}, current best path length is {min_length}")
-			if min_length is None or path.length < min_length:
-				print('Selecting new path.')
-				min_path = path
-				min_length = path.length
+		if self._exact:
+			constraint_chain = self._sequencer.sequence_constraints(constraints, area_ingress_point, area_egress_point)
+		else:
+			evaluator = sequencers.ChainEvaluator(constraints, area_ingress_point, area_egress_point, max_workers=self._max_workers)
+			constraint_chain = evaluator.best_alternating_chain()
+		path = self._linker.link_constraints(constraint_chain, ingress_point=area_ingress_point)
+		if area_egress_point:
+			path.add_point(area_egress_point)
 
-		return min_path
+		return path
 
 class EnergyEfficientDrift(object):
 
@@ -210,7 +496,7 @@ class EnergyEfficientDrift(object):
 		self._vehicle_radius = vehicle_radius
 		self._sensor_radius = sensor_radius
 		self._flow_field = flow_field
-		self._sequencing_heuristic = rp.heuristics.OpposingFlowEnergy(flow_field)
+		self._sequencing_heuristic = heuristics.FlowEnergyCost(flow_field)
 
 		self._layout = layouts.BoustrophedonPattern(vehicle_radius, sensor_radius)
 		self._refinements = [refinements.MaximizeFlowAlignment(flow_field)]
@@ -303,9 +589,10 @@ class EEStreamlineBoustrophedon(object):
 		self._bias = new_bias
 
 # Tries all possible sequences of constraints, then computes a total path length and returns the shortest one
+# With exact the shortest sequence is found by Held-Karp instead, which raises rather than approximate when there are too many constraints
 class BruteForceEEStreamlineBoustrophedon(object):
 
-	def __init__(self, vehicle_radius, sensor_radius, flow_field, bias=None, **unknown_options):
+	def __init__(self, vehicle_radius, sensor_radius, flow_field, bias=None, exact=False, max_workers=1, **unknown_options):
 		self._vehicle_radius = vehicle_radius
 		self._sensor_radius = sensor_radius if sensor_radius else vehicle_radius
 		self._bias = bias
@@ -314,24 +601,20 @@ class BruteForceEEStreamlineBoustrophedon(object):
 		#self._heuristic = rp.heuristics.DirectedDistance.perpendicular(transect_orientation)
 		self._layout = layouts.StreamlinePattern(vehicle_radius, sensor_radius)
 		self._refinements = [refinements.MaximizeFlowAlignment(flow_field, nominal_speed=0.65, delta=0.1)]
-		self._sequencer = sequencers.BruteForceMatchingSequencer()
+		self._sequencer = sequencers.ExactMatchingSequencer(self._heuristic, fallback=False)
 		self._linker = linkers.SimpleLinker()
+		self._exact = exact
+		self._max_workers = max_workers
 
 	def plan_coverage_path(self, area, area_ingress_point=None, area_egress_point=None):
 		constraints = self._layout.layout_constraints(area, bias=self._bias)
 		for r in self._refinements:
 			r.refine_constraints(constraints, area_ingress_point=area_ingress_point)
-		constraint_chains = self._sequencer.sequence_constraints(constraints)
-		#print(f"Found {len(constraint_chains)} possible paths. Selecting min length path...")
-		min_length = None
-		min_path = None
-		for chain in constraint_chains:
-			#chain = list(next(it) for it in c)
-			path = self._linker.link_constraints(chain, ingress_point=area_ingress_point)
-			
-			if min_length is None or path.length < min_length:
-				print('Selecting new path.')
-				min_path = path
-				min_length = path.length
+		if self._exact:
+			constraint_chain = self._sequencer.sequence_constraints(constraints, area_ingress_point)
+		else:
+			evaluator = sequencers.ChainEvaluator(constraints, area_ingress_point, max_workers=self._max_workers)
+			constraint_chain = evaluator.best_alternating_chain()
+		path = self._linker.link_constraints(constraint_chain, ingress_point=area_ingress_point)
 
-		return min_path
\ No newline at end of file
+		return path
\ No newline at end of file
@@ -5,6 +5,7 @@ from sortedcontainers import SortedList
 import robot_primitives as rp
 
 from .base import ConstraintRefinement
+from .heuristics import EuclideanCost, FlowEnergyCost, polyline_costs
 
 class AlternatingDirections(ConstraintRefinement):
 
@@ -13,18 +14,17 @@ class AlternatingDirections(ConstraintRefinement):
 
 		# Find/select closest constraint to ingress point
 		if area_ingress_point is not None:
-			starting_constraint = None
-			min_cost = None
-
+			constraint_idx = []
+			ingress_points = []
 			for c_idx, c in enumerate(constraints):
-				for pt_idx, pt in enumerate(c.ingress_points):
-					cost = rp.heuristics.EuclideanDistance.compute_cost(area_ingress_point, pt)
-					if min_cost is None or cost < min_cost:
-						min_cost = cost
-						starting_constraint = c
-						starting_constraint_idx = c_idx
-						ingress_point = pt
-						ingress_point_idx = pt_idx
+				pts = c.ingress_points
+				constraint_idx.extend(itertools.repeat(c_idx, len(pts)))
+				ingress_points.extend(pts)
+
+			best = np.argmin(EuclideanCost().compute_costs(area_ingress_point, ingress_points))
+			starting_constraint_idx = constraint_idx[best]
+			starting_constraint = constraints[starting_constraint_idx]
+			ingress_point = ingress_points[best]
 
 			starting_constraint.select_ingress(ingress_point)
 			starting_direction = starting_constraint.direction.copy()
@@ -43,6 +43,26 @@ class AlternatingDirections(ConstraintRefinement):
 		
 		return constraints
 
+	def refine_constraints_iter(self, constraints, area_ingress_point=None, starting_direction=[0,1], **unknown_options):
+		""" Streaming version of refine_constraints for constraints produced in sweep order. Only
+			 the first constraint is known up front, so when an area_ingress_point is given the pattern
+			 starts from whichever end of the first constraint is closest to it.
+		"""
+		current_direction = starting_direction.copy()
+
+		for c_idx, c in enumerate(constraints):
+			if c_idx == 0 and area_ingress_point is not None:
+				ingress_points = c.ingress_points
+				ingress_point = ingress_points[np.argmin(EuclideanCost().compute_costs(area_ingress_point, ingress_points))]
+				c.select_ingress(ingress_point)
+				current_direction = c.direction.copy()
+			else:
+				c.constrain_parameter('direction', current_direction.copy())
+
+			current_direction.reverse()
+
+			yield c
+
 
 class DownstreamDrift(ConstraintRefinement):
 
@@ -68,14 +88,13 @@ class DownstreamDrift(ConstraintRefinement):
 			# Set thrust constraint to full allowable range of thrust fractions 
 			# for first coordinate because any thrust should be allowed to arrive at 
 			# ingress point of constraint
-			c.constrain_parameter('thrust', [default_thrust])
 
 			# If constraint direction corresponds to flow direction
 			if np.dot(constraint_direction, flow_direction) > 0:
 				# add (0,0) thrust constraint so no thrust is applied to all subsequent coords
-				c.thrust.extend(itertools.repeat((0.,0.), c.size-1))
+				c.constrain_parameter('thrust', [default_thrust, *itertools.repeat((0.,0.), c.size-1)])
 			else:
-				c.thrust.extend(itertools.repeat(default_thrust, c.size-1))
+				c.constrain_parameter('thrust', [default_thrust, *itertools.repeat(default_thrust, c.size-1)])
 
 			print(f"thrust: {c.thrust} direction: {direction}, endpoints: {endpoints}")
 
@@ -87,24 +106,16 @@ class MaximizeFlowAlignment(ConstraintRefinement):
 	def __init__(self, flow_field, nominal_speed=0.5, delta=0.01):
 		self._flow_field = flow_field
 		self._nominal_speed = nominal_speed
-		self._energy_heuristic = rp.heuristics.OpposingFlowEnergy(flow_field, delta)
+		self._energy_heuristic = FlowEnergyCost(flow_field, delta)
 
 	def refine_constraints(self, constraints, default_thrust=(0.,1.), **unknown_options):
-		constraint_costs = []
-		constraint_idx = []
-
-		for idx, c in enumerate(constraints):
-			# assumes all constraints have coords orders similarly
-			# probably want to check both directions or use heuristic that is agnostic to direction
-			coords = c.coord_list
-			print(f"Computing cost of Constraint {idx} of {len(constraints)}")
-			cost = 0.
-			for start, end in zip(coords, coords[1:]):
-				cost += self._energy_heuristic.compute_cost(start, end, self._nominal_speed)
-
-			constraint_costs.append(cost)
-			constraint_idx.append(idx)
+		# assumes all constraints have coords orders similarly
+		# probably want to check both directions or use heuristic that is agnostic to direction
+		print(f"Computing cost of {len(constraints)} Constraints")
+		constraint_costs = polyline_costs(self._energy_heuristic, [c.coord_list for c in constraints], self._nominal_speed).tolist()
+		constraint_idx = list(range(len(constraints)))
 
+		for idx, cost in enumerate(constraint_costs):
 			print(f"Constraint {idx} has cost of {cost}")
 
 		#print(constraint_costs)
@@ -137,22 +148,12 @@ class OptimizedDrift(ConstraintRefinement):
 
 	def __init__(self, flow_field):
 		self._flow_field = flow_field
-		self._energy_heuristic = rp.heuristics.OpposingFlowEnergy(flow_field)
+		self._energy_heuristic = FlowEnergyCost(flow_field)
 
 	def refine_constraints(self, constraints, default_thrust=(0.,1.), **unknown_options):
-		constraint_costs = []
-		constraint_idx = []
-
-		for idx, c in enumerate(constraints):
-			# assumes all constraints have coords orders similarly
-			coords = c.coord_list
-			#print('computing cost of constraint', idx)
-			cost = 0.
-			for start, end in zip(coords, coords[1:]):
-				cost += self._energy_heuristic.compute_cost(start, end)
-
-			constraint_costs.append(cost)
-			constraint_idx.append(idx)
+		# assumes all constraints have coords orders similarly
+		constraint_costs = polyline_costs(self._energy_heuristic, [c.coord_list for c in constraints]).tolist()
+		constraint_idx = list(range(len(constraints)))
 
 		print(constraint_costs)
 
@@ -168,8 +169,7 @@ class OptimizedDrift(ConstraintRefinement):
 			else: 
 				c.direction = [1,0]
 
-			c.constrain_parameter('thrust', [default_thrust])
-			c.thrust.extend(itertools.repeat((0.,0.), c.size-1))
+			c.constrain_parameter('thrust', [default_thrust, *itertools.repeat((0.,0.), c.size-1)])
 
 		for index in sorted_constraints[:split_index]:
 			c = constraints[index]
@@ -179,7 +179,6 @@ class OptimizedDrift(ConstraintRefinement):
 			else: 
 				c.direction = [0,1]
 
-			c.constrain_parameter('thrust', [default_thrust])
-			c.thrust.extend(itertools.repeat(default_thrust, c.size-1))
+			c.constrain_parameter('thrust', [default_thrust, *itertools.repeat(default_thrust, c.size-1)])
 
 		return constraints
\ No newline at end of file
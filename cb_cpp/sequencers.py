@@ -1,49 +1,185 @@
 from collections import defaultdict
 import itertools
+import time
 import numpy as np
 
 import robot_primitives as rp
 
 from .base import ConstraintSequencer
+from .heuristics import EuclideanCost, batch_heuristic
+from .parallel import parallel_map
+
+def _ingress_candidates(constraints):
+	""" Flattens the ingress points of constraints into parallel lists of owning constraint and point """
+	owners = []
+	ingress_points = []
+	for c in constraints:
+		pts = c.ingress_points
+		owners.extend(itertools.repeat(c, len(pts)))
+		ingress_points.extend(pts)
+
+	return owners, ingress_points
+
+class UniformGridIndex(object):
+	""" Uniform grid over a fixed set of points supporting nearest neighbour queries and deletion.
+		 Cells are sized so each holds about one point on average, and queries search rings of
+		 cells outwards from the query until no unsearched cell can hold a closer point. Ties in
+		 distance go to the point inserted first.
+	"""
+
+	def __init__(self, points):
+		self._points = np.asarray(points, dtype=float).reshape(-1, 2)
+		self._alive = np.ones(len(self._points), dtype=bool)
+		self._num_alive = len(self._points)
+
+		if len(self._points) > 0:
+			self._origin = self._points.min(axis=0)
+			extent = self._points.max(axis=0) - self._origin
+		else:
+			self._origin = np.zeros(2)
+			extent = np.zeros(2)
+
+		area = extent[0]*extent[1]
+		self._cell_size = np.sqrt(area / len(self._points)) if area > 0 else max(extent.max() / max(len(self._points), 1), 1e-9)
+		self._shape = np.floor(extent / self._cell_size).astype(int) + 1
+
+		self._cells = defaultdict(list)
+		for point_id, cell in enumerate(map(tuple, self._cell_of(self._points).tolist())):
+			self._cells[cell].append(point_id)
+
+	def __len__(self):
+		return self._num_alive
+
+	def _cell_of(self, pts):
+		cells = np.floor((np.asarray(pts) - self._origin) / self._cell_size).astype(int)
+
+		return np.clip(cells, 0, self._shape - 1)
+
+	def remove(self, point_id):
+		if self._alive[point_id]:
+			self._alive[point_id] = False
+			self._num_alive -= 1
+
+	def _ring_cells(self, center, ring):
+		if ring == 0:
+			yield center
+			return
+
+		ci, cj = center
+		for i in range(ci-ring, ci+ring+1):
+			yield (i, cj-ring)
+			yield (i, cj+ring)
+		for j in range(cj-ring+1, cj+ring):
+			yield (ci-ring, j)
+			yield (ci+ring, j)
+
+	def nearest(self, query_pt):
+		""" Returns (point_id, distance) of the closest remaining point, None if the index is empty """
+		if self._num_alive == 0:
+			return None
+
+		center = tuple(self._cell_of(query_pt).tolist())
+		max_ring = int(self._shape.max())
+		best_id, best_dist = None, None
+
+		for ring in range(max_ring+1):
+			for cell in self._ring_cells(center, ring):
+				point_ids = self._cells.get(cell)
+				if not point_ids:
+					continue
+
+				# Drop deleted points from the cell while scanning it
+				point_ids[:] = [point_id for point_id in point_ids if self._alive[point_id]]
+				for point_id in point_ids:
+					dist = np.hypot(*(self._points[point_id] - query_pt))
+					if best_dist is None or dist < best_dist or (dist == best_dist and point_id < best_id):
+						best_id, best_dist = point_id, dist
+
+			# Any point beyond this ring is at least ring cells away along one axis, stop once the
+			# best point is strictly closer than that so exact ties are still resolved by insertion order
+			if best_dist is not None and best_dist < ring*self._cell_size:
+				break
+
+		return best_id, best_dist
+
 
 class GreedySequencer(ConstraintSequencer):
 
-	def __init__(self, heuristic, tiebreaker=None):
+	def __init__(self, heuristic, tiebreaker=None, spatial_index=None):
 		# The heuristic is used to chose the next constraint and its ingress point
-		self._heuristic = heuristic
+		self._heuristic = batch_heuristic(heuristic)
 		# The tiebreaker, if supplied, is used to break ties in heuristic cost
 		self._tiebreaker = tiebreaker if tiebreaker else rp.heuristics.EuclideanDistance.compute_cost
+		# Nearest ingress searches go through a spatial index when the heuristic is euclidean
+		# distance, other heuristics aren't metric in the plane and fall back to a full scan
+		if spatial_index is None:
+			spatial_index = isinstance(self._heuristic, EuclideanCost)
+		self._spatial_index = spatial_index
 
 	def _find_closest_constraint(self, constraints, start_pt):
-		next_constraint = None
-		ingress_point = None
-		ingress_point_index = None
-		min_cost = None
-		min_tiebreaker = None
-		for c in constraints:
-			for idx, pt in enumerate(c.ingress_points):
-				cost = self._heuristic.compute_cost(start_pt, pt)
-				if min_cost is None or cost < min_cost:
-					min_cost = cost
-					min_tiebreaker = self._tiebreaker(start_pt, pt)
-					next_constraint = c
-					ingress_point = pt
-					ingress_point_index = idx
-				elif cost == min_cost and self._tiebreaker:
-					tiebreaker_cost = self._tiebreaker(start_pt, pt)
-					if tiebreaker_cost < min_tiebreaker:
-						min_cost = cost
-						min_tiebreaker = tiebreaker_cost
-						next_constraint = c
-						ingress_point = pt
-						ingress_point_index = idx
+		owners, ingress_points = _ingress_candidates(constraints)
+		costs = self._heuristic.compute_costs(start_pt, ingress_points)
 
+		# Ties in heuristic cost go to the lowest tiebreaker cost, then to the first candidate
+		ties = np.flatnonzero(costs == costs.min())
+		best = ties[0]
+		if len(ties) > 1 and self._tiebreaker:
+			tiebreaker_costs = [self._tiebreaker(start_pt, ingress_points[i]) for i in ties]
+			best = ties[np.argmin(tiebreaker_costs)]
+
+		next_constraint = owners[best]
+		ingress_point = ingress_points[best]
 		next_constraint.select_ingress(ingress_point)
 
 		print(next_constraint.egress_points)
 		return next_constraint
 
+	def _sequence_indexed(self, constraints, start_point=None):
+		""" Greedy sequencing with ingress points held in a UniformGridIndex. Exact ties in distance
+			 go to the constraint (then ingress point) that comes first in constraints.
+		"""
+		constraints = list(constraints)
+		point_owner = []
+		point_ids = []
+		ingress_points = []
+		for c_idx, c in enumerate(constraints):
+			first_id = len(ingress_points)
+			for pt in c.ingress_points:
+				ingress_points.append(tuple(pt))
+				point_owner.append(c_idx)
+			point_ids.append(range(first_id, len(ingress_points)))
+
+		index = UniformGridIndex(ingress_points)
+
+		def chain_constraint(point_id):
+			c_idx = point_owner[point_id]
+			c = constraints[c_idx]
+			c.select_ingress(ingress_points[point_id])
+			for owned_id in point_ids[c_idx]:
+				index.remove(owned_id)
+
+			return c
+
+		if start_point is None:
+			print('No start point specified, choosing first constraint in list')
+			starting_constraint = chain_constraint(point_ids[0][0])
+		else:
+			starting_constraint = chain_constraint(index.nearest(start_point)[0])
+
+		constraint_chain = [starting_constraint]
+		(chain_egress_pt,) = starting_constraint.egress_points
+
+		while len(index) > 0:
+			next_constraint = chain_constraint(index.nearest(chain_egress_pt)[0])
+			constraint_chain.append(next_constraint)
+			(chain_egress_pt,) = next_constraint.egress_points
+
+		return constraint_chain
+
 	def sequence_constraints(self, constraints, start_point=None):
+		if self._spatial_index and len(constraints) > 0:
+			return self._sequence_indexed(constraints, start_point)
+
 		starting_constraint = None
 		ingress_point = None
 		ingress_point_index = None
@@ -137,7 +273,7 @@ class MatchingSequencer(ConstraintSequencer):
 
 	def __init__(self, heuristic):
 		# The heuristic is used to chose the next constraint and its ingress point
-		self._heuristic = heuristic
+		self._heuristic = batch_heuristic(heuristic)
 
 	def sequence_constraints(self, constraints, start_point=None):
 		# Partition constraints by direction
@@ -168,8 +304,6 @@ class MatchingSequencer(ConstraintSequencer):
 			ingress_point_index = 0
 		else:
 			# Do a search to find constraint with ingress points closest to start_point 
-			min_cost = None
-
 			# If one partition has more constraints then another limit search to that partition
 			search_partitions = []
 			if num_constraints[0] != num_constraints[1]:
@@ -177,15 +311,10 @@ class MatchingSequencer(ConstraintSequencer):
 			else:
 				search_partitions = constraint_partitions.values()
 
-			for partition in search_partitions:
-				for c in partition:
-					for idx, pt in enumerate(c.ingress_points):
-						cost = self._heuristic.compute_cost(start_point, pt)
-						if min_cost is None or cost < min_cost:
-							min_cost = cost
-							starting_constraint = c
-							ingress_point = pt
-							ingress_point_index = idx
+			owners, ingress_points = _ingress_candidates(itertools.chain.from_iterable(search_partitions))
+			best = np.argmin(self._heuristic.compute_costs(start_point, ingress_points))
+			starting_constraint = owners[best]
+			ingress_point = ingress_points[best]
 
 		starting_constraint.select_ingress(ingress_point)
 
@@ -200,31 +329,22 @@ class MatchingSequencer(ConstraintSequencer):
 		remaining_constraints = [len(p) for p in constraint_partitions.values()]
 		while any(remaining_constraints):
 			# Find next closest ingress point on available constraints
-			next_constraint = None
-			ingress_point = None
-			ingress_point_index = None
-			min_cost = None
-			secondary_cost = None
 			next_direction = tuple(constraint_chain[-1].direction[::-1])
-			for c in constraint_partitions[next_direction]:
-				for idx, pt in enumerate(c.ingress_points):
-					cost = self._heuristic.compute_cost(chain_egress_pt, pt)
-					if min_cost is not None and cost == min_cost:
-							tiebreaker_current = self._heuristic.compute_cost(ingress_point, constraint_chain[0].ingress_points[0])
-							tiebreaker_new = self._heuristic.compute_cost(pt, constraint_chain[0].ingress_points[0])
-							print(f"equal cost constaints, choosing constraint furthest from area ingress point {tiebreaker_current} {tiebreaker_new}")
-							if tiebreaker_new > tiebreaker_current:
-								print('switching to new constraint')
-								min_cost = cost
-								next_constraint = c
-								ingress_point = pt
-								ingress_point_index = idx
-										
-					elif min_cost is None or cost < min_cost:
-						min_cost = cost
-						next_constraint = c
-						ingress_point = pt
-						ingress_point_index = idx
+			owners, ingress_points = _ingress_candidates(constraint_partitions[next_direction])
+			costs = self._heuristic.compute_costs(chain_egress_pt, ingress_points)
+
+			# Break ties by choosing the constraint furthest from the area ingress point
+			ties = np.flatnonzero(costs == costs.min())
+			best = ties[0]
+			if len(ties) > 1:
+				print(f"equal cost constaints, choosing constraint furthest from area ingress point")
+				tie_points = [ingress_points[i] for i in ties]
+				chain_ingress_pt = constraint_chain[0].ingress_points[0]
+				tiebreaker_costs = self._heuristic.compute_pairwise_costs(tie_points, [chain_ingress_pt]*len(tie_points))
+				best = ties[np.argmax(tiebreaker_costs)]
+
+			next_constraint = owners[best]
+			ingress_point = ingress_points[best]
 
 			constraint_partitions[next_direction].remove(next_constraint)
 
@@ -239,6 +359,965 @@ class MatchingSequencer(ConstraintSequencer):
 		return constraint_chain 
 
 
+class CellSequencer(ConstraintSequencer):
+	""" Joins the constraint chains of separately planned cells into a single chain. Starting from
+		 start_point, the cell whose chain begins or ends closest to the current position is
+		 appended next, reversing it (order and directions) when entering from its end is cheaper.
+	"""
+
+	def __init__(self, heuristic):
+		self._heuristic = batch_heuristic(heuristic)
+
+	def _reverse_chain(self, chain):
+		for c in chain:
+			c.constrain_parameter('direction', c.direction[::-1])
+
+		return chain[::-1]
+
+	def sequence_constraints(self, cell_chains, start_point=None):
+		remaining_chains = [chain for chain in cell_chains if len(chain) > 0]
+		if len(remaining_chains) == 0:
+			return []
+
+		if start_point is None:
+			print('No start point specified, starting from first cell')
+			constraint_chain = list(remaining_chains.pop(0))
+			(start_point,) = constraint_chain[-1].egress_points
+
+		else:
+			constraint_chain = []
+
+		while len(remaining_chains) > 0:
+			# Candidates alternate between the start and end of each chain
+			chain_ends = []
+			for chain in remaining_chains:
+				chain_ends.extend((chain[0].ingress_points[0], chain[-1].egress_points[0]))
+
+			best = np.argmin(self._heuristic.compute_costs(start_point, chain_ends))
+			next_chain_idx, reverse = divmod(int(best), 2)
+
+			next_chain = remaining_chains.pop(next_chain_idx)
+			if reverse:
+				next_chain = self._reverse_chain(next_chain)
+
+			constraint_chain.extend(next_chain)
+			(start_point,) = next_chain[-1].egress_points
+
+		return constraint_chain
+
+
+class SweepSequencer(ConstraintSequencer):
+	""" Sequences constraints as they stream out of a layout. Constraints are buffered in a
+		 lookahead window of the given size and the one with the cheapest ingress from the current
+		 position is emitted next, ties going to the constraint laid out first. With the default
+		 window of one the sweep order of the layout is kept and only ingress points are chosen.
+	"""
+
+	def __init__(self, heuristic, window=1):
+		self._heuristic = batch_heuristic(heuristic)
+		self._window = max(1, window)
+
+	def _select_next(self, buffer, start_pt):
+		if start_pt is None:
+			next_idx = 0
+			ingress_point = buffer[0].ingress_points[0]
+		else:
+			owners, ingress_points = _ingress_candidates(buffer)
+			best = np.argmin(self._heuristic.compute_costs(start_pt, ingress_points))
+			next_idx = next(idx for idx, c in enumerate(buffer) if c is owners[best])
+			ingress_point = ingress_points[best]
+
+		next_constraint = buffer.pop(next_idx)
+		next_constraint.select_ingress(ingress_point)
+
+		return next_constraint
+
+	def sequence_constraints_iter(self, constraints, start_point=None):
+		""" Generator that yields constraints, with ingress selected, as soon as they are sequenced """
+		buffer = []
+		chain_egress_pt = start_point
+
+		for c in constraints:
+			buffer.append(c)
+			if len(buffer) < self._window:
+				continue
+
+			next_constraint = self._select_next(buffer, chain_egress_pt)
+			(chain_egress_pt,) = next_constraint.egress_points
+			yield next_constraint
+
+		while len(buffer) > 0:
+			next_constraint = self._select_next(buffer, chain_egress_pt)
+			(chain_egress_pt,) = next_constraint.egress_points
+			yield next_constraint
+
+	def sequence_constraints(self, constraints, start_point=None):
+		return list(self.sequence_constraints_iter(constraints, start_point))
+
+
+class EndpointCostMatrix(object):
+	""" Costs between every pair of endpoints of a list of open constraints, computed once in a
+		 single batched heuristic call. The matrix is broadcast for EuclideanCost and DirectedCost
+		 and flattened into one pass for FlowEnergyCost, other heuristics fall back to per pair
+		 calls. Endpoint 2i+k is endpoints[k] of constraint i, so a constraint entered at endpoint
+		 k is left at endpoint 2i+1-k. Sequencing strategies only work with constraint indices and
+		 entry endpoints (0 or 1) against this matrix, and the final chain is written back onto the
+		 constraints with apply.
+	"""
+
+	def __init__(self, constraints, heuristic, start_point=None):
+		self._constraints = list(constraints)
+		self._heuristic = batch_heuristic(heuristic)
+
+		self._endpoints = [pt for c in self._constraints for pt in c.endpoints]
+		endpoint_array = np.asarray(self._endpoints, dtype=float).reshape(-1, 2)
+
+		self._costs = self._heuristic.compute_cost_matrix(endpoint_array, endpoint_array)
+		self._start_costs = None if start_point is None else self._heuristic.compute_costs(start_point, endpoint_array)
+
+		# Directed constraints can only be entered through one of their endpoints
+		self._allowed_entries = np.ones(len(self._endpoints), dtype=bool)
+		for c_idx, c in enumerate(self._constraints):
+			if c.is_constrained('direction'):
+				self._allowed_entries[2*c_idx + c.direction[1]] = False
+
+	def __len__(self):
+		return len(self._constraints)
+
+	@property
+	def constraints(self):
+		return self._constraints
+
+	@property
+	def costs(self):
+		return self._costs
+
+	@property
+	def start_costs(self):
+		return self._start_costs
+
+	@property
+	def allowed_entries(self):
+		return self._allowed_entries
+
+	def chain_cost(self, order, entries):
+		""" Total cost of the links of a chain, including the link from the start point if known """
+		order = np.asarray(order, dtype=int)
+		entries = np.asarray(entries, dtype=int)
+		ingress = 2*order + entries
+		egress = 2*order + 1 - entries
+
+		cost = self._costs[egress[:-1], ingress[1:]].sum()
+		if self._start_costs is not None and len(order) > 0:
+			cost += self._start_costs[ingress[0]]
+
+		return float(cost)
+
+	def apply(self, order, entries):
+		""" Selects the ingress of every constraint in the chain and returns the ordered constraints """
+		constraint_chain = []
+		for c_idx, entry in zip(order, entries):
+			c = self._constraints[c_idx]
+			c.select_ingress(c.endpoints[entry])
+			constraint_chain.append(c)
+
+		return constraint_chain
+
+
+class MatrixSequencer(ConstraintSequencer):
+	""" Sequences open constraints entirely on a precomputed EndpointCostMatrix. The greedy
+		 strategy repeatedly takes the cheapest allowed entry from the current egress point. The
+		 matching strategy alternates between the two direction partitions like MatchingSequencer,
+		 breaking ties by choosing the constraint furthest from the first ingress point. The
+		 assignment strategy instead pairs every egress point with an ingress point of the other
+		 partition by solving a linear assignment problem on the whole link cost matrix, then joins
+		 any cycles of the assignment into one alternating chain. With improve_orientations the
+		 entry of every undirected constraint is then flipped whenever that lowers the cost of its
+		 two links. Ties go to the constraint listed first.
+	"""
+
+	def __init__(self, heuristic, strategy='greedy', improve_orientations=False):
+		self._heuristic = batch_heuristic(heuristic)
+		self._strategy = strategy
+		self._improve_orientations = improve_orientations
+
+	def _first_entry(self, matrix, c_idx):
+		return 0 if matrix.allowed_entries[2*c_idx] else 1
+
+	def _greedy(self, matrix, start_point):
+		num_constraints = len(matrix)
+		available = matrix.allowed_entries.copy()
+
+		if start_point is None:
+			current = 0
+			entry = self._first_entry(matrix, current)
+		else:
+			ingress = int(np.argmin(np.where(available, matrix.start_costs, np.inf)))
+			current, entry = divmod(ingress, 2)
+
+		order = [current]
+		entries = [entry]
+		available[2*current:2*current+2] = False
+
+		for _ in range(num_constraints-1):
+			egress = 2*current + 1 - entry
+			ingress = int(np.argmin(np.where(available, matrix.costs[egress], np.inf)))
+			current, entry = divmod(ingress, 2)
+
+			order.append(current)
+			entries.append(entry)
+			available[2*current:2*current+2] = False
+
+		return order, entries
+
+	def _matching(self, matrix, start_point):
+		constraints = matrix.constraints
+		if not all(c.is_constrained('direction') for c in constraints):
+			print('Must provide directed constraints to MatrixSequencer matching strategy')
+			return None, None
+
+		entries = np.array([c.direction[0] for c in constraints], dtype=int)
+		ingress = 2*np.arange(len(constraints)) + entries
+		partition_sizes = np.bincount(entries, minlength=2)
+		if np.count_nonzero(partition_sizes) != 2:
+			print('Must provide constraints with exactly two different directions to MatrixSequencer matching strategy')
+			return None, None
+
+		# Start in the larger partition, or the partition of the first constraint when sizes are equal
+		if partition_sizes[0] != partition_sizes[1]:
+			start_partition = np.argmax(partition_sizes)
+			candidates = entries == start_partition
+		else:
+			start_partition = entries[0]
+			candidates = np.ones(len(constraints), dtype=bool)
+
+		if start_point is None:
+			current = int(np.flatnonzero(entries == start_partition)[0])
+		else:
+			current = int(np.argmin(np.where(candidates, matrix.start_costs[ingress], np.inf)))
+
+		available = np.ones(len(constraints), dtype=bool)
+		available[current] = False
+		order = [current]
+		first_ingress = ingress[current]
+
+		for _ in range(len(constraints)-1):
+			egress = 2*current + 1 - entries[current]
+			candidates = available & (entries != entries[current])
+			if not candidates.any():
+				candidates = available
+
+			costs = np.where(candidates, matrix.costs[egress, ingress], np.inf)
+			ties = np.flatnonzero(costs == costs.min())
+			current = int(ties[np.argmax(matrix.costs[ingress[ties], first_ingress])])
+
+			order.append(current)
+			available[current] = False
+
+		return order, entries[order].tolist()
+
+	def _assignment(self, matrix, start_point):
+		constraints = matrix.constraints
+		if not all(c.is_constrained('direction') for c in constraints):
+			print('Must provide directed constraints to MatrixSequencer assignment strategy')
+			return None, None
+
+		entries = np.array([c.direction[0] for c in constraints], dtype=int)
+		partition_sizes = np.bincount(entries, minlength=2)
+		if np.count_nonzero(partition_sizes) != 2:
+			print('Must provide constraints with exactly two different directions to MatrixSequencer assignment strategy')
+			return None, None
+		elif abs(partition_sizes[0] - partition_sizes[1]) > 1:
+			print(f"Partition sizes {partition_sizes[0]} and {partition_sizes[1]} can't be alternated")
+			return None, None
+
+		num_constraints = len(constraints)
+		ingress = 2*np.arange(num_constraints) + entries
+		egress = 2*np.arange(num_constraints) + 1 - entries
+
+		# Row n is the start of the chain and column n its end, links only step between partitions
+		costs = np.full((num_constraints+1, num_constraints+1), np.inf)
+		opposite = entries[:, np.newaxis] != entries[np.newaxis, :]
+		costs[:-1, :-1] = np.where(opposite, matrix.costs[np.ix_(egress, ingress)], np.inf)
+		costs[-1, :-1] = matrix.start_costs[ingress] if start_point is not None else 0.
+		costs[:-1, -1] = 0.
+
+		order = _patch_assignment(costs, _linear_assignment(costs))
+
+		return order, entries[order].tolist()
+
+	def _improve(self, matrix, order, entries):
+		order = np.asarray(order, dtype=int)
+		entries = np.asarray(entries, dtype=int)
+		flippable = matrix.allowed_entries[2*order] & matrix.allowed_entries[2*order+1]
+		costs = matrix.costs
+
+		def link_cost(pos, entry):
+			ingress = 2*order[pos] + entry
+			egress = 2*order[pos] + 1 - entry
+			cost = 0.
+			if pos > 0:
+				cost += costs[2*order[pos-1] + 1 - entries[pos-1], ingress]
+			elif matrix.start_costs is not None:
+				cost += matrix.start_costs[ingress]
+			if pos < len(order)-1:
+				cost += costs[egress, 2*order[pos+1] + entries[pos+1]]
+			return cost
+
+		improved = True
+		while improved:
+			improved = False
+			for pos in np.flatnonzero(flippable):
+				if link_cost(pos, 1 - entries[pos]) < link_cost(pos, entries[pos]):
+					entries[pos] = 1 - entries[pos]
+					improved = True
+
+		return order.tolist(), entries.tolist()
+
+	def sequence_constraints(self, constraints, start_point=None):
+		if len(constraints) == 0:
+			return []
+
+		matrix = EndpointCostMatrix(constraints, self._heuristic, start_point)
+
+		if self._strategy == 'matching':
+			order, entries = self._matching(matrix, start_point)
+			if order is None:
+				return []
+		elif self._strategy == 'assignment':
+			order, entries = self._assignment(matrix, start_point)
+			if order is None:
+				return []
+		else:
+			order, entries = self._greedy(matrix, start_point)
+
+		if self._improve_orientations:
+			order, entries = self._improve(matrix, order, entries)
+
+		return matrix.apply(order, entries)
+
+
+class LocalSearchSequencer(ConstraintSequencer):
+	""" Improvement stage for the chain produced by another sequencer (a greedy MatrixSequencer by
+		 default). The chain is improved on an EndpointCostMatrix with 2-opt segment reversals,
+		 Or-opt moves of up to max_segment consecutive constraints and single constraint flips. A
+		 segment is either reversed keeping each constraint's direction or, when every constraint
+		 in it is undirected, reversed together with their directions. Only constraints that were
+		 undirected before sequencing are ever flipped, so directions set by refinements are kept.
+
+		 Move deltas are computed in constant time from the links around the move and prefix sums
+		 of the link costs along the chain, all candidates for a position at once. The best move
+		 for each position is applied when it lowers the chain cost, until no move helps or
+		 time_limit seconds or max_iterations applied moves are used up.
+	"""
+
+	def __init__(self, heuristic, sequencer=None, time_limit=None, max_iterations=None, max_segment=3):
+		self._heuristic = batch_heuristic(heuristic)
+		self._sequencer = sequencer if sequencer is not None else MatrixSequencer(self._heuristic)
+		self._time_limit = time_limit
+		self._max_iterations = max_iterations
+		self._max_segment = max_segment
+
+	def _links(self, matrix, order, entries, start_point):
+		""" Ingress and egress endpoints of every position and the cost matrix rows into each position """
+		ingress = 2*order + entries
+		egress = 2*order + 1 - entries
+		start_costs = matrix.start_costs if start_point is not None else np.zeros(len(matrix.costs))
+
+		return ingress, egress, start_costs
+
+	def _prev_row(self, matrix, egress, start_costs, pos):
+		""" Costs of reaching every endpoint from the constraint before pos (or the start point) """
+		return start_costs if pos == 0 else matrix.costs[egress[pos-1]]
+
+	def _two_opt(self, matrix, order, entries, flippable, start_point):
+		costs = matrix.costs
+		num_constraints = len(order)
+		ingress, egress, start_costs = self._links(matrix, order, entries, start_point)
+
+		# Link costs between consecutive positions as chained, with the order of the pair swapped,
+		# and with the pair swapped and both flipped, as prefix sums over positions
+		forward = np.concatenate([[0.], np.cumsum(costs[egress[:-1], ingress[1:]])])
+		backward = np.concatenate([[0.], np.cumsum(costs[egress[1:], ingress[:-1]])])
+		flipped = np.concatenate([[0.], np.cumsum(costs[ingress[1:], egress[:-1]])])
+		flippable_count = np.concatenate([[0], np.cumsum(flippable)])
+		next_links = np.append(forward[1:] - forward[:-1], 0.)
+
+		for i in range(num_constraints-1):
+			j = np.arange(i+1, num_constraints)
+			prev_row = self._prev_row(matrix, egress, start_costs, i)
+			has_next = j < num_constraints-1
+			next_ingress = ingress[np.minimum(j+1, num_constraints-1)]
+
+			old = prev_row[ingress[i]] + forward[j] - forward[i] + next_links[j]
+			keep = prev_row[ingress[j]] + np.where(has_next, costs[egress[i], next_ingress], 0.) + backward[j] - backward[i]
+			flip = prev_row[egress[j]] + np.where(has_next, costs[ingress[i], next_ingress], 0.) + flipped[j] - flipped[i]
+			flip = np.where(flippable_count[j+1] - flippable_count[i] == j-i+1, flip, np.inf)
+
+			deltas = np.minimum(keep, flip) - old
+			best = int(np.argmin(deltas))
+			if deltas[best] < -1e-9:
+				j = int(j[best])
+				order[i:j+1] = order[i:j+1][::-1].copy()
+				flippable[i:j+1] = flippable[i:j+1][::-1].copy()
+				entries[i:j+1] = entries[i:j+1][::-1].copy()
+				if flip[best] < keep[best]:
+					entries[i:j+1] = 1 - entries[i:j+1]
+				return True
+
+		return False
+
+	def _or_opt(self, matrix, order, entries, flippable, start_point):
+		costs = matrix.costs
+		num_constraints = len(order)
+		ingress, egress, start_costs = self._links(matrix, order, entries, start_point)
+		next_links = np.append(costs[egress[:-1], ingress[1:]], 0.)
+
+		# Costs of inserting between k and k+1, with k = -1 meaning after the start point
+		k = np.arange(-1, num_constraints)
+		k_egress = egress[np.maximum(k, 0)]
+		has_next = k < num_constraints-1
+		k_next_ingress = ingress[np.minimum(k+1, num_constraints-1)]
+		k_links = np.concatenate([[start_costs[ingress[0]]], next_links])
+
+		for length in range(1, self._max_segment+1):
+			for first in range(num_constraints - length + 1):
+				last = first + length - 1
+				prev_row = self._prev_row(matrix, egress, start_costs, first)
+				removed = prev_row[ingress[first]] + next_links[last]
+				if last < num_constraints-1:
+					removed -= prev_row[ingress[last+1]]
+
+				into = np.where(k >= 0, costs[k_egress, ingress[first]], start_costs[ingress[first]])
+				out = np.where(has_next, costs[egress[last], k_next_ingress], 0.)
+				deltas = into + out - k_links - removed
+				deltas[first:last+2] = np.inf
+
+				best = int(np.argmin(deltas))
+				if deltas[best] < -1e-9:
+					insert_after = int(k[best])
+					keep = np.r_[0:first, last+1:num_constraints]
+					split = np.searchsorted(keep, insert_after, side='right')
+					new_positions = np.r_[keep[:split], first:last+1, keep[split:]]
+					order[:] = order[new_positions]
+					entries[:] = entries[new_positions]
+					flippable[:] = flippable[new_positions]
+					return True
+
+		return False
+
+	def _flip(self, matrix, order, entries, flippable, start_point):
+		costs = matrix.costs
+		num_constraints = len(order)
+		ingress, egress, start_costs = self._links(matrix, order, entries, start_point)
+
+		for pos in np.flatnonzero(flippable):
+			prev_row = self._prev_row(matrix, egress, start_costs, pos)
+			old = prev_row[ingress[pos]]
+			new = prev_row[egress[pos]]
+			if pos < num_constraints-1:
+				old += costs[egress[pos], ingress[pos+1]]
+				new += costs[ingress[pos], ingress[pos+1]]
+
+			if new < old - 1e-9:
+				entries[pos] = 1 - entries[pos]
+				return True
+
+		return False
+
+	def sequence_constraints(self, constraints, start_point=None):
+		constraints = list(constraints)
+		if len(constraints) == 0:
+			return []
+
+		# Sequencing selects ingress points and so directs every constraint, remember which were free
+		matrix = EndpointCostMatrix(constraints, self._heuristic, start_point)
+		undirected = [not c.is_constrained('direction') for c in constraints]
+
+		constraint_chain = self._sequencer.sequence_constraints(constraints, start_point)
+		if len(constraint_chain) != len(constraints):
+			return constraint_chain
+
+		index = {id(c): c_idx for c_idx, c in enumerate(constraints)}
+		order = np.array([index[id(c)] for c in constraint_chain], dtype=int)
+		entries = np.array([c.direction[0] for c in constraint_chain], dtype=int)
+		flippable = np.array(undirected, dtype=bool)[order]
+
+		start_time = time.perf_counter()
+		iterations = 0
+		moves = (self._two_opt, self._or_opt, self._flip)
+		improved = True
+		while improved:
+			if self._max_iterations is not None and iterations >= self._max_iterations:
+				break
+			if self._time_limit is not None and time.perf_counter() - start_time > self._time_limit:
+				break
+
+			improved = any(move(matrix, order, entries, flippable, start_point) for move in moves)
+			iterations += improved
+
+		for c_idx in np.flatnonzero(undirected):
+			constraints[c_idx].unconstrain_parameter('direction')
+
+		return matrix.apply(order.tolist(), entries.tolist())
+
+
+def _linear_assignment(costs):
+	""" Minimum cost perfect assignment of a square cost matrix by the shortest augmenting path
+		 Hungarian algorithm, O(n^3) with the inner column scan vectorized. Infinite costs are
+		 replaced by a cost larger than any finite assignment. Returns the column of every row.
+	"""
+	costs = np.asarray(costs, dtype=float)
+	num_rows = len(costs)
+	finite = np.isfinite(costs)
+	large_cost = (np.abs(costs[finite]).max() + 1.) * (num_rows + 1) if finite.any() else 1.
+	costs = np.where(finite, costs, large_cost)
+
+	# Index 0 is a virtual column holding the row being assigned, as in the textbook formulation
+	row_potentials = np.zeros(num_rows + 1)
+	col_potentials = np.zeros(num_rows + 1)
+	col_rows = np.zeros(num_rows + 1, dtype=int)
+	way = np.zeros(num_rows + 1, dtype=int)
+
+	for row in range(1, num_rows + 1):
+		col_rows[0] = row
+		col = 0
+		min_slack = np.full(num_rows + 1, np.inf)
+		used = np.zeros(num_rows + 1, dtype=bool)
+
+		while col_rows[col] != 0:
+			used[col] = True
+			current_row = col_rows[col]
+			slack = costs[current_row-1] - row_potentials[current_row] - col_potentials[1:]
+
+			free = ~used[1:]
+			update = free & (slack < min_slack[1:])
+			min_slack[1:][update] = slack[update]
+			way[1:][update] = col
+
+			free_slack = np.where(free, min_slack[1:], np.inf)
+			next_col = int(np.argmin(free_slack)) + 1
+			delta = free_slack[next_col-1]
+
+			row_potentials[col_rows[used]] += delta
+			col_potentials[used] -= delta
+			min_slack[1:][free] -= delta
+			col = next_col
+
+		# Flip the augmenting path back to the virtual column
+		while col != 0:
+			prev_col = way[col]
+			col_rows[col] = col_rows[prev_col]
+			col = prev_col
+
+	assignment = np.empty(num_rows, dtype=int)
+	assignment[col_rows[1:] - 1] = np.arange(num_rows)
+
+	return assignment
+
+
+def _patch_assignment(costs, successors):
+	""" Joins the path and cycles of an assignment into a single path. Node n (the last row and
+		 column of costs) is the start as a row and the end as a column. Each cycle is broken at
+		 one of its links and spliced into a link of the path, picking the pair of links whose
+		 replacement adds the least cost, as in Karp's patching heuristic.
+	"""
+	num_nodes = len(costs) - 1
+	successors = np.asarray(successors, dtype=int).copy()
+
+	while True:
+		path = []
+		node = successors[num_nodes]
+		while node != num_nodes:
+			path.append(node)
+			node = successors[node]
+
+		if len(path) == num_nodes:
+			return path
+
+		on_path = np.zeros(num_nodes, dtype=bool)
+		on_path[path] = True
+		cycle = [int(np.flatnonzero(~on_path)[0])]
+		while successors[cycle[-1]] != cycle[0]:
+			cycle.append(successors[cycle[-1]])
+
+		path_from = np.array([num_nodes] + path)
+		path_to = successors[path_from]
+		cycle_from = np.array(cycle)
+		cycle_to = successors[cycle_from]
+
+		# Replace path link p->q and cycle link u->v with p->v and u->q
+		added = costs[np.ix_(path_from, cycle_to)] + costs[np.ix_(cycle_from, path_to)].T
+		removed = costs[path_from, path_to][:, np.newaxis] + costs[cycle_from, cycle_to][np.newaxis, :]
+		path_idx, cycle_idx = np.unravel_index(np.argmin(added - removed), added.shape)
+
+		successors[path_from[path_idx]] = cycle_to[cycle_idx]
+		successors[cycle_from[cycle_idx]] = path_to[path_idx]
+
+
+def _min_with_parent(candidates):
+	""" Elementwise minimum over the first axis and the index it was taken from """
+	best = candidates[0].copy()
+	parent = np.zeros(best.shape, dtype=np.int16)
+	for idx in range(1, len(candidates)):
+		better = candidates[idx] < best
+		best[better] = candidates[idx][better]
+		parent[better] = idx
+
+	return best, parent
+
+
+class _SubsetRanks(object):
+	""" Ranks subsets of m items (as bitmasks) within the group of subsets of the same size, and
+		 for every size and item the ranks of the subsets without the item together with the ranks
+		 of the same subsets once the item is added
+	"""
+
+	def __init__(self, m):
+		masks = np.arange(1 << m)
+		sizes = np.zeros(1 << m, dtype=int)
+		for item in range(m):
+			sizes += (masks >> item) & 1
+
+		self.groups = [masks[sizes == size] for size in range(m+1)]
+		self.rank = np.empty(1 << m, dtype=int)
+		for group in self.groups:
+			self.rank[group] = np.arange(len(group))
+
+		self.transitions = []
+		for size in range(m):
+			group = self.groups[size]
+			size_transitions = []
+			for item in range(m):
+				without_item = group[((group >> item) & 1) == 0]
+				size_transitions.append((self.rank[without_item], self.rank[without_item | (1 << item)]))
+			self.transitions.append(size_transitions)
+
+
+class ExactMatchingSequencer(ConstraintSequencer):
+	""" Exact replacement for BruteForceMatchingSequencer. Finds the cheapest chain that
+		 alternates between the two direction partitions, starting with the larger partition (either
+		 when they are the same size), with Held-Karp dynamic programming over an EndpointCostMatrix
+		 instead of enumerating every pair of partition permutations. A state is the subset of each
+		 partition visited so far and the last constraint, and each step adds one constraint from the
+		 partition whose turn it is, so every transition is a single vectorized min over the previous
+		 layer. Optional start and end points add the cost of reaching the first constraint and of
+		 leaving the last one, as the brute force planners do.
+
+		 The number of states grows like C(n, n/2) * n/2 for n constraints, which keeps around 24
+		 transects within seconds. Above max_states the chain falls back to the best greedy chain
+		 improved by swapping constraints of the same partition, or a ValueError is raised when
+		 fallback is False so callers that promise an optimal chain never get an approximate one.
+	"""
+
+	def __init__(self, heuristic=None, max_states=5e7, fallback=True):
+		self._heuristic = batch_heuristic(heuristic if heuristic is not None else rp.heuristics.EuclideanDistance)
+		self._max_states = max_states
+		self._fallback = fallback
+
+	def _greedy_chain(self, links, start_costs, end_costs, first):
+		order = [first]
+		cost = start_costs[first]
+		remaining = np.ones(len(links), dtype=bool)
+		remaining[first] = False
+
+		while remaining.any():
+			next_costs = np.where(remaining, links[order[-1]], np.inf)
+			next_idx = int(np.argmin(next_costs))
+			cost += next_costs[next_idx]
+			order.append(next_idx)
+			remaining[next_idx] = False
+
+		return cost + end_costs[order[-1]], order
+
+	def _improve_chain(self, links, start_costs, end_costs, order):
+		""" Swaps pairs of constraints from the same partition while that makes the chain cheaper """
+		order = np.array(order, dtype=int)
+		chain_cost = lambda o: start_costs[o[0]] + links[o[:-1], o[1:]].sum() + end_costs[o[-1]]
+		best_cost = chain_cost(order)
+
+		improved = True
+		while improved:
+			improved = False
+			# Chains alternate so positions of the same parity hold constraints from the same partition
+			for i in range(len(order)):
+				for j in range(i+2, len(order), 2):
+					order[i], order[j] = order[j], order[i]
+					cost = chain_cost(order)
+					if cost < best_cost:
+						best_cost = cost
+						improved = True
+					else:
+						order[i], order[j] = order[j], order[i]
+
+		return best_cost, order.tolist()
+
+	def _num_states(self, first_size, second_size):
+		binomial = lambda n, k: float(np.prod(np.arange(n-k+1, n+1)) / np.prod(np.arange(1, k+1)))
+		num_states = 0.
+		for step in range(1, first_size + second_size + 1):
+			first_count, second_count = (step+1)//2, step//2
+			num_states += binomial(first_size, first_count) * binomial(second_size, second_count) * max(first_size, second_size)
+
+		return num_states
+
+	def _held_karp(self, first, second, links, start_costs, end_costs):
+		""" Cheapest chain alternating first[0], second[0], first[1], ... over every ordering of each
+			 partition. Constraints are given as index arrays into links and the cost vectors.
+		"""
+		first_ranks = _SubsetRanks(len(first))
+		second_ranks = _SubsetRanks(len(second))
+		first_to_second = links[np.ix_(first, second)]
+		second_to_first = links[np.ix_(second, first)]
+
+		# Layer costs are indexed by (last constraint, first subset rank, second subset rank), where
+		# the last constraint indexes the partition that was just added to
+		costs = np.full((len(first), len(first), 1), np.inf)
+		costs[np.arange(len(first)), np.arange(len(first)), 0] = start_costs[first]
+		parents = [None]
+
+		for step in range(1, len(first) + len(second)):
+			first_count, second_count = (step+1)//2, step//2
+
+			if step % 2 == 1:
+				# Add a constraint from the second partition after one from the first
+				next_costs = np.full((len(second), costs.shape[1], len(second_ranks.groups[second_count+1])), np.inf)
+				next_parents = np.zeros(next_costs.shape, dtype=np.int16)
+				for item, (src, dst) in enumerate(second_ranks.transitions[second_count]):
+					candidates = costs[:, :, src] + first_to_second[:, item, np.newaxis, np.newaxis]
+					next_costs[item][:, dst], next_parents[item][:, dst] = _min_with_parent(candidates)
+			else:
+				# Add a constraint from the first partition after one from the second
+				next_costs = np.full((len(first), len(first_ranks.groups[first_count+1]), costs.shape[2]), np.inf)
+				next_parents = np.zeros(next_costs.shape, dtype=np.int16)
+				for item, (src, dst) in enumerate(first_ranks.transitions[first_count]):
+					candidates = costs[:, src, :] + second_to_first[:, item, np.newaxis, np.newaxis]
+					next_costs[item][dst, :], next_parents[item][dst, :] = _min_with_parent(candidates)
+
+			costs = next_costs
+			parents.append(next_parents)
+
+		# Every constraint has been visited so only one subset of each partition is left
+		last_partition = first if (len(first) + len(second)) % 2 == 1 else second
+		final_costs = costs[:, 0, 0] + end_costs[last_partition]
+		last = int(np.argmin(final_costs))
+		best_cost = final_costs[last]
+
+		# Walk the parents back from the full subsets
+		first_mask = (1 << len(first)) - 1
+		second_mask = (1 << len(second)) - 1
+		order = []
+		for step in range(len(first) + len(second) - 1, -1, -1):
+			in_first = step % 2 == 0
+			order.append(first[last] if in_first else second[last])
+			if step == 0:
+				break
+
+			prev_last = int(parents[step][last, first_ranks.rank[first_mask], second_ranks.rank[second_mask]])
+			if in_first:
+				first_mask &= ~(1 << last)
+			else:
+				second_mask &= ~(1 << last)
+			last = prev_last
+
+		return best_cost, [int(c_idx) for c_idx in reversed(order)]
+
+	def sequence_constraints(self, constraints, start_point=None, end_point=None):
+		constraints = list(constraints)
+		if not all(c.is_constrained('direction') for c in constraints):
+			print('Must provide directed constraints to ExactMatchingSequencer')
+			return []
+
+		partitions = np.array([c.direction[0] for c in constraints], dtype=int)
+		partition_sizes = np.bincount(partitions, minlength=2)
+		if np.count_nonzero(partition_sizes) != 2:
+			print('Must provide constraints with exactly two different directions to ExactMatchingSequencer')
+			return []
+		elif abs(partition_sizes[0] - partition_sizes[1]) > 1:
+			print(f"Partition sizes {partition_sizes[0]} and {partition_sizes[1]} can't be alternated")
+			return []
+
+		num_constraints = len(constraints)
+		matrix = EndpointCostMatrix(constraints, self._heuristic, start_point)
+		ingress = 2*np.arange(num_constraints) + partitions
+		egress = 2*np.arange(num_constraints) + 1 - partitions
+
+		# Link costs between constraints, chains can only step between the two partitions
+		opposite = partitions[:, np.newaxis] != partitions[np.newaxis, :]
+		links = np.where(opposite, matrix.costs[np.ix_(egress, ingress)], np.inf)
+
+		start_costs = matrix.start_costs[ingress] if start_point is not None else np.zeros(num_constraints)
+		if end_point is not None:
+			egress_points = [c.endpoints[c.direction[1]] for c in constraints]
+			end_costs = self._heuristic.compute_cost_matrix(egress_points, [end_point])[:, 0]
+		else:
+			end_costs = np.zeros(num_constraints)
+
+		# Chains start with the larger partition, or with either one when they are the same size
+		partition_members = [np.flatnonzero(partitions == 0), np.flatnonzero(partitions == 1)]
+		if partition_sizes[0] != partition_sizes[1]:
+			first_partitions = [int(np.argmax(partition_sizes))]
+		else:
+			first_partitions = [partitions[0], 1 - partitions[0]]
+
+		if self._num_states(partition_sizes.max(), partition_sizes.min()) > self._max_states:
+			if not self._fallback:
+				raise ValueError(f"Too many states to sequence {num_constraints} constraints exactly, raise max_states")
+
+			print(f"Too many states to sequence {num_constraints} constraints exactly, using best improved greedy chain")
+			first_candidates = np.concatenate([partition_members[p] for p in first_partitions])
+			_, order = min((self._greedy_chain(links, start_costs, end_costs, first) for first in first_candidates), key=lambda chain: chain[0])
+			_, order = self._improve_chain(links, start_costs, end_costs, order)
+		else:
+			_, order = min((self._held_karp(partition_members[p], partition_members[1-p], links, start_costs, end_costs) for p in first_partitions), key=lambda chain: chain[0])
+
+		return matrix.apply(order, partitions[order].tolist())
+
+
+def _best_alternating_chain(shared, search_args):
+	""" Pool worker that finds the cheapest alternating chain starting with a given prefix by
+		 depth first search, abandoning a branch as soon as its cost plus the cheapest link into
+		 each remaining constraint reaches the best known cost
+	"""
+	links, start_costs, end_costs, best_cost = shared
+	partitions, prefix = search_args
+
+	remaining = [[c_idx for c_idx in partition if c_idx not in prefix] for partition in partitions]
+	order = list(prefix)
+	cost = start_costs[prefix[0]] + sum(links[a, b] for a, b in zip(prefix[:-1], prefix[1:]))
+	best_order = None
+
+	# Every remaining constraint is entered from a constraint of the other partition
+	min_incoming = np.zeros(len(links))
+	for partition, other in ((partitions[0], partitions[1]), (partitions[1], partitions[0])):
+		if len(partition) > 0 and len(other) > 0:
+			min_incoming[partition] = links[np.ix_(other, partition)].min(axis=0)
+	remaining_bound = min_incoming[remaining[0] + remaining[1]].sum()
+
+	def search(cost):
+		nonlocal best_cost, best_order, remaining_bound
+		if cost + remaining_bound >= best_cost:
+			return
+
+		partition = remaining[len(order) % 2]
+		if len(partition) == 0:
+			cost += end_costs[order[-1]]
+			if cost < best_cost:
+				best_cost = cost
+				best_order = list(order)
+			return
+
+		row = links[order[-1]]
+		for idx in range(len(partition)):
+			c_idx = partition.pop(idx)
+			order.append(c_idx)
+			remaining_bound -= min_incoming[c_idx]
+			search(cost + row[c_idx])
+			remaining_bound += min_incoming[c_idx]
+			order.pop()
+			partition.insert(idx, c_idx)
+
+	search(cost)
+
+	return best_cost, best_order
+
+
+class ChainEvaluator(object):
+	""" Scores chains of directed open constraints by the length of the path SimpleLinker would
+		 produce for them: precomputed constraint lengths plus straight links between egress and
+		 ingress points, and from the start point and to the end point when given. Lets brute force
+		 planners compare candidate chains without linking each one into a path.
+
+		 best_alternating_chain searches the same chains as BruteForceMatchingSequencer by depth
+		 first search, dropping a chain once its partial cost reaches the best cost so far. The
+		 search is split by the first two constraints of the chain, across a process pool when
+		 max_workers > 1, with the best greedy chain as the starting bound.
+	"""
+
+	def __init__(self, constraints, start_point=None, end_point=None, max_workers=1):
+		self._constraints = list(constraints)
+		self._max_workers = max_workers
+
+		self._lengths = np.array([np.linalg.norm(np.diff(np.asarray(c.get_coord_list(), dtype=float), axis=0), axis=1).sum() for c in self._constraints])
+		ingress = np.array([c.endpoints[c.direction[0]] for c in self._constraints], dtype=float).reshape(-1, 2)
+		egress = np.array([c.endpoints[c.direction[1]] for c in self._constraints], dtype=float).reshape(-1, 2)
+
+		self._links = np.linalg.norm(egress[:, np.newaxis, :] - ingress[np.newaxis, :, :], axis=2)
+		self._start_costs = np.zeros(len(self._constraints)) if start_point is None else np.linalg.norm(ingress - np.asarray(start_point, dtype=float), axis=1)
+		self._end_costs = np.zeros(len(self._constraints)) if end_point is None else np.linalg.norm(egress - np.asarray(end_point, dtype=float), axis=1)
+
+	def _indices(self, constraint_chain):
+		index = {id(c): c_idx for c_idx, c in enumerate(self._constraints)}
+		return [index[id(c)] for c in constraint_chain]
+
+	def _order_cost(self, order):
+		return self._start_costs[order[0]] + self._links[order[:-1], order[1:]].sum() + self._end_costs[order[-1]]
+
+	def chain_cost(self, constraint_chain):
+		""" Length of the path linking the chain, including the start and end links """
+		order = np.array(self._indices(constraint_chain), dtype=int)
+		if len(order) == 0:
+			return 0.
+
+		return float(self._lengths[order].sum() + self._order_cost(order))
+
+	def _greedy_order(self, partitions):
+		best_cost, best_order = np.inf, None
+		for first in partitions[0]:
+			order = [first]
+			remaining = [list(partitions[0]), list(partitions[1])]
+			remaining[0].remove(first)
+			while len(remaining[len(order) % 2]) > 0:
+				partition = remaining[len(order) % 2]
+				next_idx = min(partition, key=lambda c_idx: self._links[order[-1], c_idx])
+				partition.remove(next_idx)
+				order.append(next_idx)
+
+			cost = self._order_cost(np.array(order))
+			if cost < best_cost:
+				best_cost, best_order = cost, order
+
+		return best_cost, best_order
+
+	def best_alternating_chain(self):
+		""" Returns the shortest chain alternating between the two direction partitions """
+		if not all(c.is_constrained('direction') for c in self._constraints):
+			print('Must provide directed constraints to ChainEvaluator')
+			return []
+
+		partitions = defaultdict(list)
+		for c_idx, c in enumerate(self._constraints):
+			partitions[tuple(c.direction)].append(c_idx)
+
+		if len(partitions) != 2:
+			print('Must provide constraints with exactly two different directions to ChainEvaluator')
+			return []
+
+		partition_sizes = [len(partition) for partition in partitions.values()]
+		if abs(partition_sizes[0] - partition_sizes[1]) > 1:
+			print(f"Partition sizes {partition_sizes[0]} and {partition_sizes[1]} can't be alternated")
+			return []
+
+		# Chains start with the larger partition, or with either one when they are the same size
+		partitions = sorted(partitions.values(), key=len, reverse=True)
+		orientations = [partitions]
+		if len(partitions[0]) == len(partitions[1]):
+			orientations.append(partitions[::-1])
+
+		best_cost, best_order = min((self._greedy_order(p) for p in orientations), key=lambda result: result[0])
+
+		# Cost arrays are sent to each worker once, only the partitions and prefix go with every task
+		search_args = [(p, prefix) for p in orientations for prefix in itertools.product(*p)]
+		shared = (self._links, self._start_costs, self._end_costs, best_cost)
+		results = parallel_map(_best_alternating_chain, search_args, shared, self._max_workers)
+
+		for cost, order in results:
+			if order is not None and cost < best_cost:
+				best_cost, best_order = cost, order
+
+		return [self._constraints[c_idx] for c_idx in best_order]
+
+
 class BruteForceMatchingSequencer(ConstraintSequencer):
 
 	def __init__(self):
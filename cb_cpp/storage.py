@@ -0,0 +1,78 @@
+import json
+import numpy as np
+
+# File layout: magic, format version, header length, JSON header, then every column as a raw
+# little endian block aligned to COLUMN_ALIGNMENT bytes. The header lists the kind of object
+# stored, each column's dtype, shape and byte offset, and any metadata that isn't columnar.
+MAGIC = b'CBCPPBIN'
+VERSION = 1
+COLUMN_ALIGNMENT = 64
+
+_PREAMBLE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('header_length', '<u4')])
+
+def _aligned(offset):
+	return -(-offset // COLUMN_ALIGNMENT) * COLUMN_ALIGNMENT
+
+def write_columns(filename, kind, columns, metadata=None):
+	""" Writes named numeric arrays and JSON serializable metadata to a binary file """
+	columns = {name: np.ascontiguousarray(column) for name, column in columns.items()}
+	column_info = {name: {'dtype': column.dtype.newbyteorder('<').str, 'shape': list(column.shape)} for name, column in columns.items()}
+
+	# Column offsets depend on the header length, so lay them out until the header stops growing
+	header_length = 0
+	while True:
+		offset = _aligned(_PREAMBLE.itemsize + header_length)
+		for name, column in columns.items():
+			column_info[name]['offset'] = offset
+			offset = _aligned(offset + column.nbytes)
+
+		# numpy arrays and scalars left in the metadata are written as plain JSON values
+		header = json.dumps({'kind': kind, 'columns': column_info, 'metadata': metadata or {}}, default=lambda v: v.tolist()).encode()
+		if len(header) <= header_length:
+			break
+		header_length = len(header)
+
+	with open(filename, 'wb') as f:
+		preamble = np.array([(MAGIC, VERSION, header_length)], dtype=_PREAMBLE)
+		f.write(preamble.tobytes())
+		f.write(header.ljust(header_length))
+
+		for name, column in columns.items():
+			f.seek(column_info[name]['offset'])
+			column.astype(column_info[name]['dtype'], copy=False).tofile(f)
+
+		# Pad to the end of the last block so every column can be mapped
+		f.truncate(offset)
+
+def restore_tuples(values):
+	""" Turns the per waypoint lists JSON made of tuples (points, thrust ranges) back into tuples.
+		 Values that aren't lists (scalars, strings, None) are returned unchanged.
+	"""
+	if not isinstance(values, list):
+		return values
+
+	return [tuple(value) if isinstance(value, list) else value for value in values]
+
+def read_columns(filename, mode='r'):
+	""" Maps every column of a binary file with numpy.memmap. Returns the stored kind, a dict of
+		 column arrays and the metadata. mode 'r' gives read only columns, 'c' copy on write ones.
+	"""
+	preamble = np.fromfile(filename, dtype=_PREAMBLE, count=1)
+	if len(preamble) == 0 or preamble['magic'][0] != MAGIC:
+		raise ValueError(f"{filename} is not a cb_cpp binary file")
+	elif preamble['version'][0] > VERSION:
+		raise ValueError(f"{filename} has unsupported format version {preamble['version'][0]}")
+
+	with open(filename, 'rb') as f:
+		f.seek(_PREAMBLE.itemsize)
+		header = json.loads(f.read(int(preamble['header_length'][0])))
+
+	columns = {}
+	for name, info in header['columns'].items():
+		shape = tuple(info['shape'])
+		if int(np.prod(shape)) == 0:
+			columns[name] = np.empty(shape, dtype=info['dtype'])
+		else:
+			columns[name] = np.memmap(filename, dtype=info['dtype'], mode=mode, offset=info['offset'], shape=shape)
+
+	return header['kind'], columns, header['metadata']
@@ -0,0 +1,92 @@
+import copy
+import pickle
+import time
+import robot_primitives as rp
+
+from context import cb_cpp
+
+OpenConstraint = cb_cpp.constraint.OpenConstraint
+
+class ClassPropertyConstraint(cb_cpp.base.Constraint):
+	""" Reproduces the previous constraint implementation, which registered a class level property
+		 every time a parameter was constrained, for comparison. The coordinate and endpoint logic
+		 is shared with OpenConstraint so only parameter storage differs.
+	"""
+
+	def __init__(self, coord_list, **constrained_parameters):
+		self._coord_list = coord_list.copy()
+		self._constrained_parameters = {**constrained_parameters}
+
+		for param in self._constrained_parameters.keys():
+			setattr(ClassPropertyConstraint, param, self._property_factory(param))
+
+		if len(coord_list) == 1:
+			first = last = coord_list[0]
+		else:
+			first, *_, last = coord_list
+
+		self._endpoints = (first, last)
+
+	def _property_factory(self, parameter):
+		return property(lambda obj:obj._constrained_parameters[parameter],
+							lambda obj, val: obj._constrained_parameters.update({parameter:val}),
+							lambda obj:obj._constrained_parameters.pop(parameter))
+
+	def is_constrained(self, parameter):
+		return parameter in self._constrained_parameters
+
+	def constrain_parameter(self, parameter, value):
+		self._constrained_parameters[parameter] = value
+		setattr(ClassPropertyConstraint, parameter, self._property_factory(parameter))
+
+	@property
+	def constrained_parameters(self):
+		return self._constrained_parameters
+
+	get_coord_list = OpenConstraint.get_coord_list
+	select_ingress = OpenConstraint.select_ingress
+	ingress_points = property(OpenConstraint.ingress_points.fget)
+	egress_points = property(OpenConstraint.egress_points.fget)
+
+domain = rp.areas.Domain.from_vertex_list([(0., 0.), (2000., 150.), (2010., 250.), (5., 120.)])
+layout = cb_cpp.layouts.OrientedBoustrophedonPattern.from_transect_orientation(0.5, 1., (0., 1.), batched=True)
+transects = [c.coord_list for c in layout.layout_constraints(domain)]
+
+refinement = cb_cpp.refinements.AlternatingDirections()
+sequencer = cb_cpp.sequencers.GreedySequencer(rp.heuristics.EuclideanDistance)
+
+def refine_and_sequence(constraint_type, repeats=20):
+	""" Times the refine and GreedySequencer loop of the planners, returning the fastest of
+		 repeats runs for each stage so the comparison is stable between runs
+	"""
+	refine_times = []
+	sequence_times = []
+	for _ in range(repeats):
+		constraints = [constraint_type(coords) for coords in transects]
+
+		start = time.perf_counter()
+		refinement.refine_constraints(constraints, area_ingress_point=(1000., 0.))
+		refined = time.perf_counter()
+		chain = sequencer.sequence_constraints(constraints, (1000., 0.))
+		for c in chain:
+			c.direction, c.is_constrained('thrust')
+		sequenced = time.perf_counter()
+
+		refine_times.append(refined - start)
+		sequence_times.append(sequenced - refined)
+
+	return min(refine_times), min(sequence_times), chain
+
+class_refine, class_sequence, class_chain = refine_and_sequence(ClassPropertyConstraint)
+slot_refine, slot_sequence, slot_chain = refine_and_sequence(OpenConstraint)
+
+assert [c.get_coord_list() for c in class_chain] == [c.get_coord_list() for c in slot_chain]
+
+# Slotted constraints still copy and pickle with their parameters
+assert pickle.loads(pickle.dumps(slot_chain[0])).direction == copy.deepcopy(slot_chain[0]).direction == slot_chain[0].direction
+
+print(f"{len(transects)} transects, fastest of 20 runs")
+print(f"{'':24}{'refine':>10}{'sequence':>10}{'total':>10}")
+print(f"{'class level properties':24}{class_refine:10.4f}{class_sequence:10.4f}{class_refine+class_sequence:10.4f}")
+print(f"{'slotted constraints':24}{slot_refine:10.4f}{slot_sequence:10.4f}{slot_refine+slot_sequence:10.4f}")
+print(f"{'speedup':24}{class_refine/slot_refine:9.2f}x{class_sequence/slot_sequence:9.2f}x{(class_refine+class_sequence)/(slot_refine+slot_sequence):9.2f}x")
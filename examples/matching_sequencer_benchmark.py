@@ -0,0 +1,49 @@
+import time
+import robot_primitives as rp
+
+from context import cb_cpp
+
+# Wide river reach, transects run along the channel so their number grows with the width
+domain = rp.areas.Domain.from_vertex_list([(0., 0.), (300., 20.), (290., 420.), (-10., 400.)])
+transect_orientation = (1., 0.)
+vehicle_radius = 0.5
+ingress_point = (0., -10.)
+
+# Brute force search is only run while the number of chains stays manageable
+max_brute_force_transects = 12
+
+refinement = cb_cpp.refinements.AlternatingDirections()
+heuristic = rp.heuristics.EuclideanDistance
+sequencers = {
+	'greedy': cb_cpp.sequencers.MatchingSequencer(heuristic),
+	'assignment': cb_cpp.sequencers.MatrixSequencer(heuristic, strategy='assignment'),
+}
+
+print(f"{'transects':>10} {'greedy (m)':>12} {'assign (m)':>12} {'brute (m)':>12} {'greedy (s)':>11} {'assign (s)':>11} {'brute (s)':>10}")
+
+for sensor_radius in [60., 30., 20., 10., 5., 2.]:
+	layout = cb_cpp.layouts.OrientedBoustrophedonPattern.from_transect_orientation(vehicle_radius, sensor_radius, transect_orientation)
+	constraints = layout.layout_constraints(domain)
+	refinement.refine_constraints(constraints, area_ingress_point=ingress_point)
+	evaluator = cb_cpp.sequencers.ChainEvaluator(constraints, ingress_point)
+
+	lengths = {}
+	times = {}
+	for name, sequencer in sequencers.items():
+		start = time.perf_counter()
+		chain = sequencer.sequence_constraints(constraints, ingress_point)
+		times[name] = time.perf_counter() - start
+		lengths[name] = evaluator.chain_cost(chain)
+
+	if len(constraints) <= max_brute_force_transects:
+		start = time.perf_counter()
+		chain = evaluator.best_alternating_chain()
+		times['brute'] = time.perf_counter() - start
+		lengths['brute'] = evaluator.chain_cost(chain)
+
+		# Assignment can't beat the optimum but should never be far off it
+		assert lengths['assignment'] >= lengths['brute'] - 1e-6
+
+	brute_length = f"{lengths['brute']:>12.1f}" if 'brute' in lengths else f"{'-':>12}"
+	brute_time = f"{times['brute']:>10.4f}" if 'brute' in times else f"{'-':>10}"
+	print(f"{len(constraints):>10} {lengths['greedy']:>12.1f} {lengths['assignment']:>12.1f} {brute_length} {times['greedy']:>11.4f} {times['assignment']:>11.4f} {brute_time}")
@@ -0,0 +1,30 @@
+import time
+import numpy as np
+import robot_primitives as rp
+
+from context import cb_cpp
+
+# Long, narrow river reach so the number of transects grows quickly as the sensor radius shrinks
+domain = rp.areas.Domain.from_vertex_list([(0., 0.), (2000., 150.), (2010., 250.), (5., 120.)])
+transect_orientation = (0., 1.)
+vehicle_radius = 0.5
+
+print(f"{'transects':>10} {'loop (s)':>10} {'batched (s)':>12} {'speedup':>8}")
+
+for sensor_radius in [20., 10., 5., 2., 1., 0.5]:
+	layout = cb_cpp.layouts.OrientedBoustrophedonPattern.from_transect_orientation(vehicle_radius, sensor_radius, transect_orientation)
+
+	start = time.perf_counter()
+	loop_constraints = layout.layout_constraints(domain, batched=False)
+	loop_time = time.perf_counter() - start
+
+	start = time.perf_counter()
+	batched_constraints = layout.layout_constraints(domain, batched=True)
+	batched_time = time.perf_counter() - start
+
+	# Both modes should produce the same transects
+	assert len(loop_constraints) == len(batched_constraints)
+	for c1, c2 in zip(loop_constraints, batched_constraints):
+		assert np.allclose(c1.coord_list, c2.coord_list, atol=1e-4)
+
+	print(f"{len(loop_constraints):>10} {loop_time:>10.4f} {batched_time:>12.4f} {loop_time/batched_time:>8.1f}")
@@ -0,0 +1,52 @@
+import numpy as np
+
+from context import cb_cpp
+
+def _constraint_chain():
+	chain = []
+	for idx, x in enumerate([0., 5., 10., 15.]):
+		c = cb_cpp.constraint.OpenConstraint([(x, 0.), (x, 4.), (x, 10.)])
+		c.constrain_parameter('direction', [0, 1] if idx % 2 == 0 else [1, 0])
+		c.constrain_parameter('thrust', [(0., 1.), (0., 0.5 * idx), (0., 1.)])
+		chain.append(c)
+
+	return chain
+
+def test_preallocated_path_matches_simple_linker():
+	chain = _constraint_chain()
+	expected = cb_cpp.linkers.SimpleLinker().link_constraints(chain, ingress_point=(0., -5.))
+	path = cb_cpp.linkers.SimpleLinker(preallocate=True).link_constraints(chain, ingress_point=(0., -5.))
+
+	assert path.coord_list == expected.coord_list
+	assert path.to_constrained_path().constraints == expected.constraints
+
+def test_constraint_set_chain_matches_constraints():
+	chain = _constraint_chain()
+	expected = cb_cpp.paths.ArrayPath.from_constraint_chain(chain)
+	path = cb_cpp.paths.ArrayPath.from_constraint_chain(cb_cpp.constraint.ConstraintSet.from_constraints(chain))
+
+	np.testing.assert_array_equal(path.coords, expected.coords)
+	np.testing.assert_array_equal(path.constrained_parameters['thrust'], expected.constrained_parameters['thrust'])
+
+def test_add_point_pads_parameters():
+	path = cb_cpp.paths.ArrayPath.from_constraint_chain(_constraint_chain())
+	num_waypoints = len(path)
+	path.add_point((20., 10.))
+
+	assert len(path) == num_waypoints + 1
+	assert path.coord_list[-1] == (20., 10.)
+
+	thrust = path.constrained_parameters['thrust']
+	assert len(thrust) == len(path)
+	assert np.isnan(thrust[-1]).all()
+	assert path.to_constrained_path().constraints['thrust'][-1] is None
+
+def test_binary_round_trip(tmp_path):
+	path = cb_cpp.paths.ArrayPath.from_constraint_chain(_constraint_chain(), ingress_point=(0., -5.))
+	filename = tmp_path / 'path.bin'
+	path.save_binary(filename)
+
+	loaded = cb_cpp.paths.ArrayPath.from_binary(filename)
+
+	np.testing.assert_array_equal(loaded.coords, path.coords)
+	np.testing.assert_array_equal(loaded.constrained_parameters['thrust'], path.constrained_parameters['thrust'])
@@ -0,0 +1,70 @@
+import numpy as np
+
+from context import cb_cpp
+
+def _constraints():
+	return [
+		cb_cpp.constraint.OpenConstraint([(0., 0.), (0., 5.), (0., 10.)]),
+		cb_cpp.constraint.OpenConstraint([(5., 10.), (5., 0.)]),
+		cb_cpp.constraint.ClosedConstraint([(10., 0.), (20., 0.), (20., 10.), (10., 10.)]),
+	]
+
+def _assert_same_constraint(view, c):
+	assert view.coord_list == c.coord_list
+	if isinstance(c, cb_cpp.constraint.OpenConstraint):
+		assert view.endpoints == c.endpoints
+	assert view.ingress_points == c.ingress_points
+	assert view.egress_points == c.egress_points
+	assert view.get_coord_list() == c.get_coord_list()
+	assert view.constrained_parameters == c.constrained_parameters
+
+def test_views_match_constraints():
+	constraints = _constraints()
+	constraint_set = cb_cpp.constraint.ConstraintSet.from_constraints(_constraints())
+
+	assert len(constraint_set) == len(constraints)
+	for view, c in zip(constraint_set, constraints):
+		_assert_same_constraint(view, c)
+
+def test_view_parameters_match_constraints():
+	constraints = _constraints()
+	constraint_set = cb_cpp.constraint.ConstraintSet.from_constraints(_constraints())
+
+	for c in (constraints[0], constraint_set[0]):
+		c.constrain_parameter('thrust', [(0., 1.), (0., 0.5), (0., 1.)])
+		c.select_ingress((0., 10.))
+	for c in (constraints[1], constraint_set[1]):
+		c.constrain_parameter('direction', [0, 1])
+		c.constrain_parameter('speed', 0.5)
+	for c in (constraints[2], constraint_set[2]):
+		c.select_ingress((20., 10.))
+
+	for view, c in zip(constraint_set, constraints):
+		_assert_same_constraint(view, c)
+		assert view.get_coord_list(endpoint_offset=0.5) == c.get_coord_list(endpoint_offset=0.5)
+
+	assert constraint_set[0].direction == [1, 0]
+	assert constraint_set[0].thrust == [(0., 1.), (0., 0.5), (0., 1.)]
+	assert constraint_set[1].speed == 0.5
+
+	constraint_set[1].unconstrain_parameter('direction')
+	assert not constraint_set[1].is_constrained('direction')
+
+def test_views_share_one_coordinate_buffer():
+	constraint_set = cb_cpp.constraint.ConstraintSet.from_constraints(_constraints())
+
+	assert constraint_set.coords.shape == (9, 2)
+	assert constraint_set.offsets.tolist() == [0, 3, 5, 9]
+	assert np.shares_memory(constraint_set[1].coord_array, constraint_set.coords)
+	assert constraint_set[1] is constraint_set[1]
+	assert constraint_set[-1].coord_list == constraint_set[2].coord_list
+
+def test_coord_views_match_coord_lists():
+	constraint_set = cb_cpp.constraint.ConstraintSet.from_constraints(_constraints())
+	constraint_set[0].constrain_parameter('direction', [1, 0])
+	constraint_set[2].select_ingress((20., 0.))
+
+	expected = [pt for c in constraint_set for pt in c.get_coord_list()]
+	stacked = cb_cpp.constraint.stack_coord_views(constraint_set)
+
+	assert [tuple(pt) for pt in stacked.tolist()] == expected
@@ -0,0 +1,67 @@
+import numpy as np
+
+from context import cb_cpp
+
+def _transects(seed, num_transects=20):
+	rng = np.random.default_rng(seed)
+	constraints = []
+	for x in rng.uniform(0., 100., num_transects):
+		y = rng.uniform(0., 10.)
+		constraints.append(cb_cpp.constraint.OpenConstraint([(float(x), float(y)), (float(x + rng.uniform(-5., 5.)), float(y + 50.))]))
+
+	return constraints
+
+def _link_cost(chain, start_point):
+	cost = np.hypot(*np.subtract(chain[0].ingress_points[0], start_point))
+	for a, b in zip(chain, chain[1:]):
+		cost += np.hypot(*np.subtract(b.ingress_points[0], a.egress_points[0]))
+
+	return cost
+
+def test_matrix_matches_pairwise_costs():
+	heuristic = cb_cpp.heuristics.EuclideanCost()
+	constraints = _transects(0, 6)
+	constraints[2].constrain_parameter('direction', [1, 0])
+	matrix = cb_cpp.sequencers.EndpointCostMatrix(constraints, heuristic, (0., -10.))
+
+	endpoints = [pt for c in constraints for pt in c.endpoints]
+	for i, start in enumerate(endpoints):
+		assert matrix.start_costs[i] == heuristic.compute_cost((0., -10.), start)
+		for j, end in enumerate(endpoints):
+			assert np.isclose(matrix.costs[i, j], heuristic.compute_cost(start, end))
+
+	assert matrix.allowed_entries.tolist() == [True]*4 + [False, True] + [True]*6
+
+	order, entries = [3, 0, 5], [1, 0, 1]
+	chain = matrix.apply(order, entries)
+	assert np.isclose(matrix.chain_cost(order, entries), _link_cost(chain, (0., -10.)))
+
+def test_greedy_strategy_matches_greedy_sequencer():
+	heuristic = cb_cpp.heuristics.EuclideanCost()
+	for seed in range(3):
+		expected = cb_cpp.sequencers.GreedySequencer(heuristic, spatial_index=False).sequence_constraints(_transects(seed), (0., -10.))
+		chain = cb_cpp.sequencers.MatrixSequencer(heuristic).sequence_constraints(_transects(seed), (0., -10.))
+
+		assert [c.get_coord_list() for c in chain] == [c.get_coord_list() for c in expected]
+
+def test_improved_orientations_never_cost_more():
+	heuristic = cb_cpp.heuristics.EuclideanCost()
+	for seed in range(3):
+		chain = cb_cpp.sequencers.MatrixSequencer(heuristic).sequence_constraints(_transects(seed), (0., -10.))
+		improved = cb_cpp.sequencers.MatrixSequencer(heuristic, improve_orientations=True).sequence_constraints(_transects(seed), (0., -10.))
+
+		assert [c.coord_list for c in improved] == [c.coord_list for c in chain]
+		assert _link_cost(improved, (0., -10.)) <= _link_cost(chain, (0., -10.)) + 1e-9
+
+def test_directed_and_flow_matrices_match_pairwise_costs():
+	class ShearFlow(object):
+		def __getitem__(self, pt):
+			return (0.1, 0.02*pt[0])
+
+	constraints = _transects(1, 5)
+	endpoints = [pt for c in constraints for pt in c.endpoints]
+	for heuristic in [cb_cpp.heuristics.DirectedCost.perpendicular((0., 1.)), cb_cpp.heuristics.FlowEnergyCost(ShearFlow(), delta=2.)]:
+		matrix = cb_cpp.sequencers.EndpointCostMatrix(constraints, heuristic, (0., -10.))
+
+		assert np.allclose(matrix.start_costs, [heuristic.compute_cost((0., -10.), pt) for pt in endpoints])
+		assert np.allclose(matrix.costs, [[heuristic.compute_cost(start, end) for end in endpoints] for start in endpoints])
@@ -0,0 +1,67 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from context import cb_cpp
+
+def _transects(seed, sizes):
+	rng = np.random.default_rng(seed)
+	constraints = []
+	for idx in range(sum(sizes)):
+		x = rng.uniform(0., 100.)
+		c = cb_cpp.constraint.OpenConstraint([(float(x), 0.), (float(x + rng.uniform(-5., 5.)), 50.)])
+		c.constrain_parameter('direction', [0, 1] if idx < sizes[0] else [1, 0])
+		constraints.append(c)
+
+	return constraints
+
+def _brute_force_cost(constraints, evaluator):
+	""" Cheapest alternating chain found by enumerating every pair of partition permutations """
+	partitions = [[c for c in constraints if c.direction == [0, 1]], [c for c in constraints if c.direction == [1, 0]]]
+	best_cost = np.inf
+	for first, second in (partitions, partitions[::-1]):
+		if len(first) - len(second) not in (0, 1):
+			continue
+		for first_order in itertools.permutations(first):
+			for second_order in itertools.permutations(second):
+				chain = [c for pair in itertools.zip_longest(first_order, second_order) for c in pair if c is not None]
+				best_cost = min(best_cost, evaluator.chain_cost(chain))
+
+	return best_cost
+
+def test_held_karp_matches_brute_force():
+	start_point, end_point = (50., -10.), (50., 60.)
+	for seed, sizes in enumerate([(1, 1), (2, 1), (3, 3), (4, 3), (3, 4), (4, 4)]):
+		constraints = _transects(seed, sizes)
+		evaluator = cb_cpp.sequencers.ChainEvaluator(constraints, start_point, end_point)
+		sequencer = cb_cpp.sequencers.ExactMatchingSequencer(cb_cpp.heuristics.EuclideanCost())
+
+		chain = sequencer.sequence_constraints(constraints, start_point, end_point)
+
+		assert sorted(map(id, chain)) == sorted(map(id, constraints))
+		assert np.isclose(evaluator.chain_cost(chain), _brute_force_cost(constraints, evaluator))
+
+def test_fallback_chain_alternates():
+	constraints = _transects(0, (4, 4))
+	evaluator = cb_cpp.sequencers.ChainEvaluator(constraints, (50., -10.))
+	sequencer = cb_cpp.sequencers.ExactMatchingSequencer(cb_cpp.heuristics.EuclideanCost(), max_states=0)
+
+	chain = sequencer.sequence_constraints(constraints, (50., -10.))
+
+	assert len(chain) == len(constraints)
+	assert all(a.direction != b.direction for a, b in zip(chain, chain[1:]))
+	assert evaluator.chain_cost(chain) >= _brute_force_cost(constraints, evaluator) - 1e-9
+
+def test_fallback_can_be_disabled():
+	constraints = _transects(0, (4, 4))
+	sequencer = cb_cpp.sequencers.ExactMatchingSequencer(cb_cpp.heuristics.EuclideanCost(), max_states=0, fallback=False)
+
+	with pytest.raises(ValueError):
+		sequencer.sequence_constraints(constraints, (50., -10.))
+
+def test_unbalanced_partitions_are_rejected():
+	constraints = _transects(0, (4, 2))
+
+	assert cb_cpp.sequencers.ExactMatchingSequencer(cb_cpp.heuristics.EuclideanCost()).sequence_constraints(constraints) == []
+	assert cb_cpp.sequencers.ChainEvaluator(constraints).best_alternating_chain() == []
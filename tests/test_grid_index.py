@@ -0,0 +1,46 @@
+import numpy as np
+
+from context import cb_cpp
+
+def _brute_force_nearest(points, alive, query_pt):
+	dists = np.hypot(*(points - query_pt).T)
+	dists[~alive] = np.inf
+	best = int(np.argmin(dists))
+
+	return best, dists[best]
+
+def test_nearest_matches_brute_force_with_removals():
+	rng = np.random.default_rng(0)
+	for points in [rng.uniform(0., 100., (200, 2)), np.column_stack((rng.uniform(0., 100., 50), np.zeros(50))), np.zeros((5, 2))]:
+		index = cb_cpp.sequencers.UniformGridIndex(points)
+		alive = np.ones(len(points), dtype=bool)
+
+		for query_pt in rng.uniform(-20., 120., (len(points), 2)):
+			point_id, dist = index.nearest(query_pt)
+			expected_id, expected_dist = _brute_force_nearest(points, alive, query_pt)
+
+			assert point_id == expected_id
+			assert dist == expected_dist
+
+			index.remove(point_id)
+			alive[point_id] = False
+
+		assert len(index) == 0
+		assert index.nearest((0., 0.)) is None
+
+def _transects(seed):
+	rng = np.random.default_rng(seed)
+	constraints = []
+	for x in rng.uniform(0., 100., 30):
+		y = rng.uniform(0., 10.)
+		constraints.append(cb_cpp.constraint.OpenConstraint([(float(x), float(y)), (float(x + rng.uniform(-5., 5.)), float(y + 50.))]))
+
+	return constraints
+
+def test_indexed_greedy_matches_full_scan():
+	heuristic = cb_cpp.heuristics.EuclideanCost()
+	for seed in range(3):
+		expected = cb_cpp.sequencers.GreedySequencer(heuristic, spatial_index=False).sequence_constraints(_transects(seed), (0., -10.))
+		chain = cb_cpp.sequencers.GreedySequencer(heuristic, spatial_index=True).sequence_constraints(_transects(seed), (0., -10.))
+
+		assert [c.get_coord_list() for c in chain] == [c.get_coord_list() for c in expected]
@@ -0,0 +1,42 @@
+import numpy as np
+import robot_primitives as rp
+
+from context import cb_cpp
+
+class ShearFlow(object):
+	""" Flow field that speeds up across y and veers with x """
+
+	def __getitem__(self, pt):
+		return (0.2 + 0.05*pt[1], 0.02*np.sin(pt[0]))
+
+def _points(seed, num_points=12):
+	return [tuple(pt) for pt in np.random.default_rng(seed).uniform(-10., 10., (num_points, 2)).tolist()]
+
+def test_directed_cost_matches_directed_distance():
+	starts, ends = _points(0), _points(1)
+	for orientation in [(0., 1.), (1., 0.), (3., -4.)]:
+		expected = rp.heuristics.DirectedDistance.perpendicular(orientation)
+		heuristic = cb_cpp.heuristics.DirectedCost.perpendicular(orientation)
+
+		pairwise = [expected.compute_cost(start, end) for start, end in zip(starts, ends)]
+		assert np.allclose(heuristic.compute_pairwise_costs(starts, ends), pairwise)
+		assert np.allclose(heuristic.compute_costs(starts[0], ends), [expected.compute_cost(starts[0], end) for end in ends])
+		assert np.allclose(heuristic.compute_cost_matrix(starts, ends), [[expected.compute_cost(start, end) for end in ends] for start in starts])
+
+def test_flow_energy_cost_matches_opposing_flow_energy():
+	flow_field = ShearFlow()
+	starts, ends = _points(2), _points(3)
+	starts[0] = ends[0]
+	for delta, nominal_speed in [(0.1, 0.5), (0.7, 1.2)]:
+		expected = rp.heuristics.OpposingFlowEnergy(flow_field, delta)
+		heuristic = cb_cpp.heuristics.FlowEnergyCost(flow_field, delta)
+
+		pairwise = [expected.compute_cost(start, end, nominal_speed) for start, end in zip(starts, ends)]
+		assert np.allclose(heuristic.compute_pairwise_costs(starts, ends, nominal_speed), pairwise)
+		assert np.allclose(heuristic.compute_costs(starts[1], ends, nominal_speed), [expected.compute_cost(starts[1], end, nominal_speed) for end in ends])
+		assert np.allclose(heuristic.compute_cost_matrix(starts[:4], ends, nominal_speed), [[expected.compute_cost(start, end, nominal_speed) for end in ends] for start in starts[:4]])
+
+	# Segment sums of a polyline match a running total over its coordinates
+	polyline = _points(4, 5)
+	total = sum(expected.compute_cost(a, b, 0.5) for a, b in zip(polyline, polyline[1:]))
+	assert np.allclose(cb_cpp.heuristics.polyline_costs(heuristic, [polyline], 0.5), [total])
@@ -0,0 +1,55 @@
+import numpy as np
+
+from context import cb_cpp
+
+def _transects(seed, num_transects=25):
+	rng = np.random.default_rng(seed)
+	constraints = []
+	for x in rng.uniform(0., 100., num_transects):
+		y = rng.uniform(0., 30.)
+		constraints.append(cb_cpp.constraint.OpenConstraint([(float(x), float(y)), (float(x + rng.uniform(-5., 5.)), float(y + 20.))]))
+
+	return constraints
+
+def _chain_cost(chain, start_point):
+	coords = [start_point] + [pt for c in chain for pt in c.get_coord_list()]
+
+	return float(np.hypot(*np.diff(np.asarray(coords), axis=0).T).sum())
+
+def _sequence(seed, start_point, **search_options):
+	constraints = _transects(seed)
+	sequencer = cb_cpp.sequencers.LocalSearchSequencer(cb_cpp.heuristics.EuclideanCost(), **search_options)
+
+	return constraints, sequencer.sequence_constraints(constraints, start_point)
+
+def test_without_moves_chain_is_unchanged():
+	start_point = (0., -10.)
+	for seed in range(3):
+		expected = cb_cpp.sequencers.MatrixSequencer(cb_cpp.heuristics.EuclideanCost()).sequence_constraints(_transects(seed), start_point)
+		_, chain = _sequence(seed, start_point, max_iterations=0)
+
+		assert [c.get_coord_list() for c in chain] == [c.get_coord_list() for c in expected]
+
+def test_every_applied_move_lowers_the_cost():
+	start_point = (0., -10.)
+	for seed in range(3):
+		costs = []
+		for max_iterations in range(8):
+			constraints, chain = _sequence(seed, start_point, max_iterations=max_iterations)
+			assert sorted(map(id, chain)) == sorted(map(id, constraints))
+			costs.append(_chain_cost(chain, start_point))
+
+		assert all(b <= a + 1e-9 for a, b in zip(costs, costs[1:]))
+		assert costs[-1] < costs[0]
+
+def test_directed_constraints_keep_their_direction():
+	constraints = _transects(0)
+	for c in constraints[::3]:
+		c.constrain_parameter('direction', [1, 0])
+
+	sequencer = cb_cpp.sequencers.LocalSearchSequencer(cb_cpp.heuristics.EuclideanCost())
+	chain = sequencer.sequence_constraints(constraints, (0., -10.))
+
+	assert len(chain) == len(constraints)
+	for c in constraints[::3]:
+		assert c.direction == [1, 0]
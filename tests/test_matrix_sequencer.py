@@ -0,0 +1,63 @@
+import itertools
+
+import numpy as np
+
+from context import cb_cpp
+
+def _transects(num_transects, seed):
+	rng = np.random.default_rng(seed)
+	constraints = []
+	for idx, x in enumerate(np.sort(rng.uniform(0., 100., num_transects))):
+		c = cb_cpp.constraint.OpenConstraint([(float(x), 0.), (float(x + rng.uniform(-5., 5.)), 50.)])
+		c.constrain_parameter('direction', [0, 1] if idx % 2 == 0 else [1, 0])
+		constraints.append(c)
+
+	return constraints
+
+def test_linear_assignment_matches_brute_force():
+	rng = np.random.default_rng(0)
+	for size in range(1, 7):
+		costs = rng.uniform(0., 10., (size, size))
+		costs[rng.uniform(size=(size, size)) < 0.2] = np.inf
+		np.fill_diagonal(costs, 1.)
+
+		assignment = cb_cpp.sequencers._linear_assignment(costs)
+		best = min(costs[np.arange(size), list(perm)].sum() for perm in itertools.permutations(range(size)))
+
+		assert sorted(assignment.tolist()) == list(range(size))
+		assert costs[np.arange(size), assignment].sum() == best
+
+def test_patch_assignment_joins_cycles():
+	# Two cycles, 0 -> 1 -> 0 and 2 -> 3 -> 2, plus the start/end node 4
+	costs = np.array([[np.inf, 1., 5., 5., 0.],
+							[1., np.inf, 2., 5., 0.],
+							[5., 5., np.inf, 1., 0.],
+							[5., 5., 1., np.inf, 0.],
+							[0., 3., 3., 3., np.inf]])
+	path = cb_cpp.sequencers._patch_assignment(costs, [1, 0, 3, 2, 4])
+
+	assert sorted(path) == [0, 1, 2, 3]
+
+def test_assignment_chain_is_alternating_and_bounded_by_optimum():
+	start_point = (0., -10.)
+	for seed in range(3):
+		evaluator = cb_cpp.sequencers.ChainEvaluator(_transects(8, seed), start_point)
+		optimum = evaluator.chain_cost(evaluator.best_alternating_chain())
+
+		constraints = _transects(8, seed)
+		sequencer = cb_cpp.sequencers.MatrixSequencer(cb_cpp.heuristics.EuclideanCost(), strategy='assignment')
+		chain = sequencer.sequence_constraints(constraints, start_point)
+
+		assert len(chain) == len(constraints)
+		assert all(a.direction != b.direction for a, b in zip(chain, chain[1:]))
+
+		evaluator = cb_cpp.sequencers.ChainEvaluator(constraints, start_point)
+		assert evaluator.chain_cost(chain) >= optimum - 1e-9
+
+def test_matching_strategy_matches_matching_sequencer():
+	start_point = (0., -10.)
+	for seed in range(3):
+		expected = cb_cpp.sequencers.MatchingSequencer(cb_cpp.heuristics.EuclideanCost()).sequence_constraints(_transects(9, seed), start_point)
+		chain = cb_cpp.sequencers.MatrixSequencer(cb_cpp.heuristics.EuclideanCost(), strategy='matching').sequence_constraints(_transects(9, seed), start_point)
+
+		assert [c.coord_list for c in chain] == [c.coord_list for c in expected]
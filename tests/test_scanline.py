@@ -0,0 +1,60 @@
+import numpy as np
+import shapely.geometry
+
+from context import cb_cpp
+
+POLYGONS = [
+	shapely.geometry.Polygon([(0., 0.), (40., 5.), (35., 30.), (-5., 25.)]),
+	shapely.geometry.Polygon([(0., 0.), (30., 0.), (30., 30.), (20., 30.), (20., 10.), (10., 10.), (10., 30.), (0., 30.)]),
+	shapely.geometry.box(0., 0., 30., 30.).difference(shapely.geometry.box(10., 12., 20., 18.)),
+	shapely.geometry.MultiPolygon([shapely.geometry.box(0., 0., 10., 10.), shapely.geometry.box(15., 2., 25., 8.)]),
+]
+
+def _shapely_segments(polygon, sweep_direction, position):
+	""" Pieces of the sweep line at position inside polygon, ordered along the line """
+	sweep_direction = np.asarray(sweep_direction, dtype=float) / np.linalg.norm(sweep_direction)
+	line_direction = np.array([-sweep_direction[1], sweep_direction[0]])
+	origin = position * sweep_direction
+	line = shapely.geometry.LineString([tuple(origin - 1e3*line_direction), tuple(origin + 1e3*line_direction)])
+
+	intersection = polygon.intersection(line)
+	if intersection.is_empty:
+		return []
+
+	pieces = list(intersection.geoms) if hasattr(intersection, 'geoms') else [intersection]
+	segments = []
+	for piece in pieces:
+		coords = sorted(piece.coords, key=lambda pt: np.dot(pt, line_direction))
+		segments.append((coords[0], coords[-1]))
+
+	return sorted(segments, key=lambda segment: np.dot(segment[0], line_direction))
+
+def test_segments_match_shapely_intersections():
+	for polygon in POLYGONS:
+		for sweep_direction in [(1., 0.), (0., 1.), (1., 1.), (-2., 1.)]:
+			intersector = cb_cpp.layouts.ScanlineIntersector(polygon, sweep_direction)
+			low, high = intersector.extents
+			# Irrational fractions keep the sweep lines off the polygon vertices
+			positions = low + (high - low) * (np.arange(1, 12) / 12. + 1e-3 / np.sqrt(2.))
+
+			for position, segments in zip(positions, intersector.segments(positions)):
+				expected = _shapely_segments(polygon, sweep_direction, position)
+
+				assert len(segments) == len(expected)
+				for (start, end), (expected_start, expected_end) in zip(segments, expected):
+					np.testing.assert_allclose(start, expected_start, atol=1e-9)
+					np.testing.assert_allclose(end, expected_end, atol=1e-9)
+
+def test_batched_layout_matches_shapely_intersections():
+	polygon = POLYGONS[1]
+	layout = cb_cpp.layouts.OrientedBoustrophedonPattern(0.5, 2., (1., 0.))
+	positions = layout.sweep_positions(polygon)
+
+	constraints = layout.layout_polygon_constraints(polygon)
+	expected = [segment for position in positions for segment in _shapely_segments(polygon, (1., 0.), position)]
+
+	assert len(constraints) == len(expected)
+	for c, (expected_start, expected_end) in zip(constraints, expected):
+		coords = c.coord_list
+		if len(coords) == 2 and np.linalg.norm(np.subtract(expected_end, expected_start)) > 0.5:
+			np.testing.assert_allclose(coords, [expected_start, expected_end], atol=1e-9)
@@ -0,0 +1,50 @@
+import numpy as np
+
+from context import cb_cpp
+
+def _constraint_set():
+	constraint_set = cb_cpp.constraint.ConstraintSet.from_coord_lists([[(0., 0.), (0., 10.)], [(5., 0.), (5., 4.), (5., 10.)]])
+	constraint_set.constrain_parameter(0, 'direction', [0, 1])
+	constraint_set.constrain_parameter(1, 'thrust', [(0., 1.), (0., 0.5), (0., 1.)])
+	constraint_set.constrain_parameter(0, 'speed', 0.5)
+	constraint_set.constrain_parameter(0, 'label', 'transect')
+	constraint_set.constrain_parameter(1, 'waypoints', [(5., 2.), (5., 8.)])
+	constraint_set.constrain_parameter(1, 'weights', np.array([1., 2., 3.]))
+
+	return constraint_set
+
+def test_restore_tuples_only_converts_lists():
+	assert cb_cpp.storage.restore_tuples([[1., 2.], None, 3.]) == [(1., 2.), None, 3.]
+	assert cb_cpp.storage.restore_tuples(0.5) == 0.5
+	assert cb_cpp.storage.restore_tuples('transect') == 'transect'
+	assert cb_cpp.storage.restore_tuples(None) is None
+
+def test_constraint_set_round_trip(tmp_path):
+	constraint_set = _constraint_set()
+	filename = tmp_path / 'constraints.bin'
+	constraint_set.save_binary(filename)
+
+	loaded = cb_cpp.constraint.ConstraintSet.from_binary(filename)
+
+	assert len(loaded) == len(constraint_set)
+	np.testing.assert_array_equal(loaded.coords, constraint_set.coords)
+	np.testing.assert_array_equal(loaded.offsets, constraint_set.offsets)
+	assert loaded.get_parameter(0, 'direction') == [0, 1]
+	assert loaded.get_parameter(1, 'thrust') == [(0., 1.), (0., 0.5), (0., 1.)]
+	assert loaded.get_parameter(0, 'speed') == 0.5
+	assert loaded.get_parameter(0, 'label') == 'transect'
+	assert loaded.get_parameter(1, 'waypoints') == [(5., 2.), (5., 8.)]
+	assert loaded.get_parameter(1, 'weights') == [1., 2., 3.]
+
+def test_columns_round_trip(tmp_path):
+	filename = tmp_path / 'columns.bin'
+	columns = {'coords': np.arange(12, dtype=np.float64).reshape(6, 2), 'flags': np.array([True, False, True])}
+	cb_cpp.storage.write_columns(filename, 'test', columns, {'count': np.int64(3)})
+
+	kind, loaded, metadata = cb_cpp.storage.read_columns(filename)
+
+	assert kind == 'test'
+	for name, column in columns.items():
+		np.testing.assert_array_equal(loaded[name], column)
+		assert loaded[name].dtype == column.dtype
+	assert metadata == {'count': 3}
@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+
+from context import cb_cpp
+
+def _constraint_chain():
+	chain = []
+	for idx, x in enumerate([0., 5., 10., 15.]):
+		c = cb_cpp.constraint.OpenConstraint([(x, 0.), (x, 4.), (x, 10.)])
+		c.constrain_parameter('direction', [0, 1] if idx % 2 == 0 else [1, 0])
+		c.constrain_parameter('thrust', [(0., 1.), (0., 0.5 * idx), (0., 1.)])
+		c.constrain_parameter('marker', [(x, 1.), None, (x, 2.)])
+		chain.append(c)
+
+	return chain
+
+def _assert_paths_equal(path, expected):
+	np.testing.assert_array_equal(path.coords, expected.coords)
+	assert path.constrained_parameters.keys() == expected.constrained_parameters.keys()
+	for param, column in expected.constrained_parameters.items():
+		assert path.constrained_parameters[param].tolist() == column.tolist()
+
+def test_stream_matches_array_path():
+	chain = _constraint_chain()
+	expected = cb_cpp.paths.ArrayPath.from_constraint_chain(chain, ingress_point=(0., -5.))
+
+	for chunk_size in [1, 3, 4096]:
+		sink = io.StringIO()
+		num_waypoints = cb_cpp.linkers.StreamingLinker(sink, chunk_size).link_constraints(chain, ingress_point=(0., -5.))
+		sink.seek(0)
+		path = cb_cpp.paths.ArrayPath.from_waypoint_stream(sink)
+
+		assert num_waypoints == len(expected)
+		_assert_paths_equal(path, expected)
+
+def test_stream_restores_tuples():
+	sink = io.StringIO()
+	cb_cpp.linkers.StreamingLinker(sink, 2).link_constraints(_constraint_chain())
+	sink.seek(0)
+	path = cb_cpp.paths.ArrayPath.from_waypoint_stream(sink)
+
+	markers = path.constrained_parameters['marker'].tolist()
+	assert markers[:3] == [(0., 1.), None, (0., 2.)]
+	assert all(marker is None or isinstance(marker, tuple) for marker in markers)
+
+def test_stream_to_filename(tmp_path):
+	chain = _constraint_chain()
+	filename = tmp_path / 'path.ndjson'
+	sink = io.StringIO()
+
+	cb_cpp.linkers.StreamingLinker(filename, 3).link_constraints(chain, None, offset=0.0)
+	cb_cpp.linkers.StreamingLinker(sink, 3).link_constraints(chain, None, offset=0.0)
+
+	assert filename.read_text() == sink.getvalue()
@@ -0,0 +1,82 @@
+import itertools
+
+import numpy as np
+import shapely.geometry
+
+from context import cb_cpp
+
+FREE_SPACES = [
+	shapely.geometry.box(0., 0., 30., 30.).difference(shapely.geometry.box(10., 5., 20., 25.)),
+	shapely.geometry.Polygon([(0., 0.), (30., 0.), (30., 30.), (20., 30.), (20., 10.), (10., 10.), (10., 30.), (0., 30.)]),
+	shapely.geometry.box(0., 0., 40., 20.).difference(shapely.geometry.box(8., 0., 12., 15.)).difference(shapely.geometry.box(25., 5., 30., 20.)),
+]
+
+class _Domain(object):
+
+	def __init__(self, polygon):
+		self.polygon = polygon
+
+def _covers(free_space, start, end):
+	return free_space.buffer(1e-6, join_style=2).covers(shapely.geometry.LineString([start, end]))
+
+def _dense_shortest_length(free_space, start, goal):
+	""" Shortest path length over the visibility graph of every boundary vertex, by Floyd-Warshall """
+	vertices = [pt for ring in cb_cpp.layouts.polygon_rings(free_space) for pt in ring]
+	points = np.array([start, goal] + vertices, dtype=float)
+	num_points = len(points)
+
+	lengths = np.full((num_points, num_points), np.inf)
+	np.fill_diagonal(lengths, 0.)
+	for i, j in itertools.combinations(range(num_points), 2):
+		if _covers(free_space, points[i], points[j]):
+			lengths[i, j] = lengths[j, i] = np.linalg.norm(points[i] - points[j])
+
+	for k in range(num_points):
+		lengths = np.minimum(lengths, lengths[:, k:k+1] + lengths[k:k+1, :])
+
+	return lengths[0, 1]
+
+def _path_length(path):
+	return float(np.hypot(*np.diff(np.asarray(path), axis=0).T).sum())
+
+def test_shortest_paths_match_dense_visibility_graph():
+	rng = np.random.default_rng(0)
+	for free_space in FREE_SPACES:
+		graph = cb_cpp.linkers.VisibilityGraph(free_space)
+		min_x, min_y, max_x, max_y = free_space.bounds
+
+		queries = []
+		while len(queries) < 10:
+			pt = tuple(rng.uniform((min_x, min_y), (max_x, max_y)).tolist())
+			if free_space.contains(shapely.geometry.Point(pt)):
+				queries.append(pt)
+
+		for start, goal in zip(queries[::2], queries[1::2]):
+			path = graph.shortest_path(start, goal)
+
+			assert path[0] == start and path[-1] == goal
+			assert all(_covers(free_space, a, b) for a, b in zip(path, path[1:]))
+			assert np.isclose(_path_length(path), _dense_shortest_length(free_space, start, goal))
+
+def test_unreachable_goal_returns_none():
+	free_space = shapely.geometry.MultiPolygon([shapely.geometry.box(0., 0., 10., 10.), shapely.geometry.box(20., 0., 30., 10.)])
+	graph = cb_cpp.linkers.VisibilityGraph(free_space)
+
+	assert graph.shortest_path((5., 5.), (25., 5.)) is None
+
+def test_linker_keeps_constraints_and_pads_links():
+	free_space = FREE_SPACES[0]
+	chain = [cb_cpp.constraint.OpenConstraint([(5., 2.), (5., 28.)]), cb_cpp.constraint.OpenConstraint([(25., 2.), (25., 28.)])]
+	for c in chain:
+		c.constrain_parameter('direction', [0, 1])
+		c.constrain_parameter('thrust', [(0., 1.), (0., 1.)])
+
+	path = cb_cpp.linkers.VisibilityGraphLinker().link_constraints(chain, _Domain(free_space))
+	coords = path.coord_list
+	thrust = path.constraints['thrust']
+
+	assert coords[:2] == [(5., 2.), (5., 28.)] and coords[-2:] == [(25., 2.), (25., 28.)]
+	assert all(_covers(free_space, a, b) for a, b in zip(coords, coords[1:]))
+	assert len(coords) > 4
+	assert len(thrust) == len(coords)
+	assert thrust[2:-2] == [None]*(len(coords) - 4)